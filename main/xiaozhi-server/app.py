@@ -9,6 +9,7 @@ from core.utils.util import get_local_ip
 from core.http_server import SimpleHttpServer
 from core.websocket_server import WebSocketServer
 from core.utils.util import check_ffmpeg_installed
+from core.utils.http_pool import close_all
 
 TAG = __name__
 logger = setup_logging()
@@ -117,6 +118,8 @@ async def main():
             timeout=3.0,
             return_when=asyncio.ALL_COMPLETED,
         )
+        # 关闭共享的LLM连接池
+        await close_all()
         print("Server closed, exit program")
 
 
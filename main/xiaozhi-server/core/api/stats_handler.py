@@ -0,0 +1,53 @@
+import hmac
+import json
+from aiohttp import web
+from core.utils.runtime import get_runtime
+from core.api.base_handler import BaseHandler
+
+TAG = __name__
+
+
+class StatsHandler(BaseHandler):
+    def __init__(self, config: dict):
+        super().__init__(config)
+        runtime_config = config.get("worker_runtime") or {}
+        # 未配置访问令牌时不开放运行状态接口
+        self.token = str(runtime_config.get("stats_token") or "")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def _verify_token(self, request) -> bool:
+        """验证 Authorization: Bearer <stats_token>"""
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            return False
+        return hmac.compare_digest(auth_header[7:].encode(), self.token.encode())
+
+    async def handle_get(self, request):
+        """处理运行时统计 GET 请求"""
+        try:
+            if not self._verify_token(request):
+                return_json = {"success": False, "message": "invalid token"}
+                response = web.Response(
+                    text=json.dumps(return_json, separators=(",", ":")),
+                    content_type="application/json",
+                    status=401,
+                )
+                return response
+            return_json = get_runtime().collect_stats()
+            response = web.Response(
+                text=json.dumps(return_json, separators=(",", ":")),
+                content_type="application/json",
+            )
+        except Exception as e:
+            self.logger.bind(tag=TAG).error(f"Runtime stats request exception: {e}")
+            return_json = {"success": False, "message": "request error."}
+            response = web.Response(
+                text=json.dumps(return_json, separators=(",", ":")),
+                content_type="application/json",
+            )
+        finally:
+            self._add_cors_headers(response)
+            return response
@@ -10,6 +10,7 @@ import threading
 import traceback
 import subprocess
 import websockets
+import opuslib_next
 from core.handle.mcpHandle import call_mcp_tool
 from core.utils.util import (
     extract_json_from_string,
@@ -26,8 +27,10 @@ from core.utils.modules_initialize import (
 )
 from core.handle.reportHandle import report
 from core.providers.tts.default import DefaultTTS
-from concurrent.futures import ThreadPoolExecutor
+from core.utils.runtime import StageQueue, get_runtime
+from core.utils.audio_buffer import PCMRingBuffer, PCMCaptureBuffer
 from core.utils.dialogue import Message, Dialogue
+from core.utils.prompt_assembler import PromptAssembler
 from core.providers.asr.dto.dto import InterfaceType
 from core.handle.textHandle import handleTextMessage
 from core.handle.functionHandler import FunctionHandler
@@ -81,6 +84,10 @@ class ConnectionHandler:
         self.max_output_size = 0
         self.chat_history_conf = 0
         self.audio_format = "opus"
+        # 下发音频的方式：每条websocket消息打包的帧数（大于1时按p3格式打包，在hello中协商），首句预缓冲帧数
+        audio_send = self.config.get("audio_send") or {}
+        self.frames_per_packet = 1
+        self.pre_buffer_frames = int(audio_send.get("pre_buffer_frames", 3))
 
         # 客户端状态相关
         self.client_abort = False
@@ -90,11 +97,14 @@ class ConnectionHandler:
         # 线程任务相关
         self.loop = asyncio.get_event_loop()
         self.stop_event = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=5)
-
-        # 添加上报线程池
-        self.report_queue = queue.Queue()
-        self.report_thread = None
+        # 使用服务端共享的线程池，不再每个连接单独创建
+        self.executor = get_runtime().executor("chat")
+        # 本连接创建的asyncio任务，关闭连接时统一取消
+        self.worker_tasks = set()
+
+        # 添加上报任务
+        self.report_queue = StageQueue("report")
+        self.report_task = None
         # 未来可以通过修改此处，调节asr的上报和tts的上报，目前默认都开启
         self.report_asr_enable = self.read_config_from_api
         self.report_tts_enable = self.read_config_from_api
@@ -110,7 +120,9 @@ class ConnectionHandler:
         self.intent = _intent
 
         # vad相关变量
-        self.client_audio_buffer = bytearray()
+        self.client_audio_buffer = PCMRingBuffer()
+        # VAD模型在本连接上的推理状态，由VAD提供者维护
+        self.vad_state = None
         self.client_have_voice = False
         self.client_have_voice_last_time = 0.0
         self.client_no_voice_last_time = 0.0
@@ -120,11 +132,24 @@ class ConnectionHandler:
         # 因为实际部署时可能会用到公共的本地ASR，不能把变量暴露给公共ASR
         # 所以涉及到ASR的变量，需要在这里定义，属于connection的私有变量
         self.asr_audio = []
-        self.asr_audio_queue = queue.Queue()
+        # 采集时已解码的PCM，说完后整段交给ASR，不再重复解码
+        self.asr_pcm = PCMCaptureBuffer()
+        self.asr_audio_queue = StageQueue("asr_audio")
+        # 客户端音频解码器，每个数据包只解码一次，VAD和ASR共用解码结果
+        self.audio_decoder = None
+        self._last_audio_packet = None
+        self._last_pcm_frame = b""
 
         # llm相关变量
         self.llm_finish_task = True
-        self.dialogue = Dialogue()
+        dialogue_config = self.config.get("dialogue") or {}
+        self.dialogue = Dialogue(
+            max_tokens=int(dialogue_config.get("max_tokens") or 0),
+            trim_ratio=float(dialogue_config.get("trim_ratio") or 0.75),
+        )
+        if dialogue_config.get("summarize"):
+            self.dialogue.summarizer = self._summarize_dialogue
+        self.prompt_assembler = PromptAssembler(self.dialogue)
 
         # tts相关变量
         self.sentence_id = None
@@ -143,6 +168,8 @@ class ConnectionHandler:
         self.close_after_chat = False
         self.load_function_plugin = False
         self.intent_type = "nointent"
+        # intent_llm 模式下意图识别与对话LLM同时开始
+        self.speculative_chat = False
 
         self.timeout_task = None
         self.timeout_seconds = (
@@ -234,8 +261,8 @@ class ConnectionHandler:
                     finally:
                         loop.close()
 
-                # 启动线程保存记忆，不等待完成
-                threading.Thread(target=save_memory_task, daemon=True).start()
+                # 提交到共享的后台线程池保存记忆，不等待完成
+                get_runtime().submit("background", save_memory_task)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"failed to save memory: {e}")
         finally:
@@ -344,23 +371,52 @@ class ConnectionHandler:
             self._initialize_memory()
             """loading intent recognition"""
             self._initialize_intent()
-            """initializing report threads"""
-            self._init_report_threads()
+            """initializing report task"""
+            self._init_report_task()
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"Failed to instantiate component: {e}")
 
-    def _init_report_threads(self):
-        """初始化ASR和TTS上报线程"""
+    def _init_report_task(self):
+        """初始化ASR和TTS上报任务"""
         if not self.read_config_from_api or self.need_bind:
             return
         if self.chat_history_conf == 0:
             return
-        if self.report_thread is None or not self.report_thread.is_alive():
-            self.report_thread = threading.Thread(
-                target=self._report_worker, daemon=True
-            )
-            self.report_thread.start()
-            self.logger.bind(tag=TAG).info("TTS report thread activated")
+        if self.report_task is None:
+            self.loop.call_soon_threadsafe(self._start_report_task)
+
+    def _start_report_task(self):
+        if self.report_task is None:
+            self.report_task = self.spawn_worker(self._report_worker())
+            self.logger.bind(tag=TAG).info("TTS report task activated")
+
+    def spawn_worker(self, coro):
+        """创建随连接生命周期的asyncio任务，需在事件循环线程中调用"""
+        task = asyncio.create_task(coro)
+        if self.stop_event.is_set():
+            # 连接已关闭，直接取消
+            task.cancel()
+        else:
+            self.worker_tasks.add(task)
+            task.add_done_callback(self.worker_tasks.discard)
+        return task
+
+    def spawn_chat(self, query, **kwargs):
+        """在事件循环中启动一轮聊天，异常时记录日志并恢复连接状态"""
+        task = self.spawn_worker(self.chat(query, **kwargs))
+        task.add_done_callback(self._on_chat_done)
+        return task
+
+    def _on_chat_done(self, task):
+        if task.cancelled():
+            return
+        e = task.exception()
+        if e is None:
+            return
+        self.logger.bind(tag=TAG).error(f"Chat task exception: {e}")
+        # 本轮聊天已结束，避免连接一直停留在生成/说话状态
+        self.llm_finish_task = True
+        self.clearSpeakStatus()
 
     def _initialize_tts(self):
         """初始化TTS"""
@@ -563,6 +619,11 @@ class ConnectionHandler:
             return
         # 使用 intent_llm 模式
         elif intent_type == "intent_llm":
+            self.speculative_chat = bool(
+                intent_config[self.config["selected_module"]["Intent"]].get(
+                    "speculative_chat", False
+                )
+            )
             intent_llm_name = intent_config[self.config["selected_module"]["Intent"]][
                 "llm"
             ]
@@ -594,53 +655,80 @@ class ConnectionHandler:
             self.mcp_manager.initialize_servers(), self.loop
         )
 
+    def _summarize_dialogue(self, summary, messages):
+        """把超出token预算被裁剪的对话总结为摘要，在后台线程中调用"""
+        lines = [
+            f"{m.role}: {m.content}"
+            for m in messages
+            if m.role in ("user", "assistant") and m.content
+        ]
+        if not lines:
+            return summary
+        user_prompt = "\n".join(lines)
+        if summary:
+            user_prompt = f"已有摘要：\n{summary}\n\n新的对话：\n{user_prompt}"
+        result = self.llm.response_no_stream(
+            "请把下面的对话总结为一段简短的摘要，保留用户的关键信息、偏好和未完成的话题，不超过200字，直接输出摘要。",
+            user_prompt,
+        )
+        # response_no_stream 出错时返回【...】格式的提示，保留原摘要
+        if not result or result.startswith("【"):
+            return summary
+        return result.strip()
+
     def change_system_prompt(self, prompt):
         self.prompt = prompt
-        # 更新系统prompt至上下文
-        self.dialogue.update_system_message(self.prompt)
-
-    def chat(self, query, tool_call=False):
+        # 更新系统prompt至上下文，设备列表等其它部分保持不变
+        self.prompt_assembler.set_role_prompt(self.prompt)
+
+    async def chat(self, query, tool_call=False, speculation=None):
+        """
+        在事件循环中流式请求LLM，生成的文本直接送入TTS队列
+        speculation: 推测执行时传入的 SpeculativeChat，确认继续聊天之前生成的文本先暂存，不送入TTS，
+        也不修改连接的 sentence_id、client_abort、llm_finish_task，这些状态在 SpeculativeChat.release 中更新
+        """
         self.logger.bind(tag=TAG).info(f"Large model receives user message: {query}")
-        self.llm_finish_task = False
+        gate = speculation.gate if speculation is not None else None
+        if speculation is None:
+            self.llm_finish_task = False
 
         if not tool_call:
             self.dialogue.put(Message(role="user", content=query))
 
         # Define intent functions
-        functions = None
+        plugin_tools = None
+        mcp_tools = None
         if self.intent_type == "function_call" and hasattr(self, "func_handler"):
-            functions = self.func_handler.get_functions()
+            plugin_tools = self.func_handler.get_functions()
         if hasattr(self, "mcp_client"):
-            mcp_tools = self.mcp_client.get_available_tools()
-            if mcp_tools is not None and len(mcp_tools) > 0:
-                if functions is None:
-                    functions = []
-                functions.extend(mcp_tools)
+            mcp_tools = self.mcp_client.get_available_tools() or None
+        # 工具定义不变时复用同一个列表，保持请求前缀稳定
+        functions = self.prompt_assembler.tools(plugin_tools, mcp_tools)
         response_message = []
 
         try:
             # 使用带记忆的对话
             memory_str = None
             if self.memory is not None:
-                future = asyncio.run_coroutine_threadsafe(
-                    self.memory.query_memory(query), self.loop
-                )
-                memory_str = future.result()
+                memory_str = await self.memory.query_memory(query)
 
-            uuid_str = str(uuid.uuid4()).replace("-", "")
-            self.sentence_id = uuid_str
+            if speculation is not None:
+                sentence_id = speculation.sentence_id
+            else:
+                sentence_id = str(uuid.uuid4()).replace("-", "")
+                self.sentence_id = sentence_id
 
             if self.intent_type == "function_call" and functions is not None:
                 # 使用支持functions的streaming接口
-                llm_responses = self.llm.response_with_functions(
+                llm_responses = self.llm.aresponse_with_functions(
                     self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(memory_str),
+                    self.prompt_assembler.build(memory_str, functions),
                     functions=functions,
                 )
             else:
-                llm_responses = self.llm.response(
+                llm_responses = self.llm.aresponse(
                     self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(memory_str),
+                    self.prompt_assembler.build(memory_str),
                 )
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"LLM handle error {query}: {e}")
@@ -653,52 +741,84 @@ class ConnectionHandler:
         function_arguments = ""
         content_arguments = ""
         text_index = 0
-        self.client_abort = False
-        for response in llm_responses:
-            if self.client_abort:
-                break
-            if self.intent_type == "function_call" and functions is not None:
-                content, tools_call = response
-                if "content" in response:
-                    content = response["content"]
-                    tools_call = None
+        if speculation is None:
+            self.client_abort = False
+
+        held = []
+
+        def flush_held(_=None):
+            if gate.done() and not gate.cancelled() and gate.result():
+                while held:
+                    self.tts.tts_text_queue.put(held.pop(0))
+
+        def put_tts(message):
+            if gate is not None:
+                if not gate.done():
+                    held.append(message)
+                    return
+                flush_held()
+            self.tts.tts_text_queue.put(message)
+
+        if gate is not None:
+            gate.add_done_callback(flush_held)
+
+        try:
+            async for response in llm_responses:
+                # 推测执行确认之前的 client_abort 属于上一轮，不影响本轮
+                if self.client_abort and (gate is None or gate.done()):
+                    break
+                if self.intent_type == "function_call" and functions is not None:
+                    content, tools_call = response
+                    if "content" in response:
+                        content = response["content"]
+                        tools_call = None
+                    if content is not None and len(content) > 0:
+                        content_arguments += content
+
+                    if not tool_call_flag and content_arguments.startswith("<tool_call>"):
+                        # print("content_arguments", content_arguments)
+                        tool_call_flag = True
+
+                    if tools_call is not None and len(tools_call) > 0:
+                        tool_call_flag = True
+                        if tools_call[0].id is not None:
+                            function_id = tools_call[0].id
+                        if tools_call[0].function.name is not None:
+                            function_name = tools_call[0].function.name
+                        if tools_call[0].function.arguments is not None:
+                            function_arguments += tools_call[0].function.arguments
+                else:
+                    content = response
                 if content is not None and len(content) > 0:
-                    content_arguments += content
-
-                if not tool_call_flag and content_arguments.startswith("<tool_call>"):
-                    # print("content_arguments", content_arguments)
-                    tool_call_flag = True
-
-                if tools_call is not None and len(tools_call) > 0:
-                    tool_call_flag = True
-                    if tools_call[0].id is not None:
-                        function_id = tools_call[0].id
-                    if tools_call[0].function.name is not None:
-                        function_name = tools_call[0].function.name
-                    if tools_call[0].function.arguments is not None:
-                        function_arguments += tools_call[0].function.arguments
-            else:
-                content = response
-            if content is not None and len(content) > 0:
-                if not tool_call_flag:
-                    response_message.append(content)
-                    if text_index == 0:
-                        self.tts.tts_text_queue.put(
+                    if not tool_call_flag:
+                        response_message.append(content)
+                        if text_index == 0:
+                            put_tts(
+                                TTSMessageDTO(
+                                    sentence_id=sentence_id,
+                                    sentence_type=SentenceType.FIRST,
+                                    content_type=ContentType.ACTION,
+                                )
+                            )
+                        put_tts(
                             TTSMessageDTO(
-                                sentence_id=self.sentence_id,
-                                sentence_type=SentenceType.FIRST,
-                                content_type=ContentType.ACTION,
+                                sentence_id=sentence_id,
+                                sentence_type=SentenceType.MIDDLE,
+                                content_type=ContentType.TEXT,
+                                content_detail=content,
                             )
                         )
-                    self.tts.tts_text_queue.put(
-                        TTSMessageDTO(
-                            sentence_id=self.sentence_id,
-                            sentence_type=SentenceType.MIDDLE,
-                            content_type=ContentType.TEXT,
-                            content_detail=content,
-                        )
-                    )
-                    text_index += 1
+                        text_index += 1
+        finally:
+            # 打断时提前关闭流，释放HTTP连接
+            await llm_responses.aclose()
+        self.prompt_assembler.finish_turn(self.session_id)
+
+        if gate is not None:
+            # 推测执行：等待意图识别确认是普通聊天，被取消时整个任务会被cancel
+            if not await gate:
+                return None
+            flush_held()
         # 处理function call
         if tool_call_flag:
             bHasError = False
@@ -735,7 +855,7 @@ class ConnectionHandler:
 
                 # 处理Server端MCP工具调用
                 if self.mcp_manager.is_mcp_tool(function_name):
-                    result = self._handle_mcp_tool_call(function_call_data)
+                    result = await self._handle_mcp_tool_call(function_call_data)
                 elif hasattr(self, "mcp_client") and self.mcp_client.has_tool(
                     function_name
                 ):
@@ -744,12 +864,9 @@ class ConnectionHandler:
                         f"call Xiaozhi-side MCP tool: {function_name}, parameter: {function_arguments}"
                     )
                     try:
-                        result = asyncio.run_coroutine_threadsafe(
-                            call_mcp_tool(
-                                self, self.mcp_client, function_name, function_arguments
-                            ),
-                            self.loop,
-                        ).result()
+                        result = await call_mcp_tool(
+                            self, self.mcp_client, function_name, function_arguments
+                        )
                         self.logger.bind(tag=TAG).debug(f"MCP-tool call result: {result}")
 
                         # If the MCP tool called is the system quit, handle exit here:
@@ -792,7 +909,7 @@ class ConnectionHandler:
 
                             # Schedule connection close on the event loop and return a simple response
                             try:
-                                asyncio.run_coroutine_threadsafe(self.close(self.websocket), self.loop)
+                                asyncio.create_task(self.close(self.websocket))
                             except Exception as e:
                                 self.logger.bind(tag=TAG).error(f"failed to schedule connection close: {e}")
 
@@ -807,11 +924,14 @@ class ConnectionHandler:
                             action=Action.REQLLM, result="failed to call MCP tool", response=""
                         )
                 else:
-                    # 处理系统函数
-                    result = self.func_handler.handle_llm_function_call(
-                        self, function_call_data
+                    # 处理系统函数，插件函数可能阻塞，放到线程池中执行
+                    result = await get_runtime().run(
+                        "chat",
+                        self.func_handler.handle_llm_function_call,
+                        self,
+                        function_call_data,
                     )
-                self._handle_function_result(result, function_call_data)
+                await self._handle_function_result(result, function_call_data)
 
         # 存储对话内容
         if len(response_message) > 0:
@@ -833,7 +953,7 @@ class ConnectionHandler:
 
         return True
 
-    def _handle_mcp_tool_call(self, function_call_data):
+    async def _handle_mcp_tool_call(self, function_call_data):
         function_arguments = function_call_data["arguments"]
         function_name = function_call_data["name"]
         try:
@@ -849,9 +969,7 @@ class ConnectionHandler:
                         action=Action.REQLLM, result="failed to analyze parameter", response=""
                     )
 
-            tool_result = asyncio.run_coroutine_threadsafe(
-                self.mcp_manager.execute_tool(function_name, args_dict), self.loop
-            ).result()
+            tool_result = await self.mcp_manager.execute_tool(function_name, args_dict)
             # meta=None content=[TextContent(type='text', text='北京当前天气:\n温度: 21°C\n天气: 晴\n湿度: 6%\n风向: 西北 风\n风力等级: 5级', annotations=None)] isError=False
             content_text = ""
             if tool_result is not None and tool_result.content is not None:
@@ -875,7 +993,7 @@ class ConnectionHandler:
 
         return ActionResponse(action=Action.REQLLM, result="failed to call tool", response="")
 
-    def _handle_function_result(self, result, function_call_data):
+    async def _handle_function_result(self, result, function_call_data):
         if result.action == Action.RESPONSE:  # 直接回复前端
             text = result.response
             self.tts.tts_one_sentence(self, ContentType.TEXT, content_detail=text)
@@ -912,7 +1030,7 @@ class ConnectionHandler:
                         content=text,
                     )
                 )
-                self.chat(text, tool_call=True)
+                await self.chat(text, tool_call=True)
         elif result.action == Action.NOTFOUND or result.action == Action.ERROR:
             text = result.result
             self.tts.tts_one_sentence(self, ContentType.TEXT, content_detail=text)
@@ -920,31 +1038,22 @@ class ConnectionHandler:
         else:
             pass
 
-    def _report_worker(self):
-        """聊天记录上报工作线程"""
+    async def _report_worker(self):
+        """聊天记录上报任务"""
         while not self.stop_event.is_set():
             try:
-                # 从队列获取数据，设置超时以便定期检查停止事件
-                item = self.report_queue.get(timeout=1)
+                item = await self.report_queue.async_get()
                 if item is None:  # 检测毒丸对象
                     break
                 type, text, audio_data, report_time = item
-                try:
-                    # 检查线程池状态
-                    if self.executor is None:
-                        continue
-                    # 提交任务到线程池
-                    self.executor.submit(
-                        self._process_report, type, text, audio_data, report_time
-                    )
-                except Exception as e:
-                    self.logger.bind(tag=TAG).error(f"Chat history reporting thread exception: {e}")
-            except queue.Empty:
-                continue
+                # 提交任务到共享的上报线程池
+                get_runtime().submit(
+                    "report", self._process_report, type, text, audio_data, report_time
+                )
             except Exception as e:
-                self.logger.bind(tag=TAG).error(f"Chat history reporting thread exception: {e}")
+                self.logger.bind(tag=TAG).error(f"Chat history reporting task exception: {e}")
 
-        self.logger.bind(tag=TAG).info("Chat history reporting thread exited")
+        self.logger.bind(tag=TAG).info("Chat history reporting task exited")
 
     def _process_report(self, type, text, audio_data, report_time):
         """处理上报任务"""
@@ -977,6 +1086,11 @@ class ConnectionHandler:
             if self.stop_event:
                 self.stop_event.set()
 
+            # 取消本连接的asyncio任务
+            for task in list(self.worker_tasks):
+                task.cancel()
+            self.worker_tasks.clear()
+
             # 清空任务队列
             self.clear_queues()
 
@@ -986,10 +1100,8 @@ class ConnectionHandler:
             elif self.websocket:
                 await self.websocket.close()
 
-            # 最后关闭线程池（避免阻塞）
-            if self.executor:
-                self.executor.shutdown(wait=False)
-                self.executor = None
+            # 线程池为所有连接共享，这里只解除引用，不关闭
+            self.executor = None
 
             self.logger.bind(tag=TAG).info("connection resources released")
         except Exception as e:
@@ -1002,6 +1114,9 @@ class ConnectionHandler:
                 f"Start clearing: TTS queue size={self.tts.tts_text_queue.qsize()}, audio queue size={self.tts.tts_audio_queue.qsize()}"
             )
 
+            # 取消尚未完成的预取合成
+            self.tts.cancel_synthesis()
+
             # 使用非阻塞方式清空队列
             for q in [
                 self.tts.tts_text_queue,
@@ -1020,18 +1135,40 @@ class ConnectionHandler:
                 f"Start clearing: TTS queue size={self.tts.tts_text_queue.qsize()}, audio queue size={self.tts.tts_audio_queue.qsize()}"
             )
 
+    def decode_audio(self, audio):
+        """解码客户端上传的音频包，同一个包重复调用时直接返回上次的解码结果"""
+        if audio is self._last_audio_packet:
+            return self._last_pcm_frame
+        if not audio:
+            pcm_frame = b""
+        elif self.audio_format == "pcm":
+            pcm_frame = audio
+        else:
+            if self.audio_decoder is None:
+                self.audio_decoder = opuslib_next.Decoder(16000, 1)
+            try:
+                pcm_frame = self.audio_decoder.decode(audio, 960)
+            except opuslib_next.OpusError as e:
+                self.logger.bind(tag=TAG).warning(f"Opus解码错误，跳过当前数据包: {e}")
+                pcm_frame = b""
+        self._last_audio_packet = audio
+        self._last_pcm_frame = pcm_frame
+        return pcm_frame
+
     def reset_vad_states(self):
-        self.client_audio_buffer = bytearray()
+        self.client_audio_buffer.clear()
         self.client_have_voice = False
         self.client_have_voice_last_time = 0
         self.client_voice_stop = False
+        # 模型状态随下一句话重新创建，不带入上一句的RNN状态
+        self.vad_state = None
         self.logger.bind(tag=TAG).debug("VAD states reset.")
 
-    def chat_and_close(self, text):
+    async def chat_and_close(self, text):
         """Chat with the user and then close the connection"""
         try:
             # Use the existing chat method
-            self.chat(text)
+            await self.chat(text)
 
             # After chat is complete, close the connection
             self.close_after_chat = True
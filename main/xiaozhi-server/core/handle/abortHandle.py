@@ -1,4 +1,5 @@
 import json
+from core.utils.audio_pacer import get_pacer
 
 TAG = __name__
 
@@ -7,6 +8,8 @@ async def handleAbortMessage(conn):
     conn.logger.bind(tag=TAG).info("Abort message received")
     # 设置成打断状态，会自动打断llm、tts任务
     conn.client_abort = True
+    # 立即停止节拍器中正在播放的音频，不等到下一个节拍
+    get_pacer().stop(conn)
     conn.clear_queues()
     # 打断客户端说话状态
     await conn.websocket.send(
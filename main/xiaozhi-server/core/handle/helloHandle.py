@@ -35,7 +35,7 @@ async def handleHelloMessage(conn, msg_json):
         format = audio_params.get("format")
         conn.logger.bind(tag=TAG).info(f"server side audio format: {format}")
         conn.audio_format = format
-        conn.welcome_msg["audio_params"] = audio_params
+        conn.welcome_msg["audio_params"] = negotiate_audio_send(conn, audio_params)
     features = msg_json.get("features")
     if features:
         conn.logger.bind(tag=TAG).info(f"server side feature: {features}")
@@ -51,6 +51,30 @@ async def handleHelloMessage(conn, msg_json):
     await conn.websocket.send(json.dumps(conn.welcome_msg))
 
 
+def negotiate_audio_send(conn, audio_params):
+    """协商下发音频时每条websocket消息打包的帧数
+
+    设备在 audio_params.frames_per_packet 中声明一次最多能接收的帧数，服务端取它和配置上限中较小的值，
+    大于1时每条消息按p3格式（每帧前加4字节头部）打包多帧，并在回复的 audio_params 中告知设备。
+    """
+    audio_params = dict(audio_params)
+    requested = audio_params.get("frames_per_packet")
+    max_frames = (conn.config.get("audio_send") or {}).get("max_frames_per_packet", 1)
+    try:
+        frames_per_packet = max(1, min(int(requested or 1), int(max_frames or 1)))
+    except (TypeError, ValueError):
+        frames_per_packet = 1
+
+    conn.frames_per_packet = frames_per_packet
+    if frames_per_packet > 1:
+        audio_params["frames_per_packet"] = frames_per_packet
+        audio_params["packet_format"] = "p3"
+        conn.logger.bind(tag=TAG).info(f"audio frames per packet: {frames_per_packet}")
+    else:
+        audio_params.pop("frames_per_packet", None)
+    return audio_params
+
+
 async def checkWakeupWords(conn, text):
     enable_wakeup_words_response_cache = conn.config[
         "enable_wakeup_words_response_cache"
@@ -13,7 +13,61 @@ from loguru import logger
 TAG = __name__
 
 
-async def handle_user_intent(conn, text):
+class SpeculativeChat:
+    """
+    推测执行的对话：意图识别调用LLM的同时开始对话LLM，生成的文本先暂存，
+    意图识别结果是继续聊天时立即放行，否则取消。首句的等待时间从两次LLM之和变为两者中较长的一次。
+    放行之前推测执行的对话不修改连接的状态，意图识别走函数调用时连接状态与没有推测执行时一致。
+    """
+
+    def __init__(self, conn, text):
+        self.conn = conn
+        self.text = text
+        self.gate = None
+        self.task = None
+        self.message = None
+        self.sentence_id = None
+
+    @property
+    def started(self):
+        return self.task is not None
+
+    def start(self):
+        self.gate = asyncio.get_running_loop().create_future()
+        self.sentence_id = str(uuid.uuid4()).replace("-", "")
+        self.message = Message(role="user", content=self.text)
+        self.conn.dialogue.put(self.message)
+        # 用户消息已放入上下文，chat中不再重复放入
+        self.task = self.conn.spawn_chat(self.text, tool_call=True, speculation=self)
+
+    def release(self):
+        if self.gate is not None and not self.gate.done():
+            # 确认继续聊天后再把本轮对话的状态写入连接
+            self.conn.sentence_id = self.sentence_id
+            self.conn.client_abort = False
+            self.conn.llm_finish_task = False
+            self.gate.set_result(True)
+
+    def cancel(self):
+        if not self.started:
+            return
+        if not self.gate.done():
+            self.gate.set_result(False)
+        self.task.cancel()
+        self.conn.dialogue.remove(self.message)
+        self.conn.logger.bind(tag=TAG).debug(f"cancel speculative chat: {self.text}")
+
+
+def is_continue_chat(intent_result):
+    try:
+        intent_data = json.loads(intent_result)
+    except (TypeError, json.JSONDecodeError):
+        return True
+    function_call = intent_data.get("function_call")
+    return function_call is None or function_call.get("name") == "continue_chat"
+
+
+async def handle_user_intent(conn, text, speculation: SpeculativeChat = None):
     # 检查是否有明确的退出命令
     filtered_text = remove_punctuation_and_length(text)[1]
     if await check_direct_exit(conn, filtered_text):
@@ -25,8 +79,25 @@ async def handle_user_intent(conn, text):
     if conn.intent_type == "function_call":
         # 使用支持function calling的聊天方法,不再进行意图分析
         return False
-    # 使用LLM进行意图分析
-    intent_result = await analyze_intent_with_llm(conn, text)
+    # 意图识别使用的历史记录不包含推测执行放入的本轮用户消息
+    history = list(conn.dialogue.dialogue)
+    # 高置信度的常见意图在本地直接判断，只判断一次，结果直接使用
+    intent_result = None
+    intent = getattr(conn, "intent", None)
+    detect_intent_fast = getattr(intent, "detect_intent_fast", None)
+    if detect_intent_fast is not None:
+        try:
+            intent_result = detect_intent_fast(conn, text)
+        except Exception as e:
+            conn.logger.bind(tag=TAG).error(f"Fast intent recognition failed: {str(e)}")
+    # 本地能直接识别的意图不需要推测执行
+    if speculation is not None and intent_result is None:
+        speculation.start()
+    if intent_result is None:
+        # 使用LLM进行意图分析
+        intent_result = await analyze_intent_with_llm(conn, text, history)
+    if speculation is not None and not is_continue_chat(intent_result):
+        speculation.cancel()
     if not intent_result:
         return False
     # 处理各种意图
@@ -46,16 +117,17 @@ async def check_direct_exit(conn, text):
     return False
 
 
-async def analyze_intent_with_llm(conn, text):
+async def analyze_intent_with_llm(conn, text, history=None):
     """使用LLM分析用户意图"""
     if not hasattr(conn, "intent") or not conn.intent:
         conn.logger.bind(tag=TAG).warning("Intent recognition service not initialized")
         return None
 
     # 对话历史记录
-    dialogue = conn.dialogue
+    if history is None:
+        history = conn.dialogue.dialogue
     try:
-        intent_result = await conn.intent.detect_intent(conn, dialogue.dialogue, text)
+        intent_result = await conn.intent.detect_intent(conn, history, text)
         return intent_result
     except Exception as e:
         conn.logger.bind(tag=TAG).error(f"Intent Recognition failed: {str(e)}")
@@ -108,7 +180,9 @@ async def process_intent_result(conn, intent_result, original_text):
 
                 # 处理Server端MCP工具调用
                 if conn.mcp_manager.is_mcp_tool(function_name):
-                    result = conn._handle_mcp_tool_call(function_call_data)
+                    result = asyncio.run_coroutine_threadsafe(
+                        conn._handle_mcp_tool_call(function_call_data), conn.loop
+                    ).result()
                 elif hasattr(conn, "mcp_client") and conn.mcp_client.has_tool(
                     function_name
                 ):
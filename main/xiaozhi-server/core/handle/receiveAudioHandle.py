@@ -1,5 +1,5 @@
 from core.handle.sendAudioHandle import send_stt_message
-from core.handle.intentHandler import handle_user_intent
+from core.handle.intentHandler import handle_user_intent, SpeculativeChat
 from core.utils.output_counter import check_device_output_limit
 from core.handle.abortHandle import handleAbortMessage
 import time
@@ -12,12 +12,13 @@ TAG = __name__
 
 async def handleAudioMessage(conn, audio):
     # 当前片段是否有人说话
-    have_voice = conn.vad.is_vad(conn, audio)
+    have_voice = await conn.vad.is_vad_async(conn, audio)
     # 如果设备刚刚被唤醒，短暂忽略VAD检测
     if have_voice and hasattr(conn, "just_woken_up") and conn.just_woken_up:
         have_voice = False
         # 设置一个短暂延迟后恢复VAD检测
         conn.asr_audio.clear()
+        conn.asr_pcm.clear()
         if not hasattr(conn, "vad_resume_task") or conn.vad_resume_task.done():
             conn.vad_resume_task = asyncio.create_task(resume_vad_detection(conn))
         return
@@ -52,16 +53,31 @@ async def startToChat(conn, text):
     if conn.client_is_speaking:
         await handleAbortMessage(conn)
 
+    # intent_llm 模式下对话LLM与意图识别同时开始，意图确认后再放行
+    speculation = None
+    if conn.speculative_chat and conn.intent_type == "intent_llm":
+        speculation = SpeculativeChat(conn, text)
+
     # 首先进行意图分析
-    intent_handled = await handle_user_intent(conn, text)
+    try:
+        intent_handled = await handle_user_intent(conn, text, speculation)
+    except BaseException:
+        if speculation is not None:
+            speculation.cancel()
+        raise
 
     if intent_handled:
         # 如果意图已被处理，不再进行聊天
+        if speculation is not None:
+            speculation.cancel()
         return
 
     # 意图未被处理，继续常规聊天流程
     await send_stt_message(conn, text)
-    conn.executor.submit(conn.chat, text)
+    if speculation is not None and speculation.started:
+        speculation.release()
+    else:
+        conn.spawn_chat(text)
 
 
 async def no_voice_close_connect(conn, have_voice):
@@ -14,6 +14,7 @@ import time
 import opuslib_next
 
 from config.manage_api_client import report as manage_report
+from core.utils.opus_pool import opus_decoder
 
 TAG = __name__
 
@@ -56,15 +57,16 @@ def opus_to_wav(conn, opus_data):
     Returns:
         bytes: WAV格式的音频数据
     """
-    decoder = opuslib_next.Decoder(16000, 1)  # 16kHz, 单声道
     pcm_data = []
 
-    for opus_packet in opus_data:
-        try:
-            pcm_frame = decoder.decode(opus_packet, 960)  # 960 samples = 60ms
-            pcm_data.append(pcm_frame)
-        except opuslib_next.OpusError as e:
-            conn.logger.bind(tag=TAG).error(f"Opus decode error: {e}", exc_info=True)
+    # 16kHz, 单声道，解码器从池中借出
+    with opus_decoder(16000, 1) as decoder:
+        for opus_packet in opus_data:
+            try:
+                pcm_frame = decoder.decode(opus_packet, 960)  # 960 samples = 60ms
+                pcm_data.append(pcm_frame)
+            except opuslib_next.OpusError as e:
+                conn.logger.bind(tag=TAG).error(f"Opus decode error: {e}", exc_info=True)
 
     if not pcm_data:
         raise ValueError("no valid PCM data")
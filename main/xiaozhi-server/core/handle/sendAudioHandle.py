@@ -1,9 +1,9 @@
 import json
-import asyncio
-import time
 from core.providers.tts.dto.dto import SentenceType
 from core.utils.util import get_string_no_punctuation_or_emoji, analyze_emotion, parse_llm_response_with_emotion, select_emotion_with_persistence, emotion_persistence
 from core.utils.emotion_manager import emotion_manager
+from core.utils.audio_pacer import get_pacer
+from core.utils.audio_stream import AudioFileStream
 from loguru import logger
 
 TAG = __name__
@@ -76,43 +76,17 @@ async def sendAudioMessage(conn, sentenceType, audios, text):
 
 # 播放音频
 async def sendAudio(conn, audios, pre_buffer=True):
-    if audios is None or len(audios) == 0:
+    if audios is None:
         return
-    # 流控参数优化
-    frame_duration = 60  # 帧时长（毫秒），匹配 Opus 编码
-    start_time = time.perf_counter()
-    play_position = 0
-    last_reset_time = time.perf_counter()  # 记录最后的重置时间
-
-    # 仅当第一句话时执行预缓冲
-    if pre_buffer:
-        pre_buffer_frames = min(3, len(audios))
-        for i in range(pre_buffer_frames):
-            await conn.websocket.send(audios[i])
-        remaining_audios = audios[pre_buffer_frames:]
-    else:
-        remaining_audios = audios
-
-    # 播放剩余音频帧
-    for opus_packet in remaining_audios:
-        if conn.client_abort:
-            break
-
-        # 每分钟重置一次计时器
-        if time.perf_counter() - last_reset_time > 60:
-            await conn.reset_timeout()
-            last_reset_time = time.perf_counter()
-
-        # 计算预期发送时间
-        expected_time = start_time + (play_position / 1000)
-        current_time = time.perf_counter()
-        delay = expected_time - current_time
-        if delay > 0:
-            await asyncio.sleep(delay)
-
-        await conn.websocket.send(opus_packet)
-
-        play_position += frame_duration
+    # 仅当第一句话时执行预缓冲，其余帧交给全局节拍器按60ms一帧发送
+    pre_buffer_frames = conn.pre_buffer_frames if pre_buffer else 0
+    if isinstance(audios, AudioFileStream):
+        # 音乐等音频文件边解码边发送
+        await get_pacer().play_stream(conn, audios, pre_buffer_frames)
+        return
+    if len(audios) == 0:
+        return
+    await get_pacer().play(conn, audios, pre_buffer_frames)
 
 
 async def send_tts_message(conn, state, text=None):
@@ -44,6 +44,7 @@ async def handleTextMessage(conn, message):
             elif msg_json["state"] == "detect":
                 conn.client_have_voice = False
                 conn.asr_audio.clear()
+                conn.asr_pcm.clear()
                 if "text" in msg_json:
                     original_text = msg_json["text"]  # 保留原始文本
                     filtered_len, filtered_text = remove_punctuation_and_length(
@@ -1,17 +1,14 @@
 import os
 import wave
-import copy
 import uuid
-import queue
-import asyncio
 import traceback
-import threading
 import opuslib_next
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from typing import Optional, Tuple, List
 from core.handle.receiveAudioHandle import startToChat
 from core.handle.reportHandle import enqueue_asr_report
+from core.utils.runtime import get_runtime
 from core.utils.util import remove_punctuation_and_length
 from core.handle.receiveAudioHandle import handleAudioMessage
 
@@ -27,29 +24,19 @@ class ASRProviderBase(ABC):
     # 这里默认是非流式的处理方式
     # 流式处理方式请在子类中重写
     async def open_audio_channels(self, conn):
-        # tts 消化线程
-        conn.asr_priority_thread = threading.Thread(
-            target=self.asr_text_priority_thread, args=(conn,), daemon=True
-        )
-        conn.asr_priority_thread.start()
+        # asr 消化任务
+        conn.spawn_worker(self.asr_text_priority_task(conn))
 
     # 有序处理ASR音频
-    def asr_text_priority_thread(self, conn):
+    async def asr_text_priority_task(self, conn):
         while not conn.stop_event.is_set():
+            message = await conn.asr_audio_queue.async_get()
             try:
-                message = conn.asr_audio_queue.get(timeout=1)
-                future = asyncio.run_coroutine_threadsafe(
-                    handleAudioMessage(conn, message),
-                    conn.loop,
-                )
-                future.result()
-            except queue.Empty:
-                continue
+                await handleAudioMessage(conn, message)
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"处理ASR文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
                 )
-                continue
 
     # 接收音频
     # 这里默认是非流式的处理方式
@@ -61,25 +48,35 @@ class ASRProviderBase(ABC):
             have_voice = conn.client_have_voice
         # 如果本次没有声音，本段也没声音，就把声音丢弃了
         conn.asr_audio.append(audio)
+        # VAD已经解码过这个包，这里直接取解码结果
+        conn.asr_pcm.append(conn.decode_audio(audio))
         if have_voice == False and conn.client_have_voice == False:
             conn.asr_audio = conn.asr_audio[-10:]
+            conn.asr_pcm.keep_last(10 * 960)
             return
 
         # 如果本段有声音，且已经停止了
         if conn.client_voice_stop:
-            asr_audio_task = copy.deepcopy(conn.asr_audio)
-            conn.asr_audio.clear()
+            asr_audio_task = conn.asr_audio
+            conn.asr_audio = []
+            pcm_task = conn.asr_pcm.detach()
 
             # 音频太短了，无法识别
             conn.reset_vad_states()
             if len(asr_audio_task) > 15:
-                await self.handle_voice_stop(conn, asr_audio_task)
+                await self.handle_voice_stop(conn, asr_audio_task, pcm_task)
 
     # 处理语音停止
-    async def handle_voice_stop(self, conn, asr_audio_task):
-        raw_text, _ = await self.speech_to_text(
-            asr_audio_task, conn.session_id, conn.audio_format
-        )  # 确保ASR模块返回原始文本
+    async def handle_voice_stop(self, conn, asr_audio_task, pcm_task=None):
+        if pcm_task is not None:
+            # 采集时已经解码好的PCM，直接交给ASR
+            raw_text, _ = await self.speech_to_text(
+                [pcm_task], conn.session_id, "pcm"
+            )
+        else:
+            raw_text, _ = await self.speech_to_text(
+                asr_audio_task, conn.session_id, conn.audio_format
+            )  # 确保ASR模块返回原始文本
         conn.logger.bind(tag=TAG).info(f"识别文本: {raw_text}")
         text_len, _ = remove_punctuation_and_length(raw_text)
         self.stop_ws_connection()
@@ -93,17 +90,32 @@ class ASRProviderBase(ABC):
 
     def save_audio_to_file(self, pcm_data: List[bytes], session_id: str) -> str:
         """PCM数据保存为WAV文件"""
+        file_path = self._audio_file_path(session_id)
+        self._write_wav(file_path, pcm_data)
+        return file_path
+
+    def save_audio_to_file_async(self, pcm_data: List[bytes], session_id: str) -> str:
+        """在后台线程池中保存WAV文件，不等待写入完成，直接返回文件路径"""
+        file_path = self._audio_file_path(session_id)
+        get_runtime().submit("background", self._write_wav, file_path, pcm_data)
+        return file_path
+
+    def _audio_file_path(self, session_id: str) -> str:
         module_name = __name__.split(".")[-1]
         file_name = f"asr_{module_name}_{session_id}_{uuid.uuid4()}.wav"
-        file_path = os.path.join(self.output_dir, file_name)
+        return os.path.join(self.output_dir, file_name)
 
-        with wave.open(file_path, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)  # 2 bytes = 16-bit
-            wf.setframerate(16000)
-            wf.writeframes(b"".join(pcm_data))
-
-        return file_path
+    @staticmethod
+    def _write_wav(file_path: str, pcm_data: List[bytes]):
+        try:
+            with wave.open(file_path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)  # 2 bytes = 16-bit
+                wf.setframerate(16000)
+                wf.writeframes(b"".join(pcm_data))
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"音频文件保存失败: {file_path} | 错误: {e}")
+            raise
 
     @abstractmethod
     async def speech_to_text(
@@ -2,9 +2,11 @@ import time
 import os
 import sys
 import io
+import asyncio
 import psutil
 from config.logger import setup_logging
 from typing import Optional, Tuple, List
+from core.utils.batching import MicroBatcher
 from core.providers.asr.base import ASRProviderBase
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
@@ -61,6 +63,31 @@ class ASRProvider(ASRProviderBase):
                 # device="cuda:0",  # 启用GPU加速
             )
 
+        # 推理放在独立线程中执行，不阻塞事件循环；几乎同时结束的多段语音合并成一次 generate
+        batch_max_size = config.get("batch_max_size", 8)
+        batch_wait_ms = config.get("batch_wait_ms", 10)
+        self.batcher = MicroBatcher(
+            "fun_local_asr",
+            self._generate_batch,
+            max_batch_size=int(batch_max_size) if batch_max_size else 8,
+            max_wait_ms=float(batch_wait_ms) if batch_wait_ms else 0,
+        )
+
+    def _generate_batch(self, pcm_list: List[bytes]) -> List[str]:
+        """在批处理线程中执行，一次识别多段PCM"""
+        start_time = time.time()
+        results = self.model.generate(
+            input=pcm_list,
+            cache={},
+            language="auto",
+            use_itn=True,
+            batch_size=len(pcm_list),
+        )
+        logger.bind(tag=TAG).debug(
+            f"批量语音识别耗时: {time.time() - start_time:.3f}s | 条数: {len(pcm_list)}"
+        )
+        return [rich_transcription_postprocess(result["text"]) for result in results]
+
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus"
     ) -> Tuple[Optional[str], Optional[str]]:
@@ -92,14 +119,7 @@ class ASRProvider(ASRProviderBase):
 
                 # 语音识别
                 start_time = time.time()
-                result = self.model.generate(
-                    input=combined_pcm_data,
-                    cache={},
-                    language="auto",
-                    use_itn=True,
-                    batch_size_s=60,
-                )
-                text = rich_transcription_postprocess(result[0]["text"])
+                text = await self.batcher.run(combined_pcm_data)
                 logger.bind(tag=TAG).debug(
                     f"语音识别耗时: {time.time() - start_time:.3f}s | 结果: {text}"
                 )
@@ -116,7 +136,7 @@ class ASRProvider(ASRProviderBase):
                 logger.bind(tag=TAG).warning(
                     f"语音识别失败，正在重试（{retry_count}/{MAX_RETRIES}）: {e}"
                 )
-                time.sleep(RETRY_DELAY)
+                await asyncio.sleep(RETRY_DELAY)
 
             except Exception as e:
                 logger.bind(tag=TAG).error(f"语音识别失败: {e}", exc_info=True)
@@ -27,7 +27,10 @@ class ASRProvider(ASRProviderBase):
     async def speech_to_text(self, opus_data, session_id, audio_format="opus"):
         """Convert Opus data to text using Google STT."""
         logger.bind(tag=TAG).debug(f"[Google STT] speech_to_text called with session_id: {session_id}")
-        pcm_data = self.decode_opus(opus_data)
+        if audio_format == "pcm":
+            pcm_data = b"".join(opus_data)
+        else:
+            pcm_data = self.decode_opus(opus_data)
         file_path = self.save_audio_to_file([pcm_data], session_id)
 
         with open(file_path, "rb") as audio_file:
@@ -41,6 +41,9 @@ class ASRProvider(ASRProviderBase):
         self.model_dir = config.get("model_dir")
         self.output_dir = config.get("output_dir")
         self.delete_audio_file = delete_audio_file
+        # 内存模式：解码后的PCM直接送入识别器，不再写入再读回WAV文件
+        in_memory = config.get("in_memory", True)
+        self.in_memory = str(in_memory).lower() in ("true", "1", "yes")
 
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
@@ -108,18 +111,48 @@ class ASRProvider(ASRProviderBase):
             samples_float32 = samples_float32 / 32768
             return samples_float32, f.getframerate()
 
+    @staticmethod
+    def pcm_to_samples(pcm_data: List[bytes]) -> np.ndarray:
+        """int16 PCM转为识别器需要的[-1, 1]范围float32采样，只分配一次"""
+        pcm = pcm_data[0] if len(pcm_data) == 1 else b"".join(pcm_data)
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        samples *= 1.0 / 32768
+        return samples
+
+    def _recognize_pcm(
+        self, pcm_data: List[bytes], session_id: str
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """内存模式识别，需要保留音频时在后台异步写文件，识别不等待磁盘"""
+        file_path = None
+        if not self.delete_audio_file:
+            file_path = self.save_audio_to_file_async(pcm_data, session_id)
+
+        start_time = time.time()
+        s = self.model.create_stream()
+        s.accept_waveform(16000, self.pcm_to_samples(pcm_data))
+        self.model.decode_stream(s)
+        text = s.result.text
+        logger.bind(tag=TAG).debug(
+            f"语音识别耗时: {time.time() - start_time:.3f}s | 结果: {text}"
+        )
+        return text, file_path
+
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus"
     ) -> Tuple[Optional[str], Optional[str]]:
         """语音转文本主处理逻辑"""
         file_path = None
         try:
-            # 保存音频文件
-            start_time = time.time()
             if audio_format == "pcm":
                 pcm_data = opus_data
             else:
                 pcm_data = self.decode_opus(opus_data)
+
+            if self.in_memory:
+                return self._recognize_pcm(pcm_data, session_id)
+
+            # 保存音频文件
+            start_time = time.time()
             file_path = self.save_audio_to_file(pcm_data, session_id)
             logger.bind(tag=TAG).debug(
                 f"音频文件保存耗时: {time.time() - start_time:.3f}s | 路径: {file_path}"
@@ -0,0 +1,179 @@
+import os
+import json
+import threading
+import numpy as np
+import sherpa_onnx
+from config.logger import setup_logging
+from typing import Optional, Tuple, List
+from core.utils.batching import MicroBatcher
+from core.providers.asr.dto.dto import InterfaceType
+from core.providers.asr.base import ASRProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+# 流式识别每个连接一个实例，但模型只加载一次，按模型目录缓存
+_RECOGNIZERS = {}
+_RECOGNIZERS_LOCK = threading.Lock()
+
+
+def _load_recognizer(config: dict):
+    model_dir = config.get("model_dir")
+    with _RECOGNIZERS_LOCK:
+        if model_dir in _RECOGNIZERS:
+            return _RECOGNIZERS[model_dir]
+
+        model_files = {
+            "encoder": os.path.join(model_dir, config.get("encoder", "encoder.onnx")),
+            "decoder": os.path.join(model_dir, config.get("decoder", "decoder.onnx")),
+            "joiner": os.path.join(model_dir, config.get("joiner", "joiner.onnx")),
+            "tokens": os.path.join(model_dir, config.get("tokens", "tokens.txt")),
+        }
+        for file_path in model_files.values():
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(f"流式识别模型文件不存在: {file_path}")
+
+        recognizer = sherpa_onnx.OnlineRecognizer.from_transducer(
+            tokens=model_files["tokens"],
+            encoder=model_files["encoder"],
+            decoder=model_files["decoder"],
+            joiner=model_files["joiner"],
+            num_threads=int(config.get("num_threads", 2)),
+            sample_rate=16000,
+            feature_dim=80,
+            decoding_method="greedy_search",
+            enable_endpoint_detection=True,
+            rule1_min_trailing_silence=float(
+                config.get("rule1_min_trailing_silence", 2.4)
+            ),
+            rule2_min_trailing_silence=float(
+                config.get("rule2_min_trailing_silence", 0.8)
+            ),
+            rule3_min_utterance_length=20,
+        )
+
+        def decode_batch(streams):
+            # 多个连接就绪的识别流一起解码
+            recognizer.decode_streams(streams)
+            return [None] * len(streams)
+
+        batch_max_size = config.get("batch_max_size", 32)
+        batch_wait_ms = config.get("batch_wait_ms", 2)
+        batcher = MicroBatcher(
+            "sherpa_onnx_stream",
+            decode_batch,
+            max_batch_size=int(batch_max_size) if batch_max_size else 32,
+            max_wait_ms=float(batch_wait_ms) if batch_wait_ms else 0,
+        )
+        _RECOGNIZERS[model_dir] = (recognizer, batcher)
+        logger.bind(tag=TAG).info(f"流式识别模型加载完成: {model_dir}")
+        return _RECOGNIZERS[model_dir]
+
+
+class ASRProvider(ASRProviderBase):
+    def __init__(self, config: dict, delete_audio_file: bool):
+        super().__init__()
+        self.interface_type = InterfaceType.STREAM
+        self.config = config
+        self.output_dir = config.get("output_dir", "tmp/")
+        self.delete_audio_file = delete_audio_file
+        send_partial = config.get("send_partial", False)
+        self.send_partial = str(send_partial).lower() in ("true", "1", "yes")
+
+        self.recognizer, self.batcher = _load_recognizer(config)
+        # 以下为本连接的状态
+        self.stream = None
+        self.text = ""
+        self.partial_text = ""
+        # 结束时补一段静音，让模型输出最后几个字
+        self.tail_padding = np.zeros(int(16000 * 0.3), dtype=np.float32)
+
+    def _accept(self, pcm):
+        """把PCM送入识别流"""
+        if not pcm:
+            return
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        samples *= 1.0 / 32768
+        self.stream.accept_waveform(16000, samples)
+
+    async def _decode_ready(self, stream):
+        while self.recognizer.is_ready(stream):
+            await self.batcher.run(stream)
+
+    async def receive_audio(self, conn, audio, audio_have_voice):
+        if conn.client_listen_mode == "auto" or conn.client_listen_mode == "realtime":
+            have_voice = audio_have_voice
+        else:
+            have_voice = conn.client_have_voice
+
+        conn.asr_audio.append(audio)
+        try:
+            # VAD已经解码过这个包，这里直接取解码结果
+            pcm_frame = conn.decode_audio(audio)
+            if self.stream is None:
+                conn.asr_pcm.append(pcm_frame)
+                if not have_voice and not conn.client_voice_stop:
+                    conn.asr_audio = conn.asr_audio[-10:]
+                    conn.asr_pcm.keep_last(10 * 960)
+                    return
+                # 开始说话，新建识别流，先送入之前缓存的音频
+                self.stream = self.recognizer.create_stream()
+                self.partial_text = ""
+                self._accept(conn.asr_pcm.view())
+                conn.asr_pcm.clear()
+            else:
+                self._accept(pcm_frame)
+
+            await self._decode_ready(self.stream)
+            text = self.recognizer.get_result(self.stream)
+            if text and text != self.partial_text:
+                self.partial_text = text
+                logger.bind(tag=TAG).debug(f"识别中间结果: {text}")
+                if self.send_partial:
+                    await self._send_partial(conn, text)
+
+            # VAD判断说完，或模型检测到端点，立即结束本句
+            if conn.client_voice_stop or self.recognizer.is_endpoint(self.stream):
+                await self._finalize(conn)
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"流式识别失败: {e}")
+            self.stream = None
+
+    async def _finalize(self, conn):
+        stream = self.stream
+        self.stream = None
+        stream.accept_waveform(16000, self.tail_padding)
+        stream.input_finished()
+        await self._decode_ready(stream)
+        self.text = self.recognizer.get_result(stream).strip()
+        self.partial_text = ""
+
+        asr_audio_task = conn.asr_audio.copy()
+        conn.asr_audio.clear()
+        conn.reset_vad_states()
+        if self.text:
+            await self.handle_voice_stop(conn, asr_audio_task)
+
+    async def _send_partial(self, conn, text):
+        """下发中间识别结果，需要设备端支持 partial 字段"""
+        await conn.websocket.send(
+            json.dumps(
+                {
+                    "type": "stt",
+                    "text": text,
+                    "partial": True,
+                    "session_id": conn.session_id,
+                }
+            )
+        )
+
+    async def speech_to_text(
+        self, opus_data: List[bytes], session_id: str, audio_format="opus"
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """识别已在 receive_audio 中完成，这里直接返回最终结果"""
+        result = self.text
+        self.text = ""
+        return result, None
+
+    async def close(self):
+        self.stream = None
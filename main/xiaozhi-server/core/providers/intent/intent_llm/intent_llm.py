@@ -1,10 +1,12 @@
 from typing import List, Dict
 from ..base import IntentProviderBase
 from plugins_func.functions.play_music import initialize_music_handler
+from core.utils.intent_classifier import NgramIntentClassifier, extract_song_name
+from core.utils.intent_cache import get_intent_cache, context_fingerprint
+from core.utils.intent_prompt import get_intent_prompt_cache
 from config.logger import setup_logging
 import re
 import json
-import hashlib
 import time
 
 TAG = __name__
@@ -15,13 +17,27 @@ class IntentProvider(IntentProviderBase):
     def __init__(self, config):
         super().__init__(config)
         self.llm = None
-        self.promot = ""
-        # 添加缓存管理
-        self.intent_cache = {}  # 缓存意图识别结果
-        self.cache_expiry = 600  # 缓存有效期10分钟
-        self.cache_max_size = 100  # 最多缓存100个意图
+        # 系统提示词按（函数集，音乐库版本，设备列表）缓存，所有连接共享
+        self.prompt_cache = get_intent_prompt_cache()
+        # 意图识别结果缓存，所有连接共享，在服务启动时按 cache 配置初始化
+        self.intent_cache = get_intent_cache()
         self.history_count = 4  # 默认使用最近4条对话记录
 
+        # 本地快速意图识别，高置信度的意图不再调用LLM
+        fast_path = config.get("fast_path") or {}
+        self.fast_path_enabled = str(fast_path.get("enabled", False)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
+        self.fast_threshold = float(fast_path.get("threshold", 0.7))
+        self.fast_margin = float(fast_path.get("margin", 0.3))
+        self.fast_intents = fast_path.get(
+            "intents", ["continue_chat", "play_music", "handle_exit_intent"]
+        )
+        self._classifier = None
+        self._classifier_key = None
+
     def get_intent_system_prompt(self, functions_list: str) -> str:
         """
         根据配置的意图选项和可用函数动态生成系统提示词
@@ -98,26 +114,60 @@ class IntentProvider(IntentProviderBase):
         )
         return prompt
 
-    def clean_cache(self):
-        """清理过期缓存"""
-        now = time.time()
-        # 找出过期键
-        expired_keys = [
-            k
-            for k, v in self.intent_cache.items()
-            if now - v["timestamp"] > self.cache_expiry
-        ]
-        for key in expired_keys:
-            del self.intent_cache[key]
-
-        # 如果缓存太大，移除最旧的条目
-        if len(self.intent_cache) > self.cache_max_size:
-            # 按时间戳排序并保留最新的条目
-            sorted_items = sorted(
-                self.intent_cache.items(), key=lambda x: x[1]["timestamp"]
-            )
-            for key, _ in sorted_items[: len(sorted_items) - self.cache_max_size]:
-                del self.intent_cache[key]
+    def get_functions(self, conn) -> List[Dict]:
+        """当前可用的函数：插件函数和MCP工具"""
+        functions = list(conn.func_handler.get_functions() or [])
+        if hasattr(conn, "mcp_client"):
+            functions.extend(conn.mcp_client.get_available_tools() or [])
+        return functions
+
+    def get_system_prompt(self, conn, functions: List[Dict]):
+        """返回（签名，系统提示词），函数集、音乐列表、设备列表都没有变化时直接使用缓存"""
+        music_config = initialize_music_handler(conn)
+        devices = conn.config["plugins"]["home_assistant"].get("devices", [])
+        return self.prompt_cache.get(
+            functions,
+            self.get_intent_system_prompt,
+            music_config["version"],
+            music_config["music_file_names"],
+            devices,
+        )
+
+    def get_classifier(self, conn):
+        """按当前可用的函数（插件和MCP工具）训练分类器，函数列表变化时重新训练"""
+        functions = self.get_functions(conn)
+        key = tuple(f.get("function", {}).get("name", "") for f in functions)
+        if self._classifier is None or key != self._classifier_key:
+            self._classifier = NgramIntentClassifier(functions)
+            self._classifier_key = key
+        return self._classifier
+
+    def detect_intent_fast(self, conn, text: str):
+        """本地快速识别，不确定时返回None，由 handle_user_intent 在调用 detect_intent 之前调用一次"""
+        if not self.fast_path_enabled or conn.func_handler is None:
+            return None
+        start_time = time.perf_counter()
+        classifier = self.get_classifier(conn)
+        function_name = classifier.predict(
+            text, self.fast_threshold, self.fast_margin, self.fast_intents
+        )
+        if function_name is None:
+            return None
+
+        function_call = {"name": function_name}
+        if function_name == "play_music":
+            function_call["arguments"] = {"song_name": extract_song_name(text)}
+        logger.bind(tag=TAG).info(
+            f"本地识别到意图: {function_call}, 耗时: {(time.perf_counter() - start_time) * 1000:.2f}ms"
+        )
+        if function_name == "continue_chat":
+            self.clean_tool_history(conn)
+        return json.dumps({"function_call": function_call}, ensure_ascii=False)
+
+    def clean_tool_history(self, conn):
+        """继续聊天时，清理工具调用相关的历史消息"""
+        # 原地移除，不重建对话窗口，窗口开头保持不变
+        conn.dialogue.remove_if(lambda msg: msg.role in ["tool", "function"])
 
     def replyResult(self, text: str, original_text: str):
         llm_result = self.llm.response_no_stream(
@@ -140,46 +190,32 @@ class IntentProvider(IntentProviderBase):
         model_info = getattr(self.llm, "model_name", str(self.llm.__class__.__name__))
         logger.bind(tag=TAG).debug(f"使用意图识别模型: {model_info}")
 
-        # 计算缓存键
-        cache_key = hashlib.md5(text.encode()).hexdigest()
+        # 计算缓存键：意图识别模型 + 提示词签名 + 上下文指纹 + 规范化文本
+        functions = self.get_functions(conn)
+        prompt_signature, system_prompt = self.get_system_prompt(conn, functions)
+        llm_identity = (
+            f"{self.llm.__class__.__module__}:{model_info}"
+            f"@{getattr(self.llm, 'base_url', '')}"
+        )
+        cache_key = self.intent_cache.make_key(
+            text,
+            prompt_signature,
+            context_fingerprint(
+                dialogue_history, text, self.intent_cache.context_mode
+            ),
+            llm_identity,
+        )
 
         # 检查缓存
-        if cache_key in self.intent_cache:
-            cache_entry = self.intent_cache[cache_key]
-            # 检查缓存是否过期
-            if time.time() - cache_entry["timestamp"] <= self.cache_expiry:
-                cache_time = time.time() - total_start_time
-                logger.bind(tag=TAG).debug(
-                    f"使用缓存的意图: {cache_key} -> {cache_entry['intent']}, 耗时: {cache_time:.4f}秒"
-                )
-                return cache_entry["intent"]
-
-        # 清理缓存
-        self.clean_cache()
-
-        if self.promot == "":
-            functions = conn.func_handler.get_functions()
-            if hasattr(conn, "mcp_client"):
-                mcp_tools = conn.mcp_client.get_available_tools()
-                if mcp_tools is not None and len(mcp_tools) > 0:
-                    if functions is None:
-                        functions = []
-                    functions.extend(mcp_tools)
-
-            self.promot = self.get_intent_system_prompt(functions)
-
-        music_config = initialize_music_handler(conn)
-        music_file_names = music_config["music_file_names"]
-        prompt_music = f"{self.promot}\n<musicNames>{music_file_names}\n</musicNames>"
-
-        devices = conn.config["plugins"]["home_assistant"].get("devices", [])
-        if len(devices) > 0:
-            hass_prompt = "\n下面是我家智能设备列表（位置，设备名，entity_id），可以通过homeassistant控制\n"
-            for device in devices:
-                hass_prompt += device + "\n"
-            prompt_music += hass_prompt
-
-        logger.bind(tag=TAG).debug(f"User prompt: {prompt_music}")
+        cached_intent = self.intent_cache.get(cache_key)
+        if cached_intent is not None:
+            cache_time = time.time() - total_start_time
+            logger.bind(tag=TAG).debug(
+                f"使用缓存的意图: {cache_key} -> {cached_intent}, 耗时: {cache_time:.4f}秒"
+            )
+            if '"continue_chat"' in cached_intent:
+                self.clean_tool_history(conn)
+            return cached_intent
 
         # 构建用户对话历史的提示
         msgStr = ""
@@ -200,8 +236,8 @@ class IntentProvider(IntentProviderBase):
         llm_start_time = time.time()
         logger.bind(tag=TAG).debug(f"开始LLM意图识别调用, 模型: {model_info}")
 
-        intent = self.llm.response_no_stream(
-            system_prompt=prompt_music, user_prompt=user_prompt
+        intent = await self.llm.aresponse_no_stream(
+            system_prompt=system_prompt, user_prompt=user_prompt
         )
 
         # 记录LLM调用完成时间
@@ -242,19 +278,10 @@ class IntentProvider(IntentProviderBase):
 
                 # 如果是继续聊天，清理工具调用相关的历史消息
                 if function_name == "continue_chat":
-                    # 保留非工具相关的消息
-                    clean_history = [
-                        msg
-                        for msg in conn.dialogue.dialogue
-                        if msg.role not in ["tool", "function"]
-                    ]
-                    conn.dialogue.dialogue = clean_history
+                    self.clean_tool_history(conn)
 
                 # 添加到缓存
-                self.intent_cache[cache_key] = {
-                    "intent": intent,
-                    "timestamp": time.time(),
-                }
+                self.intent_cache.put(cache_key, intent, llm_time)
 
                 # 后处理时间
                 postprocess_time = time.time() - postprocess_start_time
@@ -264,10 +291,7 @@ class IntentProvider(IntentProviderBase):
                 return intent
             else:
                 # 添加到缓存
-                self.intent_cache[cache_key] = {
-                    "intent": intent,
-                    "timestamp": time.time(),
-                }
+                self.intent_cache.put(cache_key, intent, llm_time)
 
                 # 后处理时间
                 postprocess_time = time.time() - postprocess_start_time
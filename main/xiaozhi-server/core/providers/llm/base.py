@@ -1,5 +1,7 @@
+import asyncio
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
+from core.utils.runtime import get_runtime
 
 TAG = __name__
 logger = setup_logging()
@@ -37,3 +39,73 @@ class LLMProviderBase(ABC):
         for token in self.response(session_id, dialogue):
             yield token, None
 
+    async def aresponse_no_stream(self, system_prompt, user_prompt, **kwargs):
+        """response_no_stream 的异步版本，在事件循环中调用时不阻塞"""
+        try:
+            dialogue = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            result = ""
+            async for part in self.aresponse("", dialogue, **kwargs):
+                result += part
+            return result
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in async response generation: {e}")
+            return "【LLM服务响应异常】"
+
+    async def aresponse(self, session_id, dialogue, **kwargs):
+        """
+        LLM response async generator
+        默认实现在共享线程池中逐个读取同步生成器，支持原生异步请求的provider应覆盖此方法
+        """
+        async for token in _iterate_in_thread(
+            self.response(session_id, dialogue, **kwargs)
+        ):
+            yield token
+
+    async def aresponse_with_functions(self, session_id, dialogue, functions=None):
+        """
+        Async version of response_with_functions, yields (content, tool_calls)
+        默认实现在共享线程池中读取同步的 response_with_functions
+        """
+        async for item in _iterate_in_thread(
+            self.response_with_functions(session_id, dialogue, functions=functions)
+        ):
+            yield item
+
+
+_DONE = object()
+
+
+def _close_generator(generator):
+    try:
+        generator.close()
+    except ValueError:
+        # 生成器仍在其它线程中执行
+        pass
+
+
+async def _iterate_in_thread(generator):
+    """在chat线程池中逐个读取同步生成器，不阻塞事件循环"""
+    if generator is None:
+        return
+    runtime = get_runtime()
+    pending = None
+    try:
+        while True:
+            pending = runtime.submit("chat", next, generator, _DONE)
+            item = await asyncio.wrap_future(pending)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # 提前退出（如被打断）时关闭生成器，释放底层的HTTP连接
+        if pending is not None and not pending.done():
+            # 被取消时线程中的 next 还没有返回，不能同时关闭生成器，等它返回后再关闭
+            pending.add_done_callback(
+                lambda _: runtime.submit("chat", _close_generator, generator)
+            )
+        else:
+            await runtime.run("chat", _close_generator, generator)
@@ -3,6 +3,7 @@ from config.logger import setup_logging
 import requests
 from core.providers.llm.base import LLMProviderBase
 from core.utils.util import check_model_key
+from core.utils.http_pool import get_async_http_client
 
 TAG = __name__
 logger = setup_logging()
@@ -67,7 +68,55 @@ class LLMProvider(LLMProviderBase):
             logger.bind(tag=TAG).error(f"Error in response generation: {e}")
             yield "【服务响应异常】"
 
+    async def aresponse(self, session_id, dialogue, **kwargs):
+        try:
+            # 取最后一条用户消息
+            last_msg = next(m for m in reversed(dialogue) if m["role"] == "user")
+
+            # 发起流式请求，复用共享的长连接
+            client = get_async_http_client(self.base_url)
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "stream": True,
+                    "chatId": session_id,
+                    "detail": self.detail,
+                    "variables": self.variables,
+                    "messages": [{"role": "user", "content": last_msg["content"]}],
+                },
+            ) as r:
+                async for line in r.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if line[6:] == "[DONE]":
+                        break
+                    try:
+                        data = json.loads(line[6:])
+                    except json.JSONDecodeError:
+                        continue
+                    if "choices" in data and len(data["choices"]) > 0:
+                        delta = data["choices"][0].get("delta", {})
+                        if delta and delta.get("content") is not None:
+                            content = delta["content"]
+                            if "<think>" in content or "</think>" in content:
+                                continue
+                            yield content
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in response generation: {e}")
+            yield "【服务响应异常】"
+
     def response_with_functions(self, session_id, dialogue, functions=None):
         logger.bind(tag=TAG).error(
-            f"fastgpt暂未实现完整的工具调用（function call），建议使用其他意图识别"
+            "fastgpt暂未实现完整的工具调用（function call），建议使用其他意图识别"
+        )
+
+    async def aresponse_with_functions(self, session_id, dialogue, functions=None):
+        logger.bind(tag=TAG).error(
+            "fastgpt暂未实现完整的工具调用（function call），建议使用其他意图识别"
         )
+        # 不带工具直接回复
+        async for token in self.aresponse(session_id, dialogue):
+            yield token, None
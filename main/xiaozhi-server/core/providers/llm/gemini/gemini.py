@@ -89,10 +89,15 @@ class LLMProvider(LLMProviderBase):
             history: list[Content] = []
             system_instruction = None
 
-            if dialogue and dialogue[0].get("role") == "system":
-                system_instruction = dialogue[0].get("content")
-                system_instruction = emotional_prompt + system_instruction
-                dialogue = dialogue[1:]
+            # Gemini only takes one system instruction: merge the system prompt, summary and memory messages
+            system_parts = [
+                str(m.get("content"))
+                for m in dialogue
+                if m.get("role") == "system" and m.get("content")
+            ]
+            if system_parts:
+                system_instruction = emotional_prompt + "\n\n".join(system_parts)
+                dialogue = [m for m in dialogue if m.get("role") != "system"]
 
             model = GenerativeModel(self.model_name, system_instruction=system_instruction)
             log.bind(tag=TAG).info(f"Creating new chat session for {session_id} with model {self.model_name} and system instruction: {system_instruction}")
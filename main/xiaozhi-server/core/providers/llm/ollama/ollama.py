@@ -2,6 +2,7 @@ from config.logger import setup_logging
 from openai import OpenAI
 import json
 from core.providers.llm.base import LLMProviderBase
+from core.utils.http_pool import get_async_openai
 
 TAG = __name__
 logger = setup_logging()
@@ -24,25 +25,29 @@ class LLMProvider(LLMProviderBase):
         # 检查是否是qwen3模型
         self.is_qwen3 = self.model_name and self.model_name.lower().startswith("qwen3")
 
+    def _prepare_dialogue(self, dialogue):
+        """如果是qwen3模型，在用户最后一条消息中添加/no_think指令"""
+        if not self.is_qwen3:
+            return dialogue
+
+        # 复制对话列表，避免修改原始对话
+        dialogue_copy = dialogue.copy()
+
+        # 找到最后一条用户消息
+        for i in range(len(dialogue_copy) - 1, -1, -1):
+            if dialogue_copy[i]["role"] == "user":
+                # 在用户消息前添加/no_think指令
+                dialogue_copy[i] = dict(
+                    dialogue_copy[i], content="/no_think " + dialogue_copy[i]["content"]
+                )
+                logger.bind(tag=TAG).debug(f"为qwen3模型添加/no_think指令")
+                break
+
+        return dialogue_copy
+
     def response(self, session_id, dialogue, **kwargs):
         try:
-            # 如果是qwen3模型，在用户最后一条消息中添加/no_think指令
-            if self.is_qwen3:
-                # 复制对话列表，避免修改原始对话
-                dialogue_copy = dialogue.copy()
-
-                # 找到最后一条用户消息
-                for i in range(len(dialogue_copy) - 1, -1, -1):
-                    if dialogue_copy[i]["role"] == "user":
-                        # 在用户消息前添加/no_think指令
-                        dialogue_copy[i]["content"] = (
-                            "/no_think " + dialogue_copy[i]["content"]
-                        )
-                        logger.bind(tag=TAG).debug(f"为qwen3模型添加/no_think指令")
-                        break
-
-                # 使用修改后的对话
-                dialogue = dialogue_copy
+            dialogue = self._prepare_dialogue(dialogue)
 
             responses = self.client.chat.completions.create(
                 model=self.model_name, messages=dialogue, stream=True
@@ -95,23 +100,7 @@ class LLMProvider(LLMProviderBase):
 
     def response_with_functions(self, session_id, dialogue, functions=None):
         try:
-            # 如果是qwen3模型，在用户最后一条消息中添加/no_think指令
-            if self.is_qwen3:
-                # 复制对话列表，避免修改原始对话
-                dialogue_copy = dialogue.copy()
-
-                # 找到最后一条用户消息
-                for i in range(len(dialogue_copy) - 1, -1, -1):
-                    if dialogue_copy[i]["role"] == "user":
-                        # 在用户消息前添加/no_think指令
-                        dialogue_copy[i]["content"] = (
-                            "/no_think " + dialogue_copy[i]["content"]
-                        )
-                        logger.bind(tag=TAG).debug(f"为qwen3模型添加/no_think指令")
-                        break
-
-                # 使用修改后的对话
-                dialogue = dialogue_copy
+            dialogue = self._prepare_dialogue(dialogue)
 
             stream = self.client.chat.completions.create(
                 model=self.model_name,
@@ -173,3 +162,113 @@ class LLMProvider(LLMProviderBase):
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in Ollama function call: {e}")
             yield f"【Ollama服务响应异常: {str(e)}】", None
+
+    async def aresponse(self, session_id, dialogue, **kwargs):
+        try:
+            dialogue = self._prepare_dialogue(dialogue)
+            client = get_async_openai(self.base_url, "ollama")
+            responses = await client.chat.completions.create(
+                model=self.model_name, messages=dialogue, stream=True
+            )
+            is_active = True
+            # 用于处理跨chunk的标签
+            buffer = ""
+
+            async with responses:
+                async for chunk in responses:
+                    try:
+                        delta = (
+                            chunk.choices[0].delta
+                            if getattr(chunk, "choices", None)
+                            else None
+                        )
+                        content = delta.content if hasattr(delta, "content") else ""
+
+                        if content:
+                            buffer += content
+
+                            # 处理缓冲区中的标签
+                            while "<think>" in buffer and "</think>" in buffer:
+                                pre = buffer.split("<think>", 1)[0]
+                                post = buffer.split("</think>", 1)[1]
+                                buffer = pre + post
+
+                            if "<think>" in buffer:
+                                is_active = False
+                                buffer = buffer.split("<think>", 1)[0]
+
+                            if "</think>" in buffer:
+                                is_active = True
+                                buffer = buffer.split("</think>", 1)[1]
+
+                            if is_active and buffer:
+                                yield buffer
+                                buffer = ""
+
+                    except Exception as e:
+                        logger.bind(tag=TAG).error(f"Error processing chunk: {e}")
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Ollama response generation: {e}")
+            yield "【Ollama服务响应异常】"
+
+    async def aresponse_with_functions(self, session_id, dialogue, functions=None):
+        try:
+            dialogue = self._prepare_dialogue(dialogue)
+            client = get_async_openai(self.base_url, "ollama")
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                tools=functions,
+            )
+
+            is_active = True
+            buffer = ""
+
+            async with stream:
+                async for chunk in stream:
+                    try:
+                        delta = (
+                            chunk.choices[0].delta
+                            if getattr(chunk, "choices", None)
+                            else None
+                        )
+                        content = delta.content if hasattr(delta, "content") else None
+                        tool_calls = (
+                            delta.tool_calls if hasattr(delta, "tool_calls") else None
+                        )
+
+                        # 如果是工具调用，直接传递
+                        if tool_calls:
+                            yield None, tool_calls
+                            continue
+
+                        if content:
+                            buffer += content
+
+                            while "<think>" in buffer and "</think>" in buffer:
+                                pre = buffer.split("<think>", 1)[0]
+                                post = buffer.split("</think>", 1)[1]
+                                buffer = pre + post
+
+                            if "<think>" in buffer:
+                                is_active = False
+                                buffer = buffer.split("<think>", 1)[0]
+
+                            if "</think>" in buffer:
+                                is_active = True
+                                buffer = buffer.split("</think>", 1)[1]
+
+                            if is_active and buffer:
+                                yield buffer, None
+                                buffer = ""
+                    except Exception as e:
+                        logger.bind(tag=TAG).error(
+                            f"Error processing function chunk: {e}"
+                        )
+                        continue
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Ollama function call: {e}")
+            yield f"【Ollama服务响应异常: {str(e)}】", None
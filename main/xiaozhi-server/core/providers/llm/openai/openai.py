@@ -2,6 +2,8 @@ import openai
 from openai.types import CompletionUsage
 from config.logger import setup_logging
 from core.utils.util import check_model_key
+from core.utils.http_pool import get_async_openai
+from core.utils.prompt_assembler import record_usage
 from core.providers.llm.base import LLMProviderBase
 
 TAG = __name__
@@ -39,6 +41,14 @@ class LLMProvider(LLMProviderBase):
             f"意图识别参数初始化: {self.temperature}, {self.max_tokens}, {self.top_p}, {self.frequency_penalty}"
         )
 
+        # 流式响应最后返回token用量（含命中前缀缓存的token数），部分兼容接口不认识 stream_options 会报错，需在配置中开启
+        include_usage = config.get("include_usage", False)
+        self.stream_options = (
+            {"include_usage": True}
+            if str(include_usage).lower() in ("true", "1", "yes")
+            else openai.NOT_GIVEN
+        )
+
         model_key_msg = check_model_key("LLM", self.api_key)
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
@@ -50,6 +60,7 @@ class LLMProvider(LLMProviderBase):
                 model=self.model_name,
                 messages=dialogue,
                 stream=True,
+                stream_options=self.stream_options,
                 max_tokens=kwargs.get("max_tokens", self.max_tokens),
                 temperature=kwargs.get("temperature", self.temperature),
                 top_p=kwargs.get("top_p", self.top_p),
@@ -60,6 +71,8 @@ class LLMProvider(LLMProviderBase):
 
             is_active = True
             for chunk in responses:
+                if isinstance(getattr(chunk, "usage", None), CompletionUsage):
+                    record_usage(session_id, chunk.usage)
                 try:
                     # 检查是否存在有效的choice且content不为空
                     delta = (
@@ -83,11 +96,16 @@ class LLMProvider(LLMProviderBase):
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in response generation: {e}")
+            yield f"【OpenAI服务响应异常: {e}】"
 
     def response_with_functions(self, session_id, dialogue, functions=None):
         try:
             stream = self.client.chat.completions.create(
-                model=self.model_name, messages=dialogue, stream=True, tools=functions
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                tools=functions,
+                stream_options=self.stream_options,
             )
 
             for chunk in stream:
@@ -99,6 +117,7 @@ class LLMProvider(LLMProviderBase):
                 # 存在 CompletionUsage 消息时，生成 Token 消耗 log
                 elif isinstance(getattr(chunk, "usage", None), CompletionUsage):
                     usage_info = getattr(chunk, "usage", None)
+                    record_usage(session_id, usage_info)
                     logger.bind(tag=TAG).info(
                         f"Token 消耗：输入 {getattr(usage_info, 'prompt_tokens', '未知')}，"
                         f"输出 {getattr(usage_info, 'completion_tokens', '未知')}，"
@@ -108,3 +127,81 @@ class LLMProvider(LLMProviderBase):
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in function call streaming: {e}")
             yield f"【OpenAI服务响应异常: {e}】", None
+
+    async def aresponse(self, session_id, dialogue, **kwargs):
+        try:
+            client = get_async_openai(self.base_url, self.api_key)
+            responses = await client.chat.completions.create(
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                stream_options=self.stream_options,
+                max_tokens=kwargs.get("max_tokens", self.max_tokens),
+                temperature=kwargs.get("temperature", self.temperature),
+                top_p=kwargs.get("top_p", self.top_p),
+                frequency_penalty=kwargs.get(
+                    "frequency_penalty", self.frequency_penalty
+                ),
+            )
+
+            is_active = True
+            async with responses:
+                async for chunk in responses:
+                    if isinstance(getattr(chunk, "usage", None), CompletionUsage):
+                        record_usage(session_id, chunk.usage)
+                    try:
+                        # 检查是否存在有效的choice且content不为空
+                        delta = (
+                            chunk.choices[0].delta
+                            if getattr(chunk, "choices", None)
+                            else None
+                        )
+                        content = delta.content if hasattr(delta, "content") else ""
+                    except IndexError:
+                        content = ""
+                    if content:
+                        # 处理标签跨多个chunk的情况
+                        if "<think>" in content:
+                            is_active = False
+                            content = content.split("<think>")[0]
+                        if "</think>" in content:
+                            is_active = True
+                            content = content.split("</think>")[-1]
+                        if is_active:
+                            yield content
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in response generation: {e}")
+            yield f"【OpenAI服务响应异常: {e}】"
+
+    async def aresponse_with_functions(self, session_id, dialogue, functions=None):
+        try:
+            client = get_async_openai(self.base_url, self.api_key)
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                tools=functions,
+                stream_options=self.stream_options,
+            )
+
+            async with stream:
+                async for chunk in stream:
+                    # 检查是否存在有效的choice且content不为空
+                    if getattr(chunk, "choices", None):
+                        yield chunk.choices[0].delta.content, chunk.choices[
+                            0
+                        ].delta.tool_calls
+                    # 存在 CompletionUsage 消息时，生成 Token 消耗 log
+                    elif isinstance(getattr(chunk, "usage", None), CompletionUsage):
+                        usage_info = getattr(chunk, "usage", None)
+                        record_usage(session_id, usage_info)
+                        logger.bind(tag=TAG).info(
+                            f"Token 消耗：输入 {getattr(usage_info, 'prompt_tokens', '未知')}，"
+                            f"输出 {getattr(usage_info, 'completion_tokens', '未知')}，"
+                            f"共计 {getattr(usage_info, 'total_tokens', '未知')}"
+                        )
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in function call streaming: {e}")
+            yield f"【OpenAI服务响应异常: {e}】", None
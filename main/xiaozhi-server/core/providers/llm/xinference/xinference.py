@@ -2,6 +2,7 @@ from config.logger import setup_logging
 from openai import OpenAI
 import json
 from core.providers.llm.base import LLMProviderBase
+from core.utils.http_pool import get_async_openai
 
 TAG = __name__
 logger = setup_logging()
@@ -96,3 +97,62 @@ class LLMProvider(LLMProviderBase):
                 "type": "content",
                 "content": f"【Xinference服务响应异常: {str(e)}】",
             }
+
+    async def aresponse(self, session_id, dialogue, **kwargs):
+        try:
+            client = get_async_openai(self.base_url, "xinference")
+            responses = await client.chat.completions.create(
+                model=self.model_name, messages=dialogue, stream=True
+            )
+            is_active = True
+            async with responses:
+                async for chunk in responses:
+                    try:
+                        delta = (
+                            chunk.choices[0].delta
+                            if getattr(chunk, "choices", None)
+                            else None
+                        )
+                        content = delta.content if hasattr(delta, "content") else ""
+                        if content:
+                            if "<think>" in content:
+                                is_active = False
+                                content = content.split("<think>")[0]
+                            if "</think>" in content:
+                                is_active = True
+                                content = content.split("</think>")[-1]
+                            if is_active:
+                                yield content
+                    except Exception as e:
+                        logger.bind(tag=TAG).error(f"Error processing chunk: {e}")
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Xinference response generation: {e}")
+            yield "【Xinference服务响应异常】"
+
+    async def aresponse_with_functions(self, session_id, dialogue, functions=None):
+        try:
+            client = get_async_openai(self.base_url, "xinference")
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=dialogue,
+                stream=True,
+                tools=functions,
+            )
+
+            async with stream:
+                async for chunk in stream:
+                    if not getattr(chunk, "choices", None):
+                        continue
+                    delta = chunk.choices[0].delta
+                    content = delta.content
+                    tool_calls = delta.tool_calls
+
+                    if content:
+                        yield content, tool_calls
+                    elif tool_calls:
+                        yield None, tool_calls
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Xinference function call: {e}")
+            yield f"【Xinference服务响应异常: {str(e)}】", None
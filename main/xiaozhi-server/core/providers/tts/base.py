@@ -1,8 +1,8 @@
 import os
-import queue
 import uuid
 import asyncio
 import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from core.utils import p3
 from datetime import datetime
 from core.utils import textUtils
@@ -10,6 +10,10 @@ from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from core.utils.util import audio_to_data, audio_bytes_to_data
 from core.utils.tts import MarkdownCleaner
+from core.utils.tts_cache import get_tts_cache, config_signature
+from core.utils.runtime import StageQueue, get_runtime
+from core.utils.audio_stream import AudioFileStream
+from core.utils.asset_store import get_asset_store
 from core.utils.output_counter import add_device_output
 from core.handle.reportHandle import enqueue_tts_report
 from core.handle.sendAudioHandle import sendAudioMessage
@@ -34,10 +38,20 @@ class TTSProviderBase(ABC):
         self.delete_audio_file = delete_audio_file
         self.audio_file_type = "wav"
         self.output_file = config.get("output_dir", "tmp/")
-        self.tts_text_queue = queue.Queue()
-        self.tts_audio_queue = queue.Queue()
+        self.tts_text_queue = StageQueue("tts_text")
+        self.tts_audio_queue = StageQueue("tts_audio")
         self.tts_audio_first_sentence = True
         self.before_stop_play_files = []
+        # 预取合成：同时合成的句子数，1表示逐句合成
+        self.tts_lookahead = 1
+        self._inflight = []
+        self._inflight_lock = threading.Lock()
+        # 打断时完成的Future，与预取合成的Future一起等待，打断后不需要等到超时
+        self._abort = Future()
+        # 正在进行的TTS请求：(事件循环, 请求任务)，打断时直接取消
+        self._requests = set()
+        # 影响合成结果的配置签名，作为TTS缓存键的一部分
+        self.cache_signature = config_signature(config)
 
         self.tts_text_buff = []
         self.punctuations = (
@@ -86,8 +100,10 @@ class TTSProviderBase(ABC):
         if self.delete_audio_file:
             # 需要删除文件的直接转为音频数据
             while max_repeat_time > 0:
+                if self._is_aborted():
+                    return None
                 try:
-                    audio_bytes = asyncio.run(self.text_to_speak(text, None))
+                    audio_bytes = self._run_text_to_speak(text, None)
                     if audio_bytes:
                         audio_datas, _ = audio_bytes_to_data(
                             audio_bytes, file_type=self.audio_file_type, is_opus=True
@@ -113,8 +129,10 @@ class TTSProviderBase(ABC):
             tmp_file = self.generate_filename()
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
+                    if self._is_aborted():
+                        return None
                     try:
-                        asyncio.run(self.text_to_speak(text, tmp_file))
+                        self._run_text_to_speak(text, tmp_file)
                     except Exception as e:
                         logger.bind(tag=TAG).warning(
                             f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
@@ -138,6 +156,112 @@ class TTSProviderBase(ABC):
                 logger.bind(tag=TAG).error(f"Failed to generate TTS file: {e}")
                 return None
 
+    def _is_aborted(self):
+        return self.conn is not None and self.conn.client_abort
+
+    def _abort_signal(self) -> Future:
+        """当前的打断信号，上一次打断已经结束时换一个新的"""
+        with self._inflight_lock:
+            if self._abort.done() and not self._is_aborted():
+                self._abort = Future()
+            return self._abort
+
+    def _run_text_to_speak(self, text, output_file):
+        """执行一次TTS请求，设备打断时 cancel_synthesis 会取消正在进行的请求"""
+
+        async def run():
+            task = asyncio.ensure_future(self.text_to_speak(text, output_file))
+            request = (asyncio.get_running_loop(), task)
+            with self._inflight_lock:
+                self._requests.add(request)
+            try:
+                if self._is_aborted():
+                    task.cancel()
+                return await task
+            except asyncio.CancelledError:
+                return None
+            finally:
+                with self._inflight_lock:
+                    self._requests.discard(request)
+
+        return asyncio.run(run())
+
+    def cache_key(self, text):
+        """TTS缓存键：TTS类型、音色、文本、输出格式"""
+        # 需要删除文件时 to_tts 直接输出opus，否则按设备的音频格式转换
+        audio_format = "opus"
+        if not self.delete_audio_file and self.conn and self.conn.audio_format == "pcm":
+            audio_format = "pcm"
+        provider = self.__class__.__module__.rsplit(".", 1)[-1]
+        voice = f"{getattr(self, 'voice', '')}|{self.cache_signature}"
+        return get_tts_cache().make_key(provider, voice, text, audio_format)
+
+    def synthesize(self, text):
+        """合成一句话并返回音频数据，相同的句子优先从缓存读取，不再调用TTS接口"""
+        cache = get_tts_cache()
+        key = self.cache_key(text)
+        audio_datas = cache.get(key)
+        if audio_datas:
+            logger.bind(tag=TAG).debug(f"TTS缓存命中: {text}")
+            return audio_datas
+
+        if self.delete_audio_file:
+            audio_datas = self.to_tts(text)
+        else:
+            tts_file = self.to_tts(text)
+            audio_datas = None
+            if tts_file and os.path.exists(tts_file):
+                audio_datas = self._process_audio_file(tts_file)
+        if audio_datas:
+            cache.put(key, audio_datas)
+        return audio_datas
+
+    def _enqueue_segment(self, sentence_type, segment_text):
+        """合成一句话并放入播放队列
+
+        开启预取时把合成任务提交到 tts_synth 线程池，队列中按顺序放入 Future，
+        播放任务按入队顺序等待结果，因此多句并发合成，播放顺序仍与文本顺序一致。
+        """
+        if self.tts_lookahead <= 1:
+            audio_datas = self.synthesize(segment_text)
+            if audio_datas:
+                self.tts_audio_queue.put((sentence_type, audio_datas, segment_text))
+            return
+
+        future = get_runtime().submit("tts_synth", self.synthesize, segment_text)
+        with self._inflight_lock:
+            self._inflight.append(future)
+        self.tts_audio_queue.put((sentence_type, future, segment_text))
+
+        # 同时合成的句子数达到上限时，等待最早的一句完成或被打断
+        while not self._is_aborted():
+            with self._inflight_lock:
+                self._inflight = [f for f in self._inflight if not f.done()]
+                inflight = list(self._inflight)
+            if len(inflight) < self.tts_lookahead:
+                break
+            wait(
+                inflight + [self._abort_signal()],
+                timeout=self.tts_timeout,
+                return_when=FIRST_COMPLETED,
+            )
+
+    def cancel_synthesis(self):
+        """打断时取消尚未完成的预取合成和正在进行的TTS请求，唤醒等待合成结果的线程"""
+        with self._inflight_lock:
+            inflight, self._inflight = self._inflight, []
+            requests = list(self._requests)
+            if not self._abort.done():
+                self._abort.set_result(True)
+        for future in inflight:
+            future.cancel()
+        for loop, task in requests:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # 请求刚结束，事件循环已关闭
+                pass
+
     @abstractmethod
     async def text_to_speak(self, text, output_file):
         pass
@@ -192,94 +316,83 @@ class TTSProviderBase(ABC):
     async def open_audio_channels(self, conn):
         self.conn = conn
         self.tts_timeout = conn.config.get("tts_timeout", 10)
-        # tts 消化线程
-        self.tts_priority_thread = threading.Thread(
-            target=self.tts_text_priority_thread, daemon=True
-        )
-        self.tts_priority_thread.start()
-
-        # 音频播放 消化线程
-        self.audio_play_priority_thread = threading.Thread(
-            target=self._audio_play_priority_thread, daemon=True
-        )
-        self.audio_play_priority_thread.start()
-
-    # 这里默认是非流式的处理方式
-    # 流式处理方式请在子类中重写
-    def tts_text_priority_thread(self):
+        self.tts_lookahead = int(conn.config.get("tts_lookahead", 1) or 1)
+        # tts 消化任务
+        conn.spawn_worker(self._tts_text_priority_task())
+        # 音频播放 消化任务
+        conn.spawn_worker(self._audio_play_priority_task())
+
+    async def _tts_text_priority_task(self):
+        """按顺序取出TTS文本，在共享的tts线程池中处理"""
+        runtime = get_runtime()
         while not self.conn.stop_event.is_set():
+            message = await self.tts_text_queue.async_get()
             try:
-                message = self.tts_text_queue.get(timeout=1)
-                if self.conn.client_abort:
-                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
-                    continue
-                if message.sentence_type == SentenceType.FIRST:
-                    # 初始化参数
-                    self.tts_stop_request = False
-                    self.processed_chars = 0
-                    self.tts_text_buff = []
-                    self.is_first_sentence = True
-                    self.tts_audio_first_sentence = True
-                elif ContentType.TEXT == message.content_type:
-                    self.tts_text_buff.append(message.content_detail)
-                    segment_text = self._get_segment_text()
-                    if segment_text:
-                        if self.delete_audio_file:
-                            audio_datas = self.to_tts(segment_text)
-                            if audio_datas:
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
-                        else:
-                            tts_file = self.to_tts(segment_text)
-                            if tts_file:
-                                audio_datas = self._process_audio_file(tts_file)
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
-                elif ContentType.FILE == message.content_type:
-                    self._process_remaining_text()
-                    tts_file = message.content_file
-                    if tts_file and os.path.exists(tts_file):
-                        audio_datas = self._process_audio_file(tts_file)
-                        self.tts_audio_queue.put(
-                            (message.sentence_type, audio_datas, message.content_detail)
-                        )
-
-                if message.sentence_type == SentenceType.LAST:
-                    self._process_remaining_text()
-                    self.tts_audio_queue.put(
-                        (message.sentence_type, [], message.content_detail)
-                    )
-
-            except queue.Empty:
-                continue
+                await runtime.run("tts", self.handle_tts_text_message, message)
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
                 )
-                continue
 
-    def _audio_play_priority_thread(self):
+    # 这里默认是非流式的处理方式
+    # 流式处理方式请在子类中重写
+    def handle_tts_text_message(self, message):
+        if self.conn.client_abort:
+            logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
+            return
+        if message.sentence_type == SentenceType.FIRST:
+            # 初始化参数
+            self.tts_stop_request = False
+            self.processed_chars = 0
+            self.tts_text_buff = []
+            self.is_first_sentence = True
+            self.tts_audio_first_sentence = True
+        elif ContentType.TEXT == message.content_type:
+            self.tts_text_buff.append(message.content_detail)
+            segment_text = self._get_segment_text()
+            if segment_text:
+                self._enqueue_segment(message.sentence_type, segment_text)
+        elif ContentType.FILE == message.content_type:
+            self._process_remaining_text()
+            tts_file = message.content_file
+            if tts_file and os.path.exists(tts_file):
+                audio_datas = self._audio_file_source(tts_file)
+                self.tts_audio_queue.put(
+                    (message.sentence_type, audio_datas, message.content_detail)
+                )
+
+        if message.sentence_type == SentenceType.LAST:
+            self._process_remaining_text()
+            self.tts_audio_queue.put(
+                (message.sentence_type, [], message.content_detail)
+            )
+
+    async def _audio_play_priority_task(self):
         while not self.conn.stop_event.is_set():
             text = None
             try:
-                try:
-                    sentence_type, audio_datas, text = self.tts_audio_queue.get(
-                        timeout=1
-                    )
-                except queue.Empty:
-                    if self.conn.stop_event.is_set():
-                        break
-                    continue
-                future = asyncio.run_coroutine_threadsafe(
-                    sendAudioMessage(self.conn, sentence_type, audio_datas, text),
-                    self.conn.loop,
+                sentence_type, audio_datas, text = (
+                    await self.tts_audio_queue.async_get()
                 )
-                future.result()
+                if isinstance(audio_datas, Future):
+                    # 预取合成的句子，按入队顺序等待合成结果
+                    future = audio_datas
+                    try:
+                        audio_datas = await asyncio.wrap_future(future)
+                    except asyncio.CancelledError:
+                        if not future.cancelled():
+                            raise
+                        continue
+                    if not audio_datas:
+                        continue
+                await sendAudioMessage(self.conn, sentence_type, audio_datas, text)
                 if self.conn.max_output_size > 0 and text:
                     add_device_output(self.conn.headers.get("device-id"), len(text))
-                enqueue_tts_report(self.conn, text, audio_datas)
+                if isinstance(audio_datas, AudioFileStream):
+                    # 音乐等文件只上报文本，不保留整段音频
+                    enqueue_tts_report(self.conn, text, [])
+                else:
+                    enqueue_tts_report(self.conn, text, audio_datas)
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"audio_play_priority priority_thread: {text} {e}"
@@ -362,10 +475,21 @@ class TTSProviderBase(ABC):
             os.remove(tts_file)
         return audio_datas
 
+    def _audio_file_source(self, tts_file):
+        """播放的音频文件：本次合成的临时文件整段解码，音乐等其它文件边解码边播放，已转码为p3的直接读取"""
+        if self.delete_audio_file and tts_file.startswith(self.output_file):
+            return self._process_audio_file(tts_file)
+        is_opus = self.conn.audio_format != "pcm"
+        if is_opus:
+            p3_file = get_asset_store().lookup(tts_file)
+            if p3_file is not None:
+                tts_file = p3_file
+        return AudioFileStream(tts_file, is_opus=is_opus)
+
     def _process_before_stop_play_files(self):
         for tts_file, text in self.before_stop_play_files:
             if tts_file and os.path.exists(tts_file):
-                audio_datas = self._process_audio_file(tts_file)
+                audio_datas = self._audio_file_source(tts_file)
                 self.tts_audio_queue.put((SentenceType.MIDDLE, audio_datas, text))
         self.before_stop_play_files.clear()
         self.tts_audio_queue.put((SentenceType.LAST, [], None))
@@ -381,18 +505,7 @@ class TTSProviderBase(ABC):
         if remaining_text:
             segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
             if segment_text:
-                if self.delete_audio_file:
-                    audio_datas = self.to_tts(segment_text)
-                    if audio_datas:
-                        self.tts_audio_queue.put(
-                            (SentenceType.MIDDLE, audio_datas, segment_text)
-                        )
-                else:
-                    tts_file = self.to_tts(segment_text)
-                    audio_datas = self._process_audio_file(tts_file)
-                    self.tts_audio_queue.put(
-                        (SentenceType.MIDDLE, audio_datas, segment_text)
-                    )
+                self._enqueue_segment(SentenceType.MIDDLE, segment_text)
                 self.processed_chars += len(full_text)
                 return True
         return False
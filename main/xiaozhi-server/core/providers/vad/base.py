@@ -1,5 +1,5 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
 
 
 class VADProviderBase(ABC):
@@ -7,3 +7,21 @@ class VADProviderBase(ABC):
     def is_vad(self, conn, data) -> bool:
         """检测音频数据中的语音活动"""
         pass
+
+    async def is_vad_async(self, conn, data) -> bool:
+        """在事件循环中检测语音活动，默认直接调用 is_vad，支持跨连接批量推理的实现可重写"""
+        return self.is_vad(conn, data)
+
+    def _update_voice_state(self, conn, speech_prob) -> bool:
+        """根据一个窗口的语音概率更新连接的说话状态，需要子类设置 vad_threshold 和 silence_threshold_ms"""
+        client_have_voice = speech_prob >= self.vad_threshold
+
+        # 如果之前有声音，但本次没有声音，且与上次有声音的时间差已经超过了静默阈值，则认为已经说完一句话
+        if conn.client_have_voice and not client_have_voice:
+            stop_duration = time.time() * 1000 - conn.client_have_voice_last_time
+            if stop_duration >= self.silence_threshold_ms:
+                conn.client_voice_stop = True
+        if client_have_voice:
+            conn.client_have_voice = True
+            conn.client_have_voice_last_time = time.time() * 1000
+        return client_have_voice
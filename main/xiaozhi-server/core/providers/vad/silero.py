@@ -1,13 +1,28 @@
-import time
 import numpy as np
 import torch
 import opuslib_next
 from config.logger import setup_logging
+from core.utils.batching import MicroBatcher
 from core.providers.vad.base import VADProviderBase
 
 TAG = __name__
 logger = setup_logging()
 
+# 每个窗口的采样点数（16kHz下32ms）
+WINDOW_SAMPLES = 512
+# 模型每次需要带上的上一窗口末尾采样点数
+CONTEXT_SAMPLES = 64
+
+
+class SileroStreamState:
+    """单个连接的Silero模型状态，批量推理时按连接分别保存"""
+
+    def __init__(self):
+        self.rnn = np.zeros((2, 128), dtype=np.float32)
+        self.context = np.zeros(CONTEXT_SAMPLES, dtype=np.float32)
+        # 当前窗口，同一连接的窗口按顺序推理，可以复用
+        self.window = np.zeros(WINDOW_SAMPLES, dtype=np.float32)
+
 
 class VADProvider(VADProviderBase):
     def __init__(self, config):
@@ -19,8 +34,6 @@ class VADProvider(VADProviderBase):
             force_reload=False,
         )
 
-        self.decoder = opuslib_next.Decoder(16000, 1)
-
         # 处理空字符串的情况
         threshold = config.get("threshold", "0.5")
         min_silence_duration_ms = config.get("min_silence_duration_ms", "1000")
@@ -30,39 +43,92 @@ class VADProvider(VADProviderBase):
             int(min_silence_duration_ms) if min_silence_duration_ms else 1000
         )
 
+        # 跨连接批量推理，模型需要暴露RNN状态才能按连接分别保存
+        batch_max_size = config.get("batch_max_size", 64)
+        batch_wait_ms = config.get("batch_wait_ms", 4)
+        self.batch_supported = hasattr(self.model, "_state") and hasattr(
+            self.model, "_context"
+        )
+        if not self.batch_supported:
+            logger.bind(tag=TAG).warning(
+                "Silero model does not expose its state, batch inference disabled"
+            )
+        self.batcher = MicroBatcher(
+            "silero_vad",
+            self._infer_batch,
+            max_batch_size=int(batch_max_size) if batch_max_size else 64,
+            max_wait_ms=float(batch_wait_ms) if batch_wait_ms else 0,
+        )
+
+    def _infer_batch(self, items):
+        """在批处理线程中执行，items为 [(SileroStreamState, 512点float32窗口), ...]"""
+        if not self.batch_supported:
+            with torch.no_grad():
+                return [
+                    self.model(torch.from_numpy(window), 16000).item()
+                    for _, window in items
+                ]
+
+        batch_size = len(items)
+        audio = torch.from_numpy(np.stack([window for _, window in items]))
+        # 把各连接的状态拼成一批，推理后再拆回去
+        self.model._state = torch.from_numpy(
+            np.stack([state.rnn for state, _ in items], axis=1)
+        )
+        self.model._context = torch.from_numpy(
+            np.stack([state.context for state, _ in items])
+        )
+        self.model._last_sr = 16000
+        self.model._last_batch_size = batch_size
+        with torch.no_grad():
+            out = self.model(audio, 16000)
+        rnn = self.model._state.numpy()
+        context = self.model._context.numpy()
+        for i, (state, _) in enumerate(items):
+            state.rnn[:] = rnn[:, i]
+            state.context[:] = context[i]
+        return out[:, 0].tolist()
+
+    def _get_state(self, conn):
+        if not isinstance(conn.vad_state, SileroStreamState):
+            conn.vad_state = SileroStreamState()
+        return conn.vad_state
+
+    def _next_window(self, conn, state):
+        """从缓冲区取出下一个512点窗口，归一化后写入连接的窗口缓冲区，不足一个窗口时返回None"""
+        return conn.client_audio_buffer.read_float32(out=state.window)
+
     def is_vad(self, conn, opus_packet):
         try:
-            pcm_frame = self.decoder.decode(opus_packet, 960)
-            conn.client_audio_buffer.extend(pcm_frame)  # 将新数据加入缓冲区
+            state = self._get_state(conn)
+            pcm_frame = conn.decode_audio(opus_packet)
+            conn.client_audio_buffer.write(pcm_frame)  # 将新数据加入缓冲区
 
-            # 处理缓冲区中的完整帧（每次处理512采样点）
             client_have_voice = False
-            while len(conn.client_audio_buffer) >= 512 * 2:
-                # 提取前512个采样点（1024字节）
-                chunk = conn.client_audio_buffer[: 512 * 2]
-                conn.client_audio_buffer = conn.client_audio_buffer[512 * 2 :]
-
-                # 转换为模型需要的张量格式
-                audio_int16 = np.frombuffer(chunk, dtype=np.int16)
-                audio_float32 = audio_int16.astype(np.float32) / 32768.0
-                audio_tensor = torch.from_numpy(audio_float32)
-
-                # 检测语音活动
-                with torch.no_grad():
-                    speech_prob = self.model(audio_tensor, 16000).item()
-                client_have_voice = speech_prob >= self.vad_threshold
-
-                # 如果之前有声音，但本次没有声音，且与上次有声音的时间差已经超过了静默阈值，则认为已经说完一句话
-                if conn.client_have_voice and not client_have_voice:
-                    stop_duration = (
-                        time.time() * 1000 - conn.client_have_voice_last_time
-                    )
-                    if stop_duration >= self.silence_threshold_ms:
-                        conn.client_voice_stop = True
-                if client_have_voice:
-                    conn.client_have_voice = True
-                    conn.client_have_voice_last_time = time.time() * 1000
+            window = self._next_window(conn, state)
+            while window is not None:
+                speech_prob = self.batcher.submit((state, window)).result()
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+                window = self._next_window(conn, state)
+            return client_have_voice
+        except opuslib_next.OpusError as e:
+            logger.bind(tag=TAG).info(f"解码错误: {e}")
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
 
+    async def is_vad_async(self, conn, opus_packet):
+        try:
+            state = self._get_state(conn)
+            pcm_frame = conn.decode_audio(opus_packet)
+            conn.client_audio_buffer.write(pcm_frame)  # 将新数据加入缓冲区
+
+            client_have_voice = False
+            # 同一连接的窗口必须按顺序推理，不同连接的窗口在批处理线程中合批
+            window = self._next_window(conn, state)
+            while window is not None:
+                speech_prob = await self.batcher.run((state, window))
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+                window = self._next_window(conn, state)
             return client_have_voice
         except opuslib_next.OpusError as e:
             logger.bind(tag=TAG).info(f"解码错误: {e}")
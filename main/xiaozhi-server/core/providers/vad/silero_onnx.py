@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import onnxruntime
+import opuslib_next
+from config.logger import setup_logging
+from core.providers.vad.base import VADProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+# 每个窗口的采样点数（16kHz下32ms）
+WINDOW_SAMPLES = 512
+# 模型每次需要带上的上一窗口末尾采样点数
+CONTEXT_SAMPLES = 64
+
+
+class SileroOnnxState:
+    """单个连接的模型状态，保存在 conn.vad_state 中，不同设备互不干扰"""
+
+    def __init__(self):
+        self.rnn = np.zeros((2, 1, 128), dtype=np.float32)
+        # 预分配的模型输入：前64点为上一窗口的末尾，后512点为当前窗口
+        self.input = np.zeros((1, CONTEXT_SAMPLES + WINDOW_SAMPLES), dtype=np.float32)
+
+
+class VADProvider(VADProviderBase):
+    def __init__(self, config):
+        logger.bind(tag=TAG).info("SileroVAD(onnx)", config)
+        model_file = config.get("model_file") or os.path.join(
+            config["model_dir"], "src", "silero_vad", "data", "silero_vad.onnx"
+        )
+
+        opts = onnxruntime.SessionOptions()
+        opts.inter_op_num_threads = 1
+        opts.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_file, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self.sample_rate = np.array(16000, dtype=np.int64)
+
+        # 处理空字符串的情况
+        threshold = config.get("threshold", "0.5")
+        min_silence_duration_ms = config.get("min_silence_duration_ms", "1000")
+
+        self.vad_threshold = float(threshold) if threshold else 0.5
+        self.silence_threshold_ms = (
+            int(min_silence_duration_ms) if min_silence_duration_ms else 1000
+        )
+
+    def _get_state(self, conn):
+        if not isinstance(conn.vad_state, SileroOnnxState):
+            conn.vad_state = SileroOnnxState()
+        return conn.vad_state
+
+    def _infer(self, state):
+        """对已写入输入缓冲区的512点窗口推理"""
+        out, state.rnn = self.session.run(
+            None,
+            {"input": state.input, "state": state.rnn, "sr": self.sample_rate},
+        )
+        # 当前窗口末尾作为下一次的上下文
+        state.input[0, :CONTEXT_SAMPLES] = state.input[0, -CONTEXT_SAMPLES:]
+        return float(out[0, 0])
+
+    def is_vad(self, conn, opus_packet):
+        try:
+            state = self._get_state(conn)
+            pcm_frame = conn.decode_audio(opus_packet)
+            conn.client_audio_buffer.write(pcm_frame)  # 将新数据加入缓冲区
+
+            # 处理缓冲区中的完整帧（每次处理512采样点）
+            client_have_voice = False
+            window = state.input[0, CONTEXT_SAMPLES:]
+            # 窗口直接归一化写入模型输入缓冲区
+            while conn.client_audio_buffer.read_float32(out=window) is not None:
+                # 检测语音活动
+                speech_prob = self._infer(state)
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+
+            return client_have_voice
+        except opuslib_next.OpusError as e:
+            logger.bind(tag=TAG).info(f"解码错误: {e}")
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
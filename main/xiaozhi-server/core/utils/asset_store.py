@@ -0,0 +1,393 @@
+"""
+音乐、故事音频的p3资源库
+
+play_music、christmas_story 播放的大多是mp3/wav文件，每次播放都要重新解码并编码为opus。
+这里在后台把音乐目录和故事目录中的文件各转码一次，按文件内容的sha256保存为p3文件（内容相同的文件只保存一份），
+清单文件记录每个源文件的大小、修改时间、内容哈希和对应的p3文件。
+播放时源文件的大小和修改时间与清单一致，就通过内存映射直接读取p3文件中的opus包发送，不需要任何解码；
+还没转码或已修改的文件照常边解码边播放，同时排入后台转码。
+源目录的变化在后台按 scan_interval 定期检查。可以用 prebuild_assets.py 预先转码全部文件。
+"""
+
+import os
+import json
+import time
+import struct
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from config.logger import setup_logging
+from core.utils.runtime import get_runtime
+from core.utils.audio_stream import AudioFileStream
+
+TAG = __name__
+logger = setup_logging()
+
+MANIFEST_NAME = "manifest.json"
+# 可以转码的源文件格式（p3文件本身不需要转码，txt故事由TTS朗读）
+SOURCE_EXTS = (".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aac")
+
+
+def _is_true(value) -> bool:
+    return str(value).lower() in ("true", "1", "yes")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_dirs_from_config(config: Dict[str, Any]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """音乐目录和故事目录，以及各自的文件格式"""
+    plugins = (config or {}).get("plugins") or {}
+    dirs = []
+    music = plugins.get("play_music") or {}
+    dirs.append(
+        (
+            music.get("music_dir", "./music"),
+            tuple(music.get("music_ext") or (".mp3", ".wav", ".p3")),
+        )
+    )
+    story = plugins.get("christmas_story") or {}
+    if story:
+        dirs.append(
+            (
+                story.get("story_dir", "./stories/christmas"),
+                tuple(story.get("story_ext") or (".mp3", ".wav", ".txt")),
+            )
+        )
+    return dirs
+
+
+class AssetStore:
+    def __init__(self, config: Dict[str, Any] = None):
+        store_config = (config or {}).get("asset_store") or {}
+        self.enabled = _is_true(store_config.get("enabled", True))
+        self.store_dir = store_config.get("store_dir", "data/asset_store")
+        self.scan_interval = float(store_config.get("scan_interval", 300) or 300)
+        self.sources = [
+            (os.path.abspath(directory), tuple(e.lower() for e in exts))
+            for directory, exts in source_dirs_from_config(config)
+        ]
+
+        self._lock = threading.Lock()
+        # 源文件绝对路径 -> {size, mtime, sha256, p3, frames, source_bytes, p3_bytes, transcode_seconds}
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+        self._pending = set()
+        self._scanning = False
+        self.scan_time = 0.0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.transcoded = 0
+        self.failures = 0
+
+        if self.enabled:
+            os.makedirs(self.store_dir, exist_ok=True)
+            self._load_manifest()
+        get_runtime().register_stats("asset_store", self.stats)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.store_dir, MANIFEST_NAME)
+
+    def _p3_path(self, sha256: str) -> str:
+        return os.path.join(self.store_dir, sha256[:2], f"{sha256}.p3")
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        except FileNotFoundError:
+            self._manifest = {}
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"读取资源清单失败，将重新转码: {e}")
+            self._manifest = {}
+
+    def _save_manifest(self):
+        with self._lock:
+            data = json.dumps(self._manifest, ensure_ascii=False, indent=1)
+        tmp_file = f"{self.manifest_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_file, self.manifest_path)
+
+    def is_source(self, path: str) -> bool:
+        """是否为音乐目录或故事目录中可以转码的文件，TTS临时文件等其它音频不进入资源库"""
+        lower = path.lower()
+        if not lower.endswith(SOURCE_EXTS):
+            return False
+        for directory, exts in self.sources:
+            if not lower.endswith(exts):
+                continue
+            try:
+                if os.path.commonpath((directory, path)) == directory:
+                    return True
+            except ValueError:
+                # Windows下不在同一个盘符
+                continue
+        return False
+
+    def lookup(self, source_path: str) -> Optional[str]:
+        """源文件已转码且未修改时返回p3文件路径，否则返回None并排入后台转码"""
+        if not self.enabled:
+            return None
+        path = os.path.abspath(source_path)
+        if not self.is_source(path):
+            return None
+        self.maybe_scan()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._manifest.get(path)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        ):
+            p3_path = os.path.join(self.store_dir, entry["p3"])
+            if os.path.exists(p3_path):
+                with self._lock:
+                    self.hits += 1
+                return p3_path
+        with self._lock:
+            self.misses += 1
+        self.submit(path)
+        return None
+
+    def submit(self, path: str):
+        """排入后台转码"""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+
+        def task():
+            try:
+                if self.transcode(path):
+                    self._save_manifest()
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+        get_runtime().submit("background", task)
+
+    def transcode(self, path: str, force: bool = False) -> bool:
+        """转码一个源文件，返回清单是否有变化"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        with self._lock:
+            entry = self._manifest.get(path)
+        if (
+            not force
+            and entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+            and os.path.exists(os.path.join(self.store_dir, entry["p3"]))
+        ):
+            return False
+
+        try:
+            sha256 = file_sha256(path)
+            p3_path = self._p3_path(sha256)
+            start = time.perf_counter()
+            if force or not os.path.exists(p3_path):
+                frames = self._encode_to_p3(path, p3_path)
+                transcode_seconds = time.perf_counter() - start
+            elif entry is not None and entry.get("sha256") == sha256:
+                # 只是修改时间变了，内容没变
+                frames = entry["frames"]
+                transcode_seconds = entry["transcode_seconds"]
+            else:
+                # 其它目录中内容相同的文件已经转码过
+                frames = self._count_frames(p3_path)
+                with self._lock:
+                    same = next(
+                        (e for e in self._manifest.values() if e["sha256"] == sha256),
+                        None,
+                    )
+                transcode_seconds = same["transcode_seconds"] if same else 0.0
+            new_entry = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": sha256,
+                "p3": os.path.relpath(p3_path, self.store_dir),
+                "frames": frames,
+                "source_bytes": stat.st_size,
+                "p3_bytes": os.path.getsize(p3_path),
+                "transcode_seconds": round(transcode_seconds, 4),
+            }
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.bind(tag=TAG).warning(f"转码音频失败: {path}, {e}")
+            return False
+
+        with self._lock:
+            self._manifest[path] = new_entry
+            self.transcoded += 1
+        logger.bind(tag=TAG).debug(
+            f"已转码: {path} -> {new_entry['p3']}，{new_entry['frames']}帧"
+        )
+        return True
+
+    @staticmethod
+    def _encode_to_p3(path: str, p3_path: str) -> int:
+        """边解码边写入p3文件，先写临时文件再替换"""
+        os.makedirs(os.path.dirname(p3_path), exist_ok=True)
+        tmp_file = f"{p3_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        frames = 0
+        stream = AudioFileStream(path, is_opus=True)
+        try:
+            with open(tmp_file, "wb") as f:
+                for chunk in stream:
+                    for data in chunk:
+                        f.write(struct.pack(">BBH", 0, 0, len(data)))
+                        f.write(data)
+                    frames += len(chunk)
+            os.replace(tmp_file, p3_path)
+        finally:
+            stream.close()
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return frames
+
+    @staticmethod
+    def _count_frames(p3_path: str) -> int:
+        frames = 0
+        with open(p3_path, "rb") as f:
+            while True:
+                header = f.read(4)
+                if len(header) < 4:
+                    break
+                f.seek(struct.unpack(">BBH", header)[2], os.SEEK_CUR)
+                frames += 1
+        return frames
+
+    def list_sources(self) -> List[str]:
+        files = []
+        for directory, exts in self.sources:
+            if not os.path.isdir(directory):
+                continue
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    lower = name.lower()
+                    if lower.endswith(exts) and lower.endswith(SOURCE_EXTS):
+                        files.append(os.path.join(root, name))
+        files.sort()
+        return files
+
+    def scan(self, force: bool = False) -> Dict[str, Any]:
+        """转码新增和修改过的文件，删除已不存在的源文件对应的记录，返回本次的统计"""
+        start = time.perf_counter()
+        sources = self.list_sources()
+        changed = 0
+        for path in sources:
+            if self.transcode(path, force):
+                changed += 1
+        removed = self._remove_missing(set(sources))
+        if changed or removed:
+            self._save_manifest()
+        self.scan_time = time.time()
+        result = {
+            "sources": len(sources),
+            "transcoded": changed,
+            "removed": removed,
+            "seconds": round(time.perf_counter() - start, 2),
+        }
+        if changed or removed:
+            logger.bind(tag=TAG).info(f"资源库更新: {result}")
+        return result
+
+    def _remove_missing(self, sources) -> int:
+        with self._lock:
+            missing = [p for p in self._manifest if p not in sources]
+            removed = [self._manifest.pop(p) for p in missing]
+            used = {entry["p3"] for entry in self._manifest.values()}
+        for entry in removed:
+            if entry["p3"] not in used:
+                try:
+                    os.remove(os.path.join(self.store_dir, entry["p3"]))
+                except OSError:
+                    pass
+        return len(removed)
+
+    def maybe_scan(self):
+        """超过检查间隔时在后台扫描源目录"""
+        if (
+            not self.enabled
+            or self._scanning
+            or time.time() - self.scan_time <= self.scan_interval
+        ):
+            return
+        self._scanning = True
+
+        def task():
+            try:
+                self.scan()
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"扫描资源目录失败: {e}")
+            finally:
+                self._scanning = False
+
+        get_runtime().submit("background", task)
+
+    def summary(self) -> Dict[str, Any]:
+        """已转码文件的空间和转码耗时汇总"""
+        with self._lock:
+            entries = list(self._manifest.values())
+        unique = {entry["p3"]: entry for entry in entries}
+        return {
+            "entries": len(entries),
+            "p3_files": len(unique),
+            "source_bytes": sum(e["source_bytes"] for e in entries),
+            "p3_bytes": sum(e["p3_bytes"] for e in unique.values()),
+            "audio_seconds": round(sum(e["frames"] for e in entries) * 0.06, 1),
+            # 每播放一次节省的解码编码耗时之和
+            "transcode_seconds": round(sum(e["transcode_seconds"] for e in entries), 2),
+        }
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._manifest),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "transcoded": self.transcoded,
+                "failures": self.failures,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def init_asset_store(config: Dict[str, Any]) -> AssetStore:
+    """使用配置初始化全局资源库并在后台开始第一次扫描，已初始化时直接返回"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore(config)
+            _store.maybe_scan()
+        return _store
+
+
+def get_asset_store() -> AssetStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AssetStore({"asset_store": {"enabled": False}})
+    return _store
@@ -0,0 +1,156 @@
+import numpy as np
+
+
+class PCMRingBuffer:
+    """定长int16环形PCM缓冲区
+
+    写入时只拷贝一次到预分配的数组中；按窗口读取时，不跨越环尾就直接返回视图，
+    转成float32时写入预分配的暂存区，VAD分帧过程中不再产生新的缓冲区。
+    读写位置使用累计采样点数表示，ASR等其它读取方可以记录一个位置，之后用 since 取出这段PCM。
+    """
+
+    def __init__(self, capacity: int = 16000 * 2, window_size: int = 512):
+        """
+        Args:
+            capacity: 最多保存的采样点数，写满后丢弃最早的数据
+            window_size: 常用窗口大小，用于预分配暂存区
+        """
+        self.capacity = capacity
+        self.window_size = window_size
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._bytes = memoryview(self._data).cast("B")
+        # 窗口跨越环尾时用来拼接
+        self._wrap = np.zeros(window_size, dtype=np.int16)
+        self._scratch = np.zeros(window_size, dtype=np.float32)
+        self.read_pos = 0
+        self.write_pos = 0
+
+    def __len__(self):
+        """未读取的采样点数"""
+        return self.write_pos - self.read_pos
+
+    def write(self, pcm):
+        """写入PCM数据，pcm可以是bytes/bytearray或int16数组"""
+        if isinstance(pcm, np.ndarray):
+            pcm = pcm.astype(np.int16, copy=False).tobytes()
+        data = memoryview(pcm).cast("B")
+        n = len(data) // 2
+        if n > self.capacity:
+            self.write_pos += n - self.capacity
+            data = data[-self.capacity * 2 :]
+            n = self.capacity
+
+        # 直接按字节拷贝进预分配的数组
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._bytes[start * 2 : (start + first) * 2] = data[: first * 2]
+        if first < n:
+            self._bytes[: (n - first) * 2] = data[first * 2 : n * 2]
+        self.write_pos += n
+
+        # 溢出时丢弃最早的数据
+        if self.write_pos - self.read_pos > self.capacity:
+            self.read_pos = self.write_pos - self.capacity
+
+    def view(self, pos: int, size: int) -> np.ndarray:
+        """返回从绝对位置pos开始的size个采样点，结果在下一次读写前有效"""
+        start = pos % self.capacity
+        if start + size <= self.capacity:
+            return self._data[start : start + size]
+        if size > len(self._wrap):
+            self._wrap = np.zeros(size, dtype=np.int16)
+        first = self.capacity - start
+        self._wrap[:first] = self._data[start:]
+        self._wrap[first:size] = self._data[: size - first]
+        return self._wrap[:size]
+
+    def read_window(self, size: int = None):
+        """读取并消费size个采样点，返回int16视图，不足一个窗口时返回None"""
+        size = size or self.window_size
+        if len(self) < size:
+            return None
+        window = self.view(self.read_pos, size)
+        self.read_pos += size
+        return window
+
+    def read_float32(self, size: int = None, out: np.ndarray = None):
+        """读取并消费一个窗口，归一化为float32写入out（默认写入内部暂存区）"""
+        if out is not None:
+            size = len(out)
+        else:
+            size = size or self.window_size
+            if size > len(self._scratch):
+                self._scratch = np.zeros(size, dtype=np.float32)
+            out = self._scratch[:size]
+        pos = self.read_pos
+        if self.write_pos - pos < size:
+            return None
+        self.read_pos = pos + size
+
+        # 先拷贝转换再原地缩放，避免ufunc混合类型运算时申请临时缓冲区
+        start = pos % self.capacity
+        if start + size <= self.capacity:
+            out[:] = self._data[start : start + size]
+        else:
+            first = self.capacity - start
+            out[:first] = self._data[start:]
+            out[first:] = self._data[: size - first]
+        out *= 1.0 / 32768.0
+        return out
+
+    def since(self, pos: int) -> np.ndarray:
+        """拷贝出从绝对位置pos到当前写入位置的PCM，早于缓冲区保存范围的部分会被截掉"""
+        pos = max(pos, self.write_pos - self.capacity, 0)
+        return self.view(pos, self.write_pos - pos).copy()
+
+    def clear(self):
+        self.read_pos = 0
+        self.write_pos = 0
+
+
+class PCMCaptureBuffer:
+    """可增长的int16 PCM缓冲区
+
+    采集时每个数据包解码一次后直接追加，说完一句话后整段以连续内存的 memoryview 交给ASR，
+    不再保存opus包到结束时再统一解码。
+    """
+
+    def __init__(self, initial_samples: int = 16000 * 10):
+        self.initial_samples = initial_samples
+        self._data = np.empty(initial_samples, dtype=np.int16)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, pcm):
+        """追加PCM数据，空间不足时按倍数扩容"""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        n = len(samples)
+        if self.length + n > len(self._data):
+            capacity = max(len(self._data) * 2, self.length + n)
+            data = np.empty(capacity, dtype=np.int16)
+            data[: self.length] = self._data[: self.length]
+            self._data = data
+        self._data[self.length : self.length + n] = samples
+        self.length += n
+
+    def keep_last(self, samples: int):
+        """只保留最近的samples个采样点，用于说话前的预录音"""
+        if self.length > samples:
+            self._data[:samples] = self._data[self.length - samples : self.length]
+            self.length = samples
+
+    def view(self) -> memoryview:
+        """当前内容的字节视图，下一次写入前有效"""
+        return memoryview(self._data[: self.length]).cast("B")
+
+    def detach(self) -> memoryview:
+        """取出当前内容交给调用方，缓冲区换成新的数组，之后的写入不会影响已取出的数据"""
+        pcm = self.view()
+        self._data = np.empty(self.initial_samples, dtype=np.int16)
+        self.length = 0
+        return pcm
+
+    def clear(self):
+        self.length = 0
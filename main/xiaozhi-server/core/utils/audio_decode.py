@@ -0,0 +1,152 @@
+"""
+进程内音频解码与重采样
+
+TTS合成结果、音乐文件、唤醒词回复原先统一通过 pydub 调用 ffmpeg 解码，每句话都要启动一个ffmpeg子进程。
+这里在进程内解码常用格式：wav 用标准库 wave，mp3/flac 用 miniaudio，ogg/opus 用 soundfile，
+重采样优先使用 soxr，未安装时用 numpy 插值；其它格式或进程内解码失败时才回退到 ffmpeg。
+输出统一为 16kHz、单声道、int16 的 numpy 数组。
+"""
+
+import io
+import os
+import wave
+import numpy as np
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+TARGET_SAMPLE_RATE = 16000
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+
+def _read_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _to_mono(samples: np.ndarray, channels: int) -> np.ndarray:
+    """交错存储的多声道数据取平均转为单声道"""
+    if channels <= 1:
+        return samples
+    frames = samples[: len(samples) // channels * channels].reshape(-1, channels)
+    return frames.mean(axis=1).astype(np.int16)
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate=TARGET_SAMPLE_RATE):
+    """int16单声道重采样"""
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    if soxr is not None:
+        return soxr.resample(samples, sample_rate, target_rate)
+    # 没有安装soxr时用线性插值，音质略差但不依赖外部库
+    target_len = int(round(len(samples) * target_rate / sample_rate))
+    positions = np.arange(target_len) * (sample_rate / target_rate)
+    resampled = np.interp(positions, np.arange(len(samples)), samples)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def _decode_wav(data: bytes):
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        sample_width = wf.getsampwidth()
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+    if not frames and len(data) > 44:
+        # 流式接口返回的wav头中数据长度可能为0
+        raise ValueError("wav header has no frame count")
+    if sample_width == 2:
+        samples = np.frombuffer(frames, dtype=np.int16)
+    elif sample_width == 1:
+        # 8位wav为无符号数
+        samples = ((np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    elif sample_width == 4:
+        samples = (np.frombuffer(frames, dtype=np.int32) >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"unsupported wav sample width: {sample_width}")
+    return samples, channels, sample_rate
+
+
+def _decode_miniaudio(data: bytes, file_type: str):
+    if file_type == "mp3":
+        decoded = miniaudio.mp3_read_s16(data)
+    else:
+        decoded = miniaudio.flac_read_s16(data)
+    samples = np.frombuffer(decoded.samples, dtype=np.int16)
+    return samples, decoded.nchannels, decoded.sample_rate
+
+
+def _decode_soundfile(data: bytes):
+    samples, sample_rate = soundfile.read(io.BytesIO(data), dtype="int16")
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    return samples.reshape(-1), channels, sample_rate
+
+
+def _decode_ffmpeg(source, file_type: str) -> np.ndarray:
+    from pydub import AudioSegment
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(bytes(source))
+    # -nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
+    audio = AudioSegment.from_file(source, format=file_type, parameters=["-nostdin"])
+    audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+
+def _decode_in_process(data: bytes, file_type: str, pcm_sample_rate: int):
+    if file_type in ("pcm", "raw"):
+        return np.frombuffer(data, dtype=np.int16), 1, pcm_sample_rate
+    if file_type == "wav":
+        try:
+            return _decode_wav(data)
+        except (wave.Error, ValueError, EOFError):
+            # 浮点等标准库不支持的wav交给soundfile
+            if soundfile is None:
+                raise
+            return _decode_soundfile(data)
+    if file_type in ("mp3", "flac") and miniaudio is not None:
+        return _decode_miniaudio(data, file_type)
+    if file_type in ("ogg", "opus", "oga", "flac", "mp3") and soundfile is not None:
+        return _decode_soundfile(data)
+    return None
+
+
+def decode_audio(source, file_type: str = None, pcm_sample_rate=TARGET_SAMPLE_RATE):
+    """将音频文件路径或二进制数据解码为16kHz单声道int16数组
+
+    Args:
+        source: 文件路径或音频二进制数据
+        file_type: 音频格式，不填时按文件后缀判断
+        pcm_sample_rate: file_type 为 pcm 时原始数据的采样率
+    """
+    if not file_type and isinstance(source, str):
+        file_type = os.path.splitext(source)[1]
+    file_type = (file_type or "").lstrip(".").lower()
+
+    try:
+        decoded = _decode_in_process(_read_bytes(source), file_type, pcm_sample_rate)
+    except Exception as e:
+        logger.bind(tag=TAG).warning(f"进程内解码{file_type}失败，改用ffmpeg: {e}")
+        decoded = None
+    if decoded is None:
+        return _decode_ffmpeg(source, file_type)
+
+    samples, channels, sample_rate = decoded
+    samples = _to_mono(samples, channels)
+    return resample(samples, sample_rate)
@@ -0,0 +1,293 @@
+"""
+统一音频发送节拍器
+
+原先每个连接发送每一帧opus前都要计算时间并 asyncio.sleep 一次，几百路同时播放时事件循环每秒要处理数千次定时唤醒。
+这里全局只有一个每60ms触发一次的节拍任务，每次触发时在一轮中给所有正在播放的连接各发送到期的一帧。
+支持每路单独的预缓冲帧数、打断，并统计节拍抖动。
+每路的发送在单独的任务中进行，节拍本身不等待任何发送，一个慢连接或卡住的连接只会跳过自己的节拍，不影响其它设备。
+设备在hello中协商了每条消息打包多帧时（conn.frames_per_packet），每隔N个节拍提前发送一条打包了N帧的p3消息。
+音乐等长音频通过 play_stream 边解码边发送，缓冲的帧数达到上限时暂停解码，低于一半时再继续。
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Dict
+from config.logger import setup_logging
+from core.utils.p3 import encode_opus_to_bytes
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+# 帧时长（毫秒），匹配 Opus 编码
+FRAME_DURATION_MS = 60
+# 节拍滞后时每路单轮最多补发的帧数
+MAX_CATCH_UP_FRAMES = 3
+# 每分钟重置一次连接超时计时器
+RESET_TIMEOUT_INTERVAL = 60
+# 边解码边播放时每路最多缓冲的帧数（约5秒）
+MAX_BUFFERED_FRAMES = 84
+
+
+class PacedStream:
+    """一路正在播放的音频"""
+
+    def __init__(self, conn, frames):
+        self.conn = conn
+        self.frames = deque(frames)
+        self.frames_per_packet = getattr(conn, "frames_per_packet", 1)
+        # 已经提前发出、尚未到播放时间的帧数
+        self.ahead = 0
+        # 正在进行的发送任务，未完成时跳过该路的节拍
+        self.sending = None
+        self.done = asyncio.get_running_loop().create_future()
+        self.last_reset_time = time.monotonic()
+        # 边解码边播放时为False，帧发完但还没解码完时等待下一块
+        self.eof = True
+        # 缓冲的帧数低于一半时通知解码端继续
+        self.space = None
+
+    def finish(self, exc=None):
+        if self.space is not None:
+            self.space.set()
+        if self.done.done():
+            return
+        if exc is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(exc)
+
+
+class AudioPacer:
+    def __init__(self, frame_duration_ms: int = FRAME_DURATION_MS):
+        self.interval = frame_duration_ms / 1000
+        self._streams: Dict[object, PacedStream] = {}
+        self._task = None
+        self._wakeup = None
+
+        # 统计信息
+        self.ticks = 0
+        self.frames_sent = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+        self.busy_total = 0.0
+        self.busy_max = 0.0
+        self.backpressure_skips = 0
+        self.packets_sent = 0
+        self.underruns = 0
+        get_runtime().register_stats("audio_pacer", self.stats)
+
+    async def play(self, conn, frames, pre_buffer_frames: int = 0):
+        """发送一段音频，前 pre_buffer_frames 帧立即发出，其余按节拍发送，播放完成、打断或出错时返回"""
+        if frames is None or len(frames) == 0:
+            return
+        pre_buffer_frames = min(pre_buffer_frames, len(frames))
+        frames_per_packet = getattr(conn, "frames_per_packet", 1)
+        for i in range(0, pre_buffer_frames, frames_per_packet):
+            end = min(i + frames_per_packet, pre_buffer_frames)
+            await self._send(conn, frames[i:end])
+        if pre_buffer_frames == len(frames):
+            return
+
+        # 同一个连接同时只有一路在播放
+        previous = self._streams.get(conn)
+        if previous is not None:
+            previous.finish()
+        stream = PacedStream(conn, frames[pre_buffer_frames:])
+        self._streams[conn] = stream
+        self._ensure_running()
+        try:
+            await stream.done
+        finally:
+            if self._streams.get(conn) is stream:
+                del self._streams[conn]
+
+    async def play_stream(self, conn, source, pre_buffer_frames: int = 0):
+        """边解码边发送，source 每次迭代返回一组帧，在tts线程池中调用；播放完成、打断或出错时返回"""
+        runtime = get_runtime()
+        frames = deque()
+        eof = False
+        try:
+            # 先解码出预缓冲需要的帧，首帧只等待第一块解码
+            while not eof and len(frames) < max(pre_buffer_frames, 1):
+                chunk = await runtime.run("tts", next, source, None)
+                if chunk is None:
+                    eof = True
+                else:
+                    frames.extend(chunk)
+            if conn.client_abort:
+                return
+            pre_buffer_frames = min(pre_buffer_frames, len(frames))
+            if pre_buffer_frames:
+                packet = [frames.popleft() for _ in range(pre_buffer_frames)]
+                await self.play(conn, packet, pre_buffer_frames)
+            if eof and not frames:
+                return
+
+            previous = self._streams.get(conn)
+            if previous is not None:
+                previous.finish()
+            stream = PacedStream(conn, frames)
+            stream.eof = eof
+            stream.space = asyncio.Event()
+            self._streams[conn] = stream
+            self._ensure_running()
+            try:
+                while not stream.eof and not stream.done.done():
+                    if len(stream.frames) >= MAX_BUFFERED_FRAMES:
+                        # 播放跟不上解码时等待，每路缓冲的数据量有上限
+                        stream.space.clear()
+                        await stream.space.wait()
+                        continue
+                    chunk = await runtime.run("tts", next, source, None)
+                    if chunk is None:
+                        stream.eof = True
+                    else:
+                        stream.frames.extend(chunk)
+                await stream.done
+            finally:
+                if self._streams.get(conn) is stream:
+                    del self._streams[conn]
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    def stop(self, conn):
+        """停止该连接正在播放的音频，打断时调用"""
+        stream = self._streams.get(conn)
+        if stream is not None:
+            stream.finish()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        next_tick = loop.time()
+        while True:
+            if not self._streams:
+                # 没有播放中的音频时停止节拍，等待下一路加入
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                next_tick = loop.time()
+
+            now = loop.time()
+            if now < next_tick:
+                await asyncio.sleep(next_tick - now)
+                now = loop.time()
+
+            # 节拍滞后时（事件循环繁忙）按滞后的节拍数补发，保持实时播放
+            lateness = now - next_tick
+            due_frames = min(int(lateness / self.interval) + 1, MAX_CATCH_UP_FRAMES)
+            next_tick += self.interval * max(1, int(lateness / self.interval) + 1)
+
+            self._flush(due_frames)
+
+            busy = loop.time() - now
+            self.ticks += 1
+            self.lateness_total += lateness
+            self.lateness_max = max(self.lateness_max, lateness)
+            self.busy_total += busy
+            self.busy_max = max(self.busy_max, busy)
+
+    def _flush(self, due_frames: int):
+        """一轮中给每一路取出到期的帧，在各自的任务中发送，不等待发送完成"""
+        now = time.monotonic()
+        for stream in list(self._streams.values()):
+            conn = stream.conn
+            if stream.done.done():
+                continue
+            if conn.client_abort:
+                stream.finish()
+                continue
+            if stream.sending is not None and not stream.sending.done():
+                # 上一次发送还在等待（连接慢或卡住），本轮跳过该路
+                self.backpressure_skips += 1
+                continue
+            if not stream.frames:
+                if stream.eof:
+                    stream.finish()
+                else:
+                    # 解码还没跟上
+                    self.underruns += 1
+                continue
+
+            # 到期时一次发出一条消息（打包frames_per_packet帧），之后的几个节拍不再发送
+            stream.ahead -= due_frames
+            packets = []
+            while stream.ahead < 0 and stream.frames:
+                count = min(stream.frames_per_packet, len(stream.frames))
+                packets.append([stream.frames.popleft() for _ in range(count)])
+                stream.ahead += count
+            reset_timeout = now - stream.last_reset_time > RESET_TIMEOUT_INTERVAL
+            if reset_timeout:
+                stream.last_reset_time = now
+            if packets or reset_timeout:
+                stream.sending = asyncio.get_running_loop().create_task(
+                    self._send_packets(stream, packets, reset_timeout)
+                )
+            if (
+                stream.space is not None
+                and len(stream.frames) < MAX_BUFFERED_FRAMES // 2
+            ):
+                stream.space.set()
+
+    async def _send_packets(self, stream, packets, reset_timeout: bool):
+        conn = stream.conn
+        try:
+            if reset_timeout:
+                await conn.reset_timeout()
+            for packet in packets:
+                await self._send(conn, packet)
+        except Exception as e:
+            stream.finish(e)
+            return
+        # 最后一条发完后才结束，保证播放结束的消息在音频之后发出
+        if not stream.frames and stream.eof:
+            stream.finish()
+
+    async def _send(self, conn, frames):
+        """发送若干帧，单帧直接发送，多帧按p3格式打包成一条消息"""
+        if len(frames) == 1 and getattr(conn, "frames_per_packet", 1) == 1:
+            await conn.websocket.send(frames[0])
+        else:
+            await conn.websocket.send(encode_opus_to_bytes(frames))
+        self.frames_sent += len(frames)
+        self.packets_sent += 1
+
+    def stats(self):
+        return {
+            "active_streams": len(self._streams),
+            "ticks": self.ticks,
+            "frames_sent": self.frames_sent,
+            "packets_sent": self.packets_sent,
+            # 节拍实际触发时间与计划时间的偏差
+            "avg_jitter_ms": (
+                round(self.lateness_total / self.ticks * 1000, 3) if self.ticks else 0
+            ),
+            "max_jitter_ms": round(self.lateness_max * 1000, 3),
+            # 每轮发送耗时
+            "avg_flush_ms": (
+                round(self.busy_total / self.ticks * 1000, 3) if self.ticks else 0
+            ),
+            "max_flush_ms": round(self.busy_max * 1000, 3),
+            "backpressure_skips": self.backpressure_skips,
+            "underruns": self.underruns,
+        }
+
+
+_pacer = None
+
+
+def get_pacer() -> AudioPacer:
+    """全局节拍器，在事件循环中首次使用时创建"""
+    global _pacer
+    if _pacer is None:
+        _pacer = AudioPacer()
+    return _pacer
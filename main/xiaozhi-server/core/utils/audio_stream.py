@@ -0,0 +1,172 @@
+"""
+边解码边播放的音频文件
+
+播放音乐时原先要把整首歌解码并编码成opus帧列表后才发出第一帧，一首几分钟的歌要等几秒，每路播放占用几十MB内存。
+AudioFileStream 每次只解码约1秒的音频（miniaudio 流式解码，同时完成转单声道和重采样到16kHz），
+编码为60ms一帧的opus（或pcm）后交给节拍器，节拍器缓冲的帧数有上限，播放跟不上时不再继续解码，
+所以首帧延迟只取决于解码第一块的时间，每路占用的内存与歌曲长度无关。
+p3文件通过内存映射直接按包读取，不需要解码；miniaudio 不支持的格式回退到整段解码。
+"""
+
+import os
+import mmap
+import ctypes
+import struct
+import numpy as np
+from typing import Iterator, List
+from config.logger import setup_logging
+from core.utils.audio_decode import decode_audio, TARGET_SAMPLE_RATE
+from core.utils.opus_pool import opus_encoder, encode_frames_at, decode_opus
+
+TAG = __name__
+logger = setup_logging()
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+FRAME_DURATION_MS = 60
+FRAME_SIZE = TARGET_SAMPLE_RATE * FRAME_DURATION_MS // 1000
+# 每次解码的帧数（约1秒）
+CHUNK_FRAMES = 16
+# miniaudio 可以流式解码的格式
+STREAM_FORMATS = ("mp3", "wav", "flac", "ogg")
+
+
+class AudioFileStream:
+    """按块产出音频帧的文件源，每次迭代返回一组帧（opus包或pcm字节）"""
+
+    def __init__(self, path: str, is_opus: bool = True, chunk_frames: int = CHUNK_FRAMES):
+        self.path = path
+        self.is_opus = is_opus
+        self.chunk_frames = chunk_frames
+        self.file_type = os.path.splitext(path)[1].lstrip(".").lower()
+        self.frames = 0
+        self._iterator = None
+
+    @property
+    def duration(self) -> float:
+        """已产出的音频时长（秒）"""
+        return self.frames * FRAME_DURATION_MS / 1000
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> List[bytes]:
+        if self._iterator is None:
+            self._iterator = self._chunks()
+        chunk = next(self._iterator)
+        self.frames += len(chunk)
+        return chunk
+
+    def close(self):
+        """提前结束时释放文件和编码器"""
+        if self._iterator is not None:
+            try:
+                self._iterator.close()
+            except ValueError:
+                # 正在线程池中解码下一块，生成器随对象回收时关闭
+                pass
+
+    def _chunks(self) -> Iterator[List[bytes]]:
+        if self.file_type == "p3":
+            yield from self._p3_chunks()
+            return
+        if self.is_opus:
+            yield from self._encode_opus(self._pcm_chunks())
+        else:
+            yield from self._split_pcm(self._pcm_chunks())
+
+    def _p3_chunks(self):
+        """p3文件通过内存映射按包读取，不需要解码"""
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                packets = []
+                offset = 0
+                while offset + 4 <= size:
+                    _, _, data_len = struct.unpack_from(">BBH", mm, offset)
+                    offset += 4
+                    if offset + data_len > size:
+                        raise ValueError(
+                            f"Data length({size - offset}) mismatch({data_len}) in the file."
+                        )
+                    packets.append(mm[offset : offset + data_len])
+                    offset += data_len
+                    if len(packets) >= self.chunk_frames:
+                        yield self._from_opus(packets)
+                        packets = []
+                if packets:
+                    yield self._from_opus(packets)
+
+    def _from_opus(self, packets):
+        if self.is_opus:
+            return packets
+        pcm = decode_opus(packets)
+        frame_bytes = FRAME_SIZE * 2
+        return [pcm[i : i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+
+    def _pcm_chunks(self) -> Iterator[np.ndarray]:
+        """16kHz单声道int16数据块"""
+        chunk_samples = FRAME_SIZE * self.chunk_frames
+        if miniaudio is not None and self.file_type in STREAM_FORMATS:
+            try:
+                stream = miniaudio.stream_file(
+                    self.path,
+                    output_format=miniaudio.SampleFormat.SIGNED16,
+                    nchannels=1,
+                    sample_rate=TARGET_SAMPLE_RATE,
+                    frames_to_read=chunk_samples,
+                )
+                first = next(stream, None)
+            except miniaudio.MiniaudioError as e:
+                logger.bind(tag=TAG).warning(f"流式解码{self.path}失败，改为整段解码: {e}")
+            else:
+                try:
+                    if first is not None:
+                        yield np.frombuffer(first, dtype=np.int16)
+                    for samples in stream:
+                        yield np.frombuffer(samples, dtype=np.int16)
+                finally:
+                    stream.close()
+                return
+        pcm = decode_audio(self.path)
+        for i in range(0, len(pcm), chunk_samples):
+            yield pcm[i : i + chunk_samples]
+
+    @staticmethod
+    def _frames(pcm_chunks):
+        """按帧重新切分，跨块的余量留到下一块，最后不足一帧的部分补零"""
+        remainder = np.zeros(0, dtype=np.int16)
+        for samples in pcm_chunks:
+            if len(remainder):
+                samples = np.concatenate((remainder, samples))
+            full = len(samples) // FRAME_SIZE * FRAME_SIZE
+            remainder = samples[full:].copy()
+            if full:
+                yield np.ascontiguousarray(samples[:full])
+        if len(remainder):
+            padded = np.zeros(FRAME_SIZE, dtype=np.int16)
+            padded[: len(remainder)] = remainder
+            yield padded
+
+    def _encode_opus(self, pcm_chunks):
+        # 整首歌使用同一个编码器，帧之间的编码状态连续
+        frame_bytes = FRAME_SIZE * 2
+        output = (ctypes.c_char * frame_bytes)()
+        with opus_encoder(TARGET_SAMPLE_RATE, 1) as encoder:
+            for samples in self._frames(pcm_chunks):
+                base = samples.ctypes.data
+                addresses = [
+                    base + i * frame_bytes for i in range(len(samples) // FRAME_SIZE)
+                ]
+                yield encode_frames_at(encoder, addresses, FRAME_SIZE, output)
+
+    def _split_pcm(self, pcm_chunks):
+        frame_bytes = FRAME_SIZE * 2
+        for samples in self._frames(pcm_chunks):
+            data = samples.tobytes()
+            yield [data[i : i + frame_bytes] for i in range(0, len(data), frame_bytes)]
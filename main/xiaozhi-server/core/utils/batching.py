@@ -0,0 +1,134 @@
+"""
+跨连接的微批处理
+
+多个连接各自提交的小推理请求先进入同一个队列，由专用线程在一个很短的等待窗口内
+收集成一批，再一次性交给批处理函数执行，把大量零碎的推理合并成少量向量化调用。
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List
+from config.logger import setup_logging
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 4,
+    ):
+        """
+        Args:
+            name: 批处理器名称，用于线程名和统计信息
+            batch_fn: 批处理函数，输入请求列表，按相同顺序返回结果列表
+            max_batch_size: 单批最大请求数
+            max_wait_ms: 收到第一个请求后最多等待多久凑批
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue = queue.Queue()
+        self._stop = False
+
+        # 统计信息
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+
+        self._thread = threading.Thread(
+            target=self._worker, name=f"batch-{name}", daemon=True
+        )
+        self._thread.start()
+        get_runtime().register_stats(f"batch_{name}", self.stats)
+
+    def submit(self, item) -> Future:
+        """提交一个请求，返回 concurrent.futures.Future"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    async def run(self, item):
+        """在事件循环中提交请求并等待结果"""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._stop = True
+                break
+            batch.append(request)
+        return batch
+
+    def _worker(self):
+        while not self._stop:
+            batch = self._collect()
+            if batch is None:
+                break
+            start = time.perf_counter()
+            pending = []
+            for item, future, submit_time in batch:
+                # 调用方可能已经取消
+                if future.set_running_or_notify_cancel():
+                    pending.append((item, future))
+                    self.wait_time += start - submit_time
+            batch = pending
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"{self.name} batch inference failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.busy_time += time.perf_counter() - start
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_seen_batch,
+            "busy_seconds": round(self.busy_time, 3),
+            # 请求在队列中的平均等待时间和每批的平均计算时间
+            "avg_wait_ms": (
+                round(self.wait_time / self.items * 1000, 2) if self.items else 0
+            ),
+            "avg_compute_ms": (
+                round(self.busy_time / self.batches * 1000, 2) if self.batches else 0
+            ),
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        self._queue.put(None)
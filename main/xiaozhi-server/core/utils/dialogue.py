@@ -1,6 +1,26 @@
+import json
 import uuid
-from typing import List, Dict
+import asyncio
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
+from config.logger import setup_logging
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+# 每条消息除内容外的固定开销（role等字段）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text) -> int:
+    """粗略估算token数：中文等非ASCII字符按每字1个，ASCII字符按每4个1个"""
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    ascii_len = len(text.encode("ascii", "ignore"))
+    return len(text) - ascii_len + (ascii_len + 3) // 4
 
 
 class Message:
@@ -17,72 +37,234 @@ class Message:
         self.content = content
         self.tool_calls = tool_calls
         self.tool_call_id = tool_call_id
+        # 序列化结果和token估算缓存，修改内容后需调用 invalidate
+        self._serialized = None
+        self._tokens = None
+
+    def invalidate(self):
+        self._serialized = None
+        self._tokens = None
+
+    def to_dict(self) -> Dict:
+        """发送给LLM的格式，只生成一次，调用方不要修改返回的字典"""
+        if self._serialized is None:
+            if self.tool_calls is not None:
+                self._serialized = {"role": self.role, "tool_calls": self.tool_calls}
+            elif self.role == "tool":
+                if self.tool_call_id is None:
+                    self.tool_call_id = str(uuid.uuid4())
+                self._serialized = {
+                    "role": self.role,
+                    "tool_call_id": self.tool_call_id,
+                    "content": self.content,
+                }
+            else:
+                self._serialized = {"role": self.role, "content": self.content}
+        return self._serialized
+
+    @property
+    def tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = (
+                MESSAGE_OVERHEAD_TOKENS
+                + estimate_tokens(self.content)
+                + estimate_tokens(self.tool_calls)
+            )
+        return self._tokens
 
 
 class Dialogue:
-    def __init__(self):
-        self.dialogue: List[Message] = []
+    """
+    对话上下文
+
+    dialogue 保存本次连接的全部消息（保存记忆时使用），发送给LLM的只是其中最近的一段窗口：
+    窗口内历史消息的估算token数超过 max_tokens 时，从最早的一轮开始整轮丢弃，一次裁剪到 max_tokens*trim_ratio，
+    两次裁剪之间窗口开头不变，系统提示词和之后的历史消息前缀保持字节不变，LLM服务端的前缀缓存可以持续命中。
+    设置 summarizer 后，被丢弃的对话会在后台总结为摘要，放在系统提示词之后。
+    """
+
+    def __init__(self, max_tokens: int = 0, trim_ratio: float = 0.75):
+        self.max_tokens = max_tokens or 0
+        self.trim_ratio = min(max(trim_ratio, 0.1), 1.0)
+        # 总结被丢弃对话的函数：summarizer(已有摘要, 被丢弃的消息) -> 新摘要，在后台线程中调用，结果在事件循环中写入
+        self.summarizer: Optional[Callable[[str, List[Message]], str]] = None
+        self.summary = None
+        self._summarizing = False
+        self._evicted: List[Message] = []
+        self._reset([])
         # 获取当前时间
         self.current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    def _reset(self, messages: List[Message]):
+        self._messages = list(messages)
+        self._system = next((m for m in self._messages if m.role == "system"), None)
+        # 窗口起点在 _messages 中的下标
+        self._start = 0
+        self._tokens = sum(m.tokens for m in self._messages if m.role != "system")
+        self._trim()
+
+    @property
+    def dialogue(self) -> List[Message]:
+        return self._messages
+
+    @dialogue.setter
+    def dialogue(self, messages: List[Message]):
+        self._reset(messages)
+
+    @property
+    def tokens(self) -> int:
+        """窗口内历史消息的估算token数（不含系统提示词）"""
+        return self._tokens
+
     def put(self, message: Message):
-        self.dialogue.append(message)
+        self._messages.append(message)
+        if message.role == "system":
+            if self._system is None:
+                self._system = message
+            return
+        self._tokens += message.tokens
+        self._trim()
+
+    def remove(self, message: Message):
+        """移除一条消息（如被取消的推测执行对话）"""
+        self.remove_if(lambda m: m is message)
+
+    def remove_if(self, predicate: Callable[[Message], bool]) -> int:
+        """原地移除满足条件的消息，窗口起点和已总结的内容不变，返回移除的条数"""
+        kept = []
+        start = self._start
+        system_removed = False
+        for i, m in enumerate(self._messages):
+            if not predicate(m):
+                kept.append(m)
+                continue
+            if i < self._start:
+                start -= 1
+            elif m.role != "system":
+                self._tokens -= m.tokens
+            if m is self._system:
+                system_removed = True
+        removed = len(self._messages) - len(kept)
+        if removed:
+            self._messages[:] = kept
+            self._start = start
+            if system_removed:
+                self._system = next((m for m in kept if m.role == "system"), None)
+        return removed
+
+    def _trim(self):
+        if self.max_tokens <= 0 or self._tokens <= self.max_tokens:
+            return
+        target = self.max_tokens * self.trim_ratio
+        messages = self._messages
+        while self._tokens > target:
+            # 整轮丢弃：新的窗口从下一条用户消息开始，避免留下没有对应调用的tool消息
+            end = next(
+                (
+                    i
+                    for i in range(self._start + 1, len(messages))
+                    if messages[i].role == "user"
+                ),
+                None,
+            )
+            if end is None:
+                # 只剩最后一轮，不再裁剪
+                break
+            for m in messages[self._start : end]:
+                if m.role != "system":
+                    self._tokens -= m.tokens
+                    self._evicted.append(m)
+            self._start = end
+        logger.bind(tag=TAG).debug(
+            f"对话超出token预算，裁剪后窗口约 {self._tokens} tokens"
+        )
+        self._summarize()
+
+    def _summarize(self):
+        if self.summarizer is None:
+            self._evicted.clear()
+            return
+        # 上一次总结还没完成时先积累，下次裁剪时一起总结
+        if self._summarizing or not self._evicted:
+            return
+        evicted, self._evicted = self._evicted, []
+        self._summarizing = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        previous = self.summary
+
+        def task():
+            summary = None
+            try:
+                summary = self.summarizer(previous, evicted)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"总结对话失败: {e}")
+            if loop is None:
+                self._apply_summary(summary)
+                return
+            # 总结在后台线程完成，结果回到事件循环中写入，不与对话的读写并发
+            try:
+                loop.call_soon_threadsafe(self._apply_summary, summary)
+            except RuntimeError:
+                # 事件循环已关闭，连接已结束
+                pass
+
+        get_runtime().submit("background", task)
+
+    def _apply_summary(self, summary):
+        if summary:
+            self.summary = summary
+        self._summarizing = False
 
     def getMessages(self, m, dialogue):
-        if m.tool_calls is not None:
-            dialogue.append({"role": m.role, "tool_calls": m.tool_calls})
-        elif m.role == "tool":
+        dialogue.append(dict(m.to_dict()))
+
+    def _window(self) -> List[Message]:
+        return [m for m in self._messages[self._start :] if m.role != "system"]
+
+    def _build(
+        self, system_message: Optional[Dict], memory_str: str = None
+    ) -> List[Dict[str, str]]:
+        """按变化频率从低到高排列：系统提示词 → 对话摘要 → 记忆 → 历史对话"""
+        dialogue = []
+        if system_message is not None:
+            dialogue.append(system_message)
+        if self.summary:
             dialogue.append(
                 {
-                    "role": m.role,
-                    "tool_call_id": (
-                        str(uuid.uuid4()) if m.tool_call_id is None else m.tool_call_id
-                    ),
-                    "content": m.content,
+                    "role": "system",
+                    "content": f"below is a summary of the earlier conversation：\n{self.summary}",
                 }
             )
-        else:
-            dialogue.append({"role": m.role, "content": m.content})
+        if memory_str:
+            # 记忆单独作为一条消息，不拼进系统提示词，记忆变化时系统提示词仍然不变
+            dialogue.append(
+                {
+                    "role": "system",
+                    "content": f"below is history chat memory for user：\n```\n{memory_str}\n```",
+                }
+            )
+        # 返回浅拷贝，部分provider会修改消息内容，不能影响缓存
+        dialogue.extend(dict(m.to_dict()) for m in self._window())
+        return dialogue
 
     def get_llm_dialogue(self) -> List[Dict[str, str]]:
-        dialogue = []
-        for m in self.dialogue:
-            self.getMessages(m, dialogue)
-        return dialogue
+        return self.get_llm_dialogue_with_memory(None)
 
     def update_system_message(self, new_content: str):
         """更新或添加系统消息"""
-        # 查找第一个系统消息
-        system_msg = next((msg for msg in self.dialogue if msg.role == "system"), None)
-        if system_msg:
-            system_msg.content = new_content
+        if self._system:
+            self._system.content = new_content
+            self._system.invalidate()
         else:
             self.put(Message(role="system", content=new_content))
 
     def get_llm_dialogue_with_memory(
         self, memory_str: str = None
     ) -> List[Dict[str, str]]:
-        if memory_str is None or len(memory_str) == 0:
-            return self.get_llm_dialogue()
-
-        # 构建带记忆的对话
-        dialogue = []
-
-        # 添加系统提示和记忆
-        system_message = next(
-            (msg for msg in self.dialogue if msg.role == "system"), None
+        system_message = self._system.to_dict() if self._system else None
+        return self._build(
+            dict(system_message) if system_message else None, memory_str
         )
-
-        if system_message:
-            enhanced_system_prompt = (
-                f"{system_message.content}\n\n"
-                f"below is history chat memory for user：\n```\n{memory_str}\n```"
-            )
-            dialogue.append({"role": "system", "content": enhanced_system_prompt})
-
-        # 添加用户和助手的对话
-        for m in self.dialogue:
-            if m.role != "system":  # 跳过原始的系统消息
-                self.getMessages(m, dialogue)
-
-        return dialogue
@@ -0,0 +1,90 @@
+"""
+共享的异步HTTP连接池
+
+LLM每轮对话原先都在线程里用同步客户端发起请求，每个连接、每个provider各自建连。
+这里按 base_url 共享一个 httpx.AsyncClient（AsyncOpenAI 也复用它），长连接在多轮对话、多个设备之间复用，
+省去每轮的TCP/TLS握手。客户端绑定在事件循环上，只能在事件循环线程中使用。
+"""
+
+import threading
+from typing import Dict, Tuple
+import httpx
+from core.utils.runtime import get_runtime
+
+# 每个 base_url 的连接数上限
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 60
+# 流式生成时两次数据之间的最长等待时间
+READ_TIMEOUT = 60
+
+_lock = threading.Lock()
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_openai_clients: Dict[Tuple[str, str], Tuple[httpx.AsyncClient, object]] = {}
+_requests = 0
+
+
+def _pool_key(base_url: str) -> str:
+    """同一服务的不同路径共用一个连接池"""
+    url = httpx.URL(base_url)
+    return f"{url.scheme}://{url.netloc.decode()}"
+
+
+def get_async_http_client(base_url: str) -> httpx.AsyncClient:
+    """获取 base_url 对应的共享 httpx.AsyncClient，请求时需使用完整URL"""
+    global _requests
+    key = _pool_key(base_url)
+    with _lock:
+        _requests += 1
+        client = _http_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(10, read=READ_TIMEOUT),
+            )
+            _http_clients[key] = client
+        return client
+
+
+def get_async_openai(base_url: str, api_key: str):
+    """获取共享连接池的 AsyncOpenAI 客户端，相同 base_url 与 api_key 复用同一个实例"""
+    import openai
+
+    key = (base_url or "", api_key or "")
+    http_client = get_async_http_client(base_url or "https://api.openai.com/v1")
+    with _lock:
+        cached = _openai_clients.get(key)
+        # 连接池重建后，旧的 AsyncOpenAI 实例不再可用
+        if cached is None or cached[0] is not http_client:
+            client = openai.AsyncOpenAI(
+                api_key=api_key, base_url=base_url, http_client=http_client
+            )
+            cached = (http_client, client)
+            _openai_clients[key] = cached
+        return cached[1]
+
+
+async def close_all():
+    """关闭所有共享客户端，服务退出时调用"""
+    with _lock:
+        clients = list(_http_clients.values())
+        _http_clients.clear()
+        _openai_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def stats():
+    with _lock:
+        return {
+            "pools": len(_http_clients),
+            "openai_clients": len(_openai_clients),
+            "requests": _requests,
+        }
+
+
+get_runtime().register_stats("http_pool", stats)
@@ -0,0 +1,208 @@
+"""
+意图识别结果缓存
+
+原先每个 IntentProvider 按 md5(原文) 缓存结果，不考虑可用函数和上下文，每次未命中都要遍历并排序全部条目清理缓存。
+这里的缓存键由四部分组成：
+- 意图识别模型：不同模型给出的结果不混用
+- 函数集签名：可用函数变化后旧结果自动失效，函数集相同的连接之间共享结果
+- 上下文指纹：只有“那上海呢”“再来一首”“好的”这类依赖上一轮的句子（含指代、追问、确认的词）才加入最近一条用户消息和最近一条助手回复的哈希，
+  上一轮不同时不会共用结果；其它句子不带上下文，所有连接共享，可通过 cache.context 配置为总是或从不加入上下文
+- 规范化后的文本：全角转半角、转小写、去掉标点和空格，“播放音乐。”和“播放音乐”视为同一句
+所有连接共用一个 OrderedDict 实现的LRU，查找、插入、淘汰都是O(1)，过期条目在访问时删除。
+缓存在服务启动时按配置初始化一次（init_intent_cache）。
+"""
+
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from core.utils.runtime import get_runtime
+
+_PUNCTUATION = re.compile(r"[^\w]+")
+
+# 句子中出现这些词时，意图可能依赖上一轮对话
+CONTEXT_CUE_WORDS = [
+    "呢",
+    "那",
+    "这",
+    "它",
+    "他",
+    "她",
+    "再",
+    "还",
+    "继续",
+    "换",
+    "上一",
+    "下一",
+    "刚才",
+    "刚刚",
+    "一样",
+]
+# 整句只是这些回应时，意图取决于上一轮的提问
+CONTEXT_REPLY_WORDS = {
+    "好",
+    "好的",
+    "好啊",
+    "行",
+    "可以",
+    "对",
+    "是",
+    "是的",
+    "嗯",
+    "嗯嗯",
+    "不",
+    "不用",
+    "不要",
+    "不是",
+    "算了",
+    "ok",
+    "yes",
+    "no",
+}
+_CONTEXT_CUE_EN = re.compile(r"\b(it|that|this|them|again|another|more|next)\b")
+CONTEXT_MODES = ("auto", "always", "never")
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、转小写、去掉标点和空白"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCTUATION.sub("", text).replace("_", "")
+
+
+def needs_context(text: str) -> bool:
+    """句子是否可能依赖上一轮对话（指代、追问、确认）"""
+    normalized = normalize_text(text)
+    if normalized in CONTEXT_REPLY_WORDS:
+        return True
+    if any(word in normalized for word in CONTEXT_CUE_WORDS):
+        return True
+    return _CONTEXT_CUE_EN.search((text or "").lower()) is not None
+
+
+def context_fingerprint(
+    dialogue_history: List, text: str = None, mode: str = "auto"
+) -> str:
+    """
+    最近一条用户消息和最近一条助手回复的哈希，没有历史对话时返回空字符串
+    mode 为 auto 时只有依赖上一轮的句子才计算，never 时总是返回空字符串
+    """
+    if mode == "never" or (mode == "auto" and not needs_context(text)):
+        return ""
+    last_user = None
+    last_assistant = None
+    for message in reversed(dialogue_history or []):
+        if message.role == "user" and last_user is None:
+            last_user = message.content or ""
+        elif message.role == "assistant" and last_assistant is None and message.content:
+            last_assistant = message.content
+        if last_user is not None and last_assistant is not None:
+            break
+    if last_user is None and last_assistant is None:
+        return ""
+    context = f"{normalize_text(last_user)}|{normalize_text(last_assistant)}"
+    return hashlib.md5(context.encode()).hexdigest()[:12]
+
+
+class IntentCache:
+    def __init__(self, max_size: int = 1000, ttl: float = 600, context: str = "auto"):
+        self.max_size = max_size
+        self.ttl = ttl
+        # 缓存键是否加入上一轮对话：auto（依赖上一轮的句子才加入）、always、never
+        self.context_mode = context if context in CONTEXT_MODES else "auto"
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        # 命中缓存节省的LLM调用耗时（秒），按写入时该条结果的实际调用耗时累计
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(
+        text: str, function_signature: str, context: str = "", model: str = ""
+    ) -> str:
+        return f"{model}|{function_signature}|{context}|{normalize_text(text)}"
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            intent, expires_at, cost = entry
+            if now > expires_at:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += cost
+            return intent
+
+    def put(self, key: str, intent: str, cost: float = 0.0):
+        """cost 为得到这个结果的LLM调用耗时"""
+        with self._lock:
+            self._entries[key] = (intent, time.monotonic() + self.ttl, cost)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _cache_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """当前选用的意图识别模块下的 cache 配置"""
+    selected = ((config or {}).get("selected_module") or {}).get("Intent")
+    intent_config = ((config or {}).get("Intent") or {}).get(selected) or {}
+    return intent_config.get("cache") or {}
+
+
+def init_intent_cache(config: Dict[str, Any]) -> IntentCache:
+    """使用配置初始化全局意图缓存，已初始化时直接返回"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cache_config = _cache_config(config)
+            _cache = IntentCache(
+                max_size=max(1, int(cache_config.get("max_size", 1000))),
+                ttl=float(cache_config.get("ttl", 600)),
+                context=str(cache_config.get("context", "auto")).lower(),
+            )
+            get_runtime().register_stats("intent_cache", _cache.stats)
+        return _cache
+
+
+def get_intent_cache() -> IntentCache:
+    if _cache is None:
+        init_intent_cache({})
+    return _cache
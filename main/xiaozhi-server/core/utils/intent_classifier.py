@@ -0,0 +1,281 @@
+"""
+本地意图快速识别
+
+intent_llm 模式下每句话都要先调用一次LLM识别意图，然后才开始对话，每轮要等两次LLM。
+这里用已注册函数（插件、MCP工具）的名称、描述、参数说明和少量内置例句训练一个n-gram分类器：
+中文按单字和相邻两字切分，英文按单词切分，TF-IDF向量与每条例句求余弦相似度，取每个意图的最高分。
+最高分超过阈值、且比第二名高出足够多时直接返回结果（不到1毫秒），否则交给LLM判断。
+否定、停止播放的说法，没有提到歌曲的“播放xx”，以及可能需要调用函数的聊天内容，都交给LLM判断。
+"""
+
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# 内置例句，意图名与函数名一致，continue_chat 表示普通聊天
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "continue_chat": [
+        "你好",
+        "你好啊",
+        "你是谁",
+        "你叫什么名字",
+        "今天心情不好",
+        "给我讲个笑话",
+        "你喜欢什么",
+        "为什么天空是蓝色的",
+        "怎么学习编程",
+        "你觉得呢",
+        "我今天好累",
+        "谢谢你",
+        "真的假的",
+        "你在干嘛",
+        "怎么退出了",
+        "为什么退出了",
+        "帮我想个名字",
+        "一加一等于几",
+        "hello",
+        "how are you",
+        "tell me a joke",
+        "what is your name",
+    ],
+    "play_music": [
+        "播放音乐",
+        "放首歌",
+        "放一首歌",
+        "来一首歌",
+        "唱首歌",
+        "唱一首歌给我听",
+        "我想听歌",
+        "我想听音乐",
+        "放点音乐",
+        "随便放首歌",
+        "播放两只老虎",
+        "来一首小星星",
+        "放一首周杰伦的歌",
+        "play music",
+        "play a song",
+        "sing a song",
+    ],
+    "handle_exit_intent": [
+        "退出",
+        "退出系统",
+        "结束对话",
+        "再见",
+        "拜拜",
+        "我要走了",
+        "我不想和你说话了",
+        "不聊了",
+        "关机吧",
+        "goodbye",
+        "bye bye",
+        "exit",
+    ],
+}
+
+# 包含这些词的问句不直接判定为退出，如“怎么退出了？”
+QUESTION_WORDS = ("怎么", "为什么", "为啥", "如何", "吗", "呢", "how", "why", "what")
+
+# 否定或停止播放的说法（如“我不想听歌了”“停止播放”）不直接判定为播放音乐
+NEGATION_WORDS = (
+    "不想",
+    "不要",
+    "不听",
+    "不用",
+    "别",
+    "停",
+    "暂停",
+    "关掉",
+    "关闭",
+    "够了",
+    "stop",
+    "pause",
+    "don't",
+    "dont",
+)
+
+# 只有明确提到歌曲、音乐时才直接判定为播放音乐，“播放新闻”“我想听故事”交给LLM
+MUSIC_CUE_WORDS = ("歌", "音乐", "曲", "唱", "music", "song", "sing")
+
+# 提到这些内容时可能需要调用函数（包括未参与训练的函数，如查天气），不直接判定为普通聊天
+TOOL_HINT_WORDS = (
+    "天气",
+    "气温",
+    "下雨",
+    "新闻",
+    "故事",
+    "几点",
+    "时间",
+    "日期",
+    "几号",
+    "节日",
+    "假期",
+    "放假",
+    "提醒",
+    "闹钟",
+    "打开",
+    "关闭",
+    "关掉",
+    "音量",
+    "声音",
+    "角色",
+    "切换",
+    "播放",
+    "weather",
+    "news",
+    "story",
+    "time",
+)
+
+# 从播放音乐的句子中去掉的触发词，剩下的作为歌名
+MUSIC_TRIGGER_WORDS = (
+    "播放音乐",
+    "播放",
+    "我想听",
+    "我要听",
+    "给我唱",
+    "唱一首",
+    "唱首",
+    "来一首",
+    "来首",
+    "放一首",
+    "放首",
+    "放点",
+    "随便",
+    "一首",
+    "play",
+    "sing",
+)
+MUSIC_FILLER_WORDS = ("音乐", "歌曲", "的歌", "歌", "吧", "给我听", "music", "song", "a")
+
+_CJK = re.compile(r"[一-鿿]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文取单字和两字组合，英文和数字按单词（函数名中的下划线也会拆开）"""
+    text = text.lower()
+    tokens = []
+    for run in _CJK.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+def _function_texts(function: Dict) -> Tuple[str, List[str]]:
+    """函数定义中可用于训练的文本：名称、描述、参数说明"""
+    info = function.get("function", {})
+    name = info.get("name", "")
+    texts = [name.replace("_", " "), info.get("description", "") or ""]
+    properties = (info.get("parameters") or {}).get("properties", {}) or {}
+    for param in properties.values():
+        if isinstance(param, dict) and param.get("description"):
+            texts.append(param["description"])
+    return name, [t for t in texts if t]
+
+
+class NgramIntentClassifier:
+    def __init__(self, functions: List[Dict], examples: Dict[str, List[str]] = None):
+        examples = DEFAULT_EXAMPLES if examples is None else examples
+        documents: List[Tuple[str, List[str]]] = []
+        for function in functions or []:
+            name, texts = _function_texts(function)
+            if not name:
+                continue
+            for text in texts:
+                documents.append((name, tokenize(text)))
+            for text in examples.get(name, []):
+                documents.append((name, tokenize(text)))
+        for text in examples.get("continue_chat", []):
+            documents.append(("continue_chat", tokenize(text)))
+
+        # 逆文档频率
+        df = Counter()
+        for _, tokens in documents:
+            df.update(set(tokens))
+        total = len(documents) or 1
+        self.idf = {t: math.log((1 + total) / (1 + n)) + 1 for t, n in df.items()}
+
+        self.labels = sorted({label for label, _ in documents})
+        self.vectors: List[Tuple[str, Dict[str, float]]] = [
+            (label, self._vectorize(tokens)) for label, tokens in documents
+        ]
+        self.vectors = [(label, v) for label, v in self.vectors if v]
+
+    def _vectorize(self, tokens: List[str]) -> Dict[str, float]:
+        counts = Counter(t for t in tokens if t in self.idf)
+        vector = {t: c * self.idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        if norm == 0:
+            return {}
+        return {t: w / norm for t, w in vector.items()}
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """每个意图与输入最相近的例句的余弦相似度"""
+        query = self._vectorize(tokenize(text))
+        best = dict.fromkeys(self.labels, 0.0)
+        if not query:
+            return best
+        for label, vector in self.vectors:
+            if len(vector) < len(query):
+                score = sum(w * query.get(t, 0.0) for t, w in vector.items())
+            else:
+                score = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            if score > best[label]:
+                best[label] = score
+        return best
+
+    def classify(self, text: str) -> Tuple[Optional[str], float, float]:
+        """返回（最可能的意图，分数，与第二名的差距）"""
+        ranked = sorted(self.scores(text).items(), key=lambda x: x[1], reverse=True)
+        if not ranked:
+            return None, 0.0, 0.0
+        label, score = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return label, score, score - second
+
+    def predict(
+        self,
+        text: str,
+        threshold: float,
+        margin: float,
+        allowed: Optional[List[str]] = None,
+    ) -> Optional[str]:
+        """置信度足够高时返回意图名，否则返回None交给LLM"""
+        label, score, gap = self.classify(text)
+        if label is None or score < threshold or gap < margin:
+            return None
+        if allowed is not None and label not in allowed:
+            return None
+        lowered = text.lower()
+        if label == "handle_exit_intent":
+            if any(word in lowered for word in QUESTION_WORDS):
+                return None
+        elif label == "play_music":
+            if any(word in lowered for word in NEGATION_WORDS):
+                return None
+            if not any(word in lowered for word in MUSIC_CUE_WORDS):
+                return None
+        elif label == "continue_chat":
+            if any(word in lowered for word in TOOL_HINT_WORDS):
+                return None
+        return label
+
+
+def _remove_words(text: str, words) -> str:
+    for word in words:
+        if word.isascii():
+            text = re.sub(rf"\b{word}\b", " ", text, flags=re.IGNORECASE)
+        else:
+            text = text.replace(word, " ")
+    return text
+
+
+def extract_song_name(text: str) -> str:
+    """从播放音乐的句子中取出歌名，没有指定时返回random"""
+    song = re.sub(r"[^\w\s]", "", text).strip()
+    song = _remove_words(song, MUSIC_TRIGGER_WORDS)
+    song = _remove_words(song, MUSIC_FILLER_WORDS)
+    song = " ".join(song.split())
+    return song if song else "random"
@@ -0,0 +1,127 @@
+"""
+意图识别系统提示词缓存
+
+意图识别的系统提示词由三部分组成：函数说明、音乐列表、智能设备列表。原先每次识别都要重新拼接整个音乐列表和设备列表，
+函数说明只在第一次生成，之后加载的MCP工具不会出现在提示词中。
+这里按（函数集，音乐库版本，设备列表）的签名缓存完整提示词，所有连接共享：
+- 函数集签名由每个函数的名称、描述、参数（json.dumps sort_keys）的哈希组成，与函数定义对象无关
+- 每部分单独缓存，只有变化的部分重新生成，再拼接成完整提示词
+每轮的开销只剩几次字典查找。
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence, Tuple
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+def _digest(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:12]
+
+
+class _LRU(OrderedDict):
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+        return value
+
+
+class IntentPromptCache:
+    def __init__(self, max_size: int = 32):
+        self._lock = threading.Lock()
+        # 函数集签名 -> 函数说明部分
+        self._function_sections = _LRU(max_size)
+        # 音乐库版本 -> (签名, 音乐列表部分)
+        self._music_sections = _LRU(4)
+        # 设备列表 -> (签名, 设备列表部分)
+        self._device_sections = _LRU(max_size)
+        # 完整签名 -> 完整提示词
+        self._prompts = _LRU(max_size)
+        self.builds = 0
+
+    @staticmethod
+    def function_signature(functions: List[Dict]) -> str:
+        """函数集签名，函数名、描述或参数变化时改变"""
+        digests = []
+        for f in functions:
+            function = f.get("function", f)
+            key = json.dumps(
+                {
+                    "name": function.get("name"),
+                    "description": function.get("description"),
+                    "parameters": function.get("parameters"),
+                },
+                ensure_ascii=False,
+                sort_keys=True,
+            )
+            digests.append(_digest(key))
+        return _digest("|".join(digests))
+
+    def get(
+        self,
+        functions: List[Dict],
+        build_functions: Callable[[List[Dict]], str],
+        music_version,
+        music_file_names: Sequence[str],
+        devices: Sequence[str],
+    ) -> Tuple[str, str]:
+        """返回（签名，系统提示词）"""
+        function_signature = self.function_signature(functions)
+        devices = tuple(devices or ())
+        with self._lock:
+            music = self._music_sections.lookup(music_version)
+            device = self._device_sections.lookup(devices)
+            if music is not None and device is not None:
+                signature = f"{function_signature}-{music[0]}-{device[0]}"
+                prompt = self._prompts.lookup(signature)
+                if prompt is not None:
+                    return signature, prompt
+            function_section = self._function_sections.lookup(function_signature)
+
+        if function_section is None:
+            function_section = build_functions(functions)
+        if music is None:
+            music_section = f"\n<musicNames>{music_file_names}\n</musicNames>"
+            music = (_digest(music_section), music_section)
+        if device is None:
+            device_section = ""
+            if len(devices) > 0:
+                device_section = "\n下面是我家智能设备列表（位置，设备名，entity_id），可以通过homeassistant控制\n"
+                for item in devices:
+                    device_section += item + "\n"
+            device = (_digest(device_section), device_section)
+        signature = f"{function_signature}-{music[0]}-{device[0]}"
+        prompt = f"{function_section}{music[1]}{device[1]}"
+
+        with self._lock:
+            self._function_sections.store(function_signature, function_section)
+            self._music_sections.store(music_version, music)
+            self._device_sections.store(devices, device)
+            self._prompts.store(signature, prompt)
+            self.builds += 1
+        logger.bind(tag=TAG).debug(f"生成意图识别提示词 {signature}: {prompt}")
+        return signature, prompt
+
+
+intent_prompt_cache = IntentPromptCache()
+
+
+def get_intent_prompt_cache() -> IntentPromptCache:
+    return intent_prompt_cache
@@ -0,0 +1,337 @@
+"""
+音乐库索引
+
+原先每次点歌都用 difflib 与全部文件逐个比较，并且在请求路径上每隔 refresh_time 用 rglob 重新扫描整个目录，
+曲库有几万首时一次点歌要消耗数秒CPU。这里为音乐目录建立倒排索引：
+- 歌名规范化：全角转半角、转小写、去掉标点和括号中的版本说明（如“(Live)”），英文去掉冠词
+- 中文歌名按两字切分、英文和拼音按三个字母切分（首尾补位），每个片段记录包含它的歌曲
+- 安装了 pypinyin 时同时索引歌名的拼音，“qi li xiang”也能找到“七里香”
+查询时先按共同片段数挑出少量候选，再只对候选用 difflib 精确打分，几万首歌的查询在几毫秒内完成。
+目录按 refresh_time 定时在后台线程池中刷新，不在点歌的请求路径上检查，只重新列出修改时间变化过的目录，
+新增和删除的文件增量更新到索引中，查询不需要加锁。
+"""
+
+import os
+import re
+import time
+import difflib
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from config.logger import setup_logging
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 参与精确打分的候选数
+MAX_CANDIDATES = 50
+# 包含某个片段的歌曲超过该比例时，只要还有其它片段，就不用它挑选候选
+COMMON_GRAM_RATIO = 0.1
+# 已删除的歌曲超过该比例时整体重建索引
+REBUILD_RATIO = 0.25
+
+_BRACKETS = re.compile(r"[\(（\[【].*?[\)）\]】]")
+_NON_WORD = re.compile(r"[^\w]+")
+_CJK = re.compile(r"[一-鿿]")
+_ARTICLES = {"the", "a", "an"}
+
+
+def normalize_title(text: str) -> str:
+    """歌名规范化，英文单词之间保留一个空格，中文之间不留空格"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    stripped = _BRACKETS.sub(" ", text)
+    if stripped.strip():
+        # 整个歌名都在括号里时保留原文
+        text = stripped
+    words = [w for w in _NON_WORD.sub(" ", text).replace("_", " ").split()]
+    if len(words) > 1:
+        words = [w for w in words if w not in _ARTICLES] or words
+    result = ""
+    for word in words:
+        if result and word.isascii() and result[-1].isascii():
+            result += " "
+        result += word
+    return result
+
+
+def pinyin_key(text: str) -> Optional[str]:
+    """中文歌名的拼音（不带声调、不分隔），未安装 pypinyin 或不含中文时返回None"""
+    if lazy_pinyin is None or not _CJK.search(text):
+        return None
+    return "".join(lazy_pinyin(text)).replace(" ", "")
+
+
+_RUNS = re.compile(r"[\x00-\x7f]+|[^\x00-\x7f]+")
+
+
+def ngrams(key: str) -> List[str]:
+    """英文、数字部分按三个字符切分，中文部分按两个字切分，每段首尾补位使短歌名也有片段"""
+    grams = set()
+    for run in _RUNS.findall(key or ""):
+        run = run.strip()
+        if not run:
+            continue
+        n = 3 if run.isascii() else 2
+        padded = f"^{run}$"
+        if len(padded) <= n:
+            grams.add(padded)
+        else:
+            grams.update(padded[i : i + n] for i in range(len(padded) - n + 1))
+    return list(grams)
+
+
+class MusicEntry:
+    __slots__ = ("path", "title", "directory", "ext", "size", "mtime", "keys")
+
+    def __init__(self, path: str, size: int, mtime: float):
+        # path 为相对音乐目录的路径
+        self.path = path
+        directory, filename = os.path.split(path)
+        self.title, self.ext = os.path.splitext(filename)
+        self.ext = self.ext.lower()
+        self.directory = directory
+        self.size = size
+        self.mtime = mtime
+        keys = [normalize_title(self.title)]
+        pinyin = pinyin_key(keys[0])
+        if pinyin:
+            keys.append(pinyin)
+        self.keys = tuple(k for k in keys if k)
+
+    @property
+    def name(self) -> str:
+        """不带扩展名的相对路径，与原先 music_file_names 的格式一致"""
+        return os.path.splitext(self.path)[0]
+
+
+class MusicIndex:
+    def __init__(self, music_dir: str, music_ext: Sequence[str], refresh_time=60):
+        self.music_dir = os.path.abspath(music_dir)
+        self.music_ext = tuple(e.lower() for e in music_ext)
+        self.refresh_time = refresh_time
+        self.version = 0
+        self.scan_time = 0.0
+        self.last_scan_seconds = 0.0
+        self.last_build_seconds = 0.0
+        self._refresh_lock = threading.Lock()
+        self._refresh_timer = None
+        # 目录 -> (修改时间, 文件列表[(相对路径, 大小, 修改时间)], 子目录列表)
+        self._dirs: Dict[str, Tuple[int, List[Tuple[str, int, float]], List[str]]] = {}
+        # 查询使用的索引：(歌曲列表, 片段 -> 歌曲下标列表)，已删除的歌曲在列表中为None
+        self._state: Tuple[List[Optional[MusicEntry]], Dict[str, List[int]]] = ([], {})
+        # 相对路径 -> 歌曲下标
+        self._ids: Dict[str, int] = {}
+        self._listing: List[Tuple[str, int, float]] = []
+        if lazy_pinyin is None:
+            logger.bind(tag=TAG).warning("未安装 pypinyin，音乐索引不支持按拼音搜索歌名")
+
+    @property
+    def entries(self) -> List[MusicEntry]:
+        return [e for e in self._state[0] if e is not None]
+
+    @property
+    def music_files(self) -> List[str]:
+        return [path for path, _, _ in self._listing]
+
+    @property
+    def music_file_names(self) -> List[str]:
+        return [os.path.splitext(path)[0] for path, _, _ in self._listing]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        """列出全部音乐文件，修改时间没变的目录直接使用上次的结果"""
+        files = []
+        dirs = {}
+        stack = [self.music_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._dirs.get(directory)
+            if cached is None or cached[0] != mtime:
+                dir_files, subdirs = [], []
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.path)
+                                elif (
+                                    os.path.splitext(entry.name)[1].lower()
+                                    in self.music_ext
+                                    and entry.is_file()
+                                ):
+                                    stat = entry.stat()
+                                    dir_files.append(
+                                        (
+                                            os.path.relpath(entry.path, self.music_dir),
+                                            stat.st_size,
+                                            stat.st_mtime,
+                                        )
+                                    )
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                cached = (mtime, dir_files, subdirs)
+            dirs[directory] = cached
+            files.extend(cached[1])
+            stack.extend(cached[2])
+        self._dirs = dirs
+        files.sort()
+        return files
+
+    @staticmethod
+    def _add(entries, postings, entry: MusicEntry) -> int:
+        index = len(entries)
+        entries.append(entry)
+        grams = set()
+        for key in entry.keys:
+            grams.update(ngrams(key))
+        for gram in grams:
+            postings.setdefault(gram, []).append(index)
+        return index
+
+    def _build(self, files: List[Tuple[str, int, float]]):
+        entries, postings, ids = [], {}, {}
+        for path, size, mtime in files:
+            ids[path] = self._add(entries, postings, MusicEntry(path, size, mtime))
+        self._state = (entries, postings)
+        self._ids = ids
+
+    def _update(self, files: List[Tuple[str, int, float]]):
+        """增量更新：删除的歌曲置为None，新增的歌曲追加到末尾"""
+        entries, postings = self._state
+        current = {path: (size, mtime) for path, size, mtime in files}
+        for path in [p for p in self._ids if p not in current]:
+            entries[self._ids.pop(path)] = None
+        for path, (size, mtime) in current.items():
+            if path not in self._ids:
+                self._ids[path] = self._add(
+                    entries, postings, MusicEntry(path, size, mtime)
+                )
+            else:
+                entry = entries[self._ids[path]]
+                entry.size, entry.mtime = size, mtime
+
+    def refresh(self, force: bool = False) -> bool:
+        """扫描目录，文件列表变化时重建索引，返回是否有变化"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            files = self._scan()
+            self.last_scan_seconds = time.perf_counter() - start
+            self.scan_time = time.time()
+            if not force and files == self._listing:
+                return False
+            start = time.perf_counter()
+            removed = len(self._state[0]) - len(self._ids)
+            if force or not self._ids or removed > len(self._state[0]) * REBUILD_RATIO:
+                self._build(files)
+            else:
+                self._update(files)
+            self.last_build_seconds = time.perf_counter() - start
+            self._listing = files
+            self.version += 1
+        logger.bind(tag=TAG).info(
+            f"音乐索引已更新: {len(files)}首，扫描 {self.last_scan_seconds * 1000:.0f}ms，"
+            f"建索引 {self.last_build_seconds * 1000:.0f}ms"
+        )
+        return True
+
+    def start_auto_refresh(self):
+        """每隔 refresh_time 在后台线程池刷新一次索引，只需调用一次"""
+        if self._refresh_timer is not None or not self.refresh_time:
+            return
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        self._refresh_timer = threading.Timer(
+            self.refresh_time,
+            lambda: get_runtime().submit("background", self._auto_refresh),
+        )
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _auto_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"刷新音乐索引失败: {e}")
+        finally:
+            self._schedule_refresh()
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[MusicEntry, float]]:
+        """返回最相近的 top_k 首歌曲及相似度（0~1）"""
+        entries, postings = self._state
+        key = normalize_title(query)
+        if not key or not entries:
+            return []
+        query_keys = [key]
+        compact = key.replace(" ", "")
+        if compact.isascii() and compact != key:
+            # 英文输入也可能是不带空格的拼音
+            query_keys.append(compact)
+        pinyin = pinyin_key(key)
+        if pinyin:
+            query_keys.append(pinyin)
+
+        grams = set()
+        for k in query_keys:
+            grams.update(ngrams(k))
+        lists = sorted(
+            (postings[g] for g in grams if g in postings), key=len
+        )
+        if not lists:
+            return []
+        common = len(entries) * COMMON_GRAM_RATIO
+        counts = Counter()
+        for i, ids in enumerate(lists):
+            if i > 0 and len(ids) > common:
+                break
+            counts.update(ids)
+
+        results = []
+        for index, _ in counts.most_common(MAX_CANDIDATES):
+            entry = entries[index]
+            if entry is None:
+                continue
+            score = 0.0
+            for q in query_keys:
+                for k in entry.keys:
+                    ratio = difflib.SequenceMatcher(None, q, k).ratio()
+                    if len(k) > 1 and (k in q or q in k):
+                        # 包含完整歌名（如“播放七里香吧”）或歌名的主要部分
+                        ratio = max(ratio, 0.8)
+                    score = max(score, ratio)
+            results.append((entry, score))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    def best_match(self, query: str, threshold: float = 0.4) -> Optional[str]:
+        """最匹配歌曲的相对路径，相似度低于阈值时返回None"""
+        results = self.search(query, 1)
+        if results and results[0][1] > threshold:
+            return results[0][0].path
+        return None
+
+    def stats(self) -> Dict:
+        entries, postings = self._state
+        return {
+            "songs": len(self._ids),
+            "grams": len(postings),
+            "version": self.version,
+            "last_scan_ms": round(self.last_scan_seconds * 1000, 1),
+            "last_build_ms": round(self.last_build_seconds * 1000, 1),
+            "pinyin": lazy_pinyin is not None,
+        }
@@ -1,15 +1,20 @@
 """
 Opus编码工具类
 将PCM音频数据编码为Opus格式
+
+流式TTS每次收到的PCM块长度不固定：上一次剩下的不足一帧的样本保存在预分配的单帧累积区中，
+新数据先补满累积区，其余的完整帧直接按地址从输入缓冲区交给libopus编码，不再拼接和拷贝整段数据。
 """
 
+import ctypes
 import logging
 import traceback
 
 import numpy as np
-from typing import List, Optional
+from typing import List
 from opuslib_next import Encoder
 from opuslib_next import constants
+from core.utils.opus_pool import encode_frames_at
 
 
 class OpusEncoderUtils:
@@ -36,8 +41,11 @@ class OpusEncoderUtils:
         self.bitrate = 24000  # bps
         self.complexity = 10  # 最高质量
 
-        # 缓冲区初始化为空
-        self.buffer = np.array([], dtype=np.int16)
+        # 单帧累积区，保存上次剩余的不足一帧的样本
+        self.buffer = np.zeros(self.total_frame_size, dtype=np.int16)
+        self.buffered = 0
+        # 编码输出缓冲区，上限为一帧输入的字节数
+        self._output = (ctypes.c_char * (self.total_frame_size * 2))()
 
         try:
             # 创建Opus编码器
@@ -54,7 +62,7 @@ class OpusEncoderUtils:
     def reset_state(self):
         """重置编码器状态"""
         self.encoder.reset_state()
-        self.buffer = np.array([], dtype=np.int16)
+        self.buffered = 0
 
     def encode_pcm_to_opus(self, pcm_data: bytes, end_of_stream: bool) -> List[bytes]:
         """
@@ -67,68 +75,51 @@ class OpusEncoderUtils:
         Returns:
             Opus数据包列表
         """
-        # 将字节数据转换为short数组
-        new_samples = self._convert_bytes_to_shorts(pcm_data)
-
-        # 校验PCM数据
-        self._validate_pcm_data(new_samples)
-
-        # 将新数据追加到缓冲区
-        self.buffer = np.append(self.buffer, new_samples)
-
-        opus_packets = []
+        # 小端16位PCM，直接引用输入数据，不拷贝
+        samples = np.frombuffer(pcm_data, dtype=np.int16)
+        frame = self.total_frame_size
+        addresses = []
         offset = 0
 
-        # 处理所有完整帧
-        while offset <= len(self.buffer) - self.total_frame_size:
-            frame = self.buffer[offset : offset + self.total_frame_size]
-            output = self._encode(frame)
-            if output:
-                opus_packets.append(output)
-            offset += self.total_frame_size
-
-        # 保留未处理的样本
-        self.buffer = self.buffer[offset:]
-
-        # 流结束时处理剩余数据
-        if end_of_stream and len(self.buffer) > 0:
-            # 创建最后一帧并用0填充
-            last_frame = np.zeros(self.total_frame_size, dtype=np.int16)
-            last_frame[: len(self.buffer)] = self.buffer
-
-            output = self._encode(last_frame)
-            if output:
-                opus_packets.append(output)
-            self.buffer = np.array([], dtype=np.int16)
+        # 先用新数据补满上次剩余的累积区
+        if self.buffered:
+            offset = min(frame - self.buffered, len(samples))
+            self.buffer[self.buffered : self.buffered + offset] = samples[:offset]
+            self.buffered += offset
+            if self.buffered == frame:
+                addresses.append(self.buffer.ctypes.data)
+                self.buffered = 0
+
+        # 其余的完整帧直接从输入数据编码
+        full_frames = (len(samples) - offset) // frame
+        base = samples.ctypes.data + offset * 2
+        addresses.extend(base + i * frame * 2 for i in range(full_frames))
+        opus_packets = self._encode(addresses)
+
+        # 不足一帧的部分放入累积区
+        rest = samples[offset + full_frames * frame :]
+        if len(rest):
+            self.buffer[self.buffered : self.buffered + len(rest)] = rest
+            self.buffered += len(rest)
+
+        # 流结束时处理剩余数据，用0填充为完整的一帧
+        if end_of_stream and self.buffered:
+            self.buffer[self.buffered :] = 0
+            opus_packets.extend(self._encode([self.buffer.ctypes.data]))
+            self.buffered = 0
 
         return opus_packets
 
-    def _encode(self, frame: np.ndarray) -> Optional[bytes]:
-        """编码一帧音频数据"""
+    def _encode(self, addresses) -> List[bytes]:
+        """按地址编码若干帧音频数据"""
+        if not addresses:
+            return []
         try:
-            # 将numpy数组转换为bytes
-            frame_bytes = frame.tobytes()
-            # opuslib要求输入字节数必须是channels*2的倍数
-            encoded = self.encoder.encode(frame_bytes, self.frame_size)
-            return encoded
+            return encode_frames_at(self.encoder, addresses, self.frame_size, self._output)
         except Exception as e:
             logging.error(f"Opus encoding failed: {e}")
             traceback.print_exc()
-            return None
-
-    def _convert_bytes_to_shorts(self, bytes_data: bytes) -> np.ndarray:
-        """将字节数组转换为short数组 (16位PCM)"""
-        # 假设输入是小端字节序的16位PCM
-        return np.frombuffer(bytes_data, dtype=np.int16)
-
-    def _validate_pcm_data(self, pcm_shorts: np.ndarray) -> None:
-        """验证PCM数据是否有效"""
-        # 16位PCM数据范围是 -32768 到 32767
-        if np.any((pcm_shorts < -32768) | (pcm_shorts > 32767)):
-            invalid_samples = pcm_shorts[(pcm_shorts < -32768) | (pcm_shorts > 32767)]
-            logging.warning(f"invalid PCM sample founded: {invalid_samples[:5]}...")
-            # 在实际应用中可以选择裁剪而不是抛出异常
-            # np.clip(pcm_shorts, -32768, 32767, out=pcm_shorts)
+            return []
 
     def close(self):
         """关闭编码器并释放资源"""
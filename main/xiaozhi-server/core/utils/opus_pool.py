@@ -0,0 +1,148 @@
+"""
+Opus编解码器池
+
+pcm_to_data、opus_datas_to_wav_bytes、聊天记录上报等地方原先每次调用都新建编码器/解码器。
+这里按（采样率、通道数）缓存空闲的编解码器，借出时重置状态，效果与新建的一样，归还后供其它线程复用。
+encode_pcm 直接把PCM缓冲区中每一帧的地址交给libopus，整段编码过程中Python侧不再拷贝PCM数据。
+"""
+
+import ctypes
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import numpy as np
+import opuslib_next
+from opuslib_next.api import c_int16_pointer
+from opuslib_next.api import encoder as encoder_api
+from core.utils.runtime import get_runtime
+
+
+class CodecPool:
+    """线程安全的编解码器池"""
+
+    def __init__(self, name: str, factory, max_idle: int = 64):
+        self.name = name
+        self.factory = factory
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, deque] = {}
+        self.created = 0
+        self.leased = 0
+
+    @contextmanager
+    def lease(self, *key):
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            codec = idle.pop() if idle else None
+            self.leased += 1
+        if codec is None:
+            codec = self.factory(*key)
+            with self._lock:
+                self.created += 1
+        else:
+            # 借出时重置状态，与新建的编解码器输出一致
+            codec.reset_state()
+        try:
+            yield codec
+        finally:
+            with self._lock:
+                if len(idle) < self.max_idle:
+                    idle.append(codec)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "created": self.created,
+                "leased": self.leased,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+
+def _new_encoder(sample_rate, channels):
+    return opuslib_next.Encoder(sample_rate, channels, opuslib_next.APPLICATION_AUDIO)
+
+
+def _new_decoder(sample_rate, channels):
+    return opuslib_next.Decoder(sample_rate, channels)
+
+
+encoder_pool = CodecPool("opus_encoder", _new_encoder)
+decoder_pool = CodecPool("opus_decoder", _new_decoder)
+get_runtime().register_stats(
+    "opus_pool",
+    lambda: {"encoder": encoder_pool.stats(), "decoder": decoder_pool.stats()},
+)
+
+
+def opus_encoder(sample_rate: int = 16000, channels: int = 1):
+    """借出一个编码器：with opus_encoder() as encoder: ..."""
+    return encoder_pool.lease(sample_rate, channels)
+
+
+def opus_decoder(sample_rate: int = 16000, channels: int = 1):
+    """借出一个解码器：with opus_decoder() as decoder: ..."""
+    return decoder_pool.lease(sample_rate, channels)
+
+
+def encode_pcm(
+    pcm, sample_rate: int = 16000, channels: int = 1, frame_duration: int = 60
+) -> List[bytes]:
+    """把整段16位PCM编码为opus帧列表，最后不足一帧的部分补零
+
+    Args:
+        pcm: bytes/bytearray/memoryview 或 int16 数组
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_size = sample_rate * frame_duration // 1000
+    frame_samples = frame_size * channels
+    full_frames = len(samples) // frame_samples
+    # 最后一帧补零，只拷贝这一帧
+    tail = samples[full_frames * frame_samples :]
+    if len(tail):
+        padded = np.zeros(frame_samples, dtype=np.int16)
+        padded[: len(tail)] = tail
+    else:
+        padded = None
+
+    # 每一帧在缓冲区中的地址，最后补零的一帧单独放在 padded 中
+    frame_bytes = frame_samples * 2
+    base = samples.ctypes.data
+    addresses = [base + i * frame_bytes for i in range(full_frames)]
+    if padded is not None:
+        addresses.append(padded.ctypes.data)
+
+    # 输出缓冲区上限与 opuslib 一致，等于一帧输入的字节数
+    output = (ctypes.c_char * frame_bytes)()
+    with opus_encoder(sample_rate, channels) as encoder:
+        return encode_frames_at(encoder, addresses, frame_size, output)
+
+
+def encode_frames_at(encoder, addresses, frame_size: int, output) -> List[bytes]:
+    """按内存地址逐帧调用libopus编码，PCM不经过Python拷贝
+
+    Args:
+        encoder: opuslib_next.Encoder
+        addresses: 每一帧int16数据的起始地址，调用方需保证对应的缓冲区在编码期间有效
+        frame_size: 每帧每通道的采样点数
+        output: 可复用的 ctypes.c_char 数组，长度即单帧输出上限
+    """
+    datas = []
+    state = encoder.encoder_state
+    max_bytes = len(output)
+    for address in addresses:
+        pointer = ctypes.cast(address, c_int16_pointer)
+        length = encoder_api.libopus_encode(state, pointer, frame_size, output, max_bytes)
+        if length < 0:
+            raise opuslib_next.OpusError(length)
+        datas.append(ctypes.string_at(output, length))
+    return datas
+
+
+def decode_opus(
+    opus_datas, sample_rate: int = 16000, channels: int = 1, frame_duration: int = 60
+) -> bytes:
+    """把opus帧列表解码为连续的16位PCM"""
+    frame_size = sample_rate * frame_duration // 1000
+    with opus_decoder(sample_rate, channels) as decoder:
+        return b"".join(decoder.decode(opus_data, frame_size) for opus_data in opus_datas)
@@ -1,4 +1,7 @@
+import os
+import mmap
 import struct
+import threading
 
 def decode_opus_from_file(input_file):
     """
@@ -56,4 +59,46 @@ def decode_opus_from_bytes(input_bytes):
         total_frames += 1
 
     total_duration = (total_frames * frame_duration_ms) / 1000.0
-    return opus_datas, total_duration
\ No newline at end of file
+    return opus_datas, total_duration
+
+def decode_opus_from_mmap(input_file):
+    """
+    通过内存映射读取p3文件，返回 Opus 数据包的列表以及总时长。
+    适合TTS缓存这类被反复读取的小文件，不经过文件读缓冲区逐段拷贝。
+    """
+    opus_datas = []
+    frame_duration_ms = 60  # 帧时长
+
+    with open(input_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return opus_datas, 0.0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = 0
+            while offset + 4 <= size:
+                _, _, data_len = struct.unpack_from('>BBH', mm, offset)
+                offset += 4
+                if offset + data_len > size:
+                    raise ValueError(f"Data length({size - offset}) mismatch({data_len}) in the file.")
+                opus_datas.append(mm[offset:offset + data_len])
+                offset += data_len
+
+    total_duration = (len(opus_datas) * frame_duration_ms) / 1000.0
+    return opus_datas, total_duration
+
+def encode_opus_to_bytes(opus_datas):
+    """
+    将 Opus 数据包列表打包为p3二进制数据，每个包前加4字节头部。
+    """
+    return b"".join(
+        struct.pack('>BBH', 0, 0, len(opus_data)) + opus_data for opus_data in opus_datas
+    )
+
+def encode_opus_to_file(opus_datas, output_file):
+    """
+    将 Opus 数据包列表写成p3文件，先写临时文件再替换，读取方不会读到写了一半的文件。
+    """
+    tmp_file = f"{output_file}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(encode_opus_to_bytes(opus_datas))
+    os.replace(tmp_file, output_file)
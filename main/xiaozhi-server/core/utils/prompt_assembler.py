@@ -0,0 +1,166 @@
+"""
+按变化频率组装每轮LLM请求
+
+vLLM、Ollama、OpenAI等服务端都会缓存请求开头相同部分的计算结果（前缀缓存），只有从第一个字节开始完全相同的部分才能命中。
+这里把一轮请求按变化频率从低到高排列：角色提示词 → 工具定义 → 设备列表 → 对话摘要 → 记忆 → 历史对话，
+前三部分在一次连接中基本不变，摘要只在裁剪历史对话后更新，记忆和历史对话的变化不会影响它们。
+每轮计算前缀哈希，前缀变化时记录日志；openai接口返回的 CompletionUsage 中的缓存token数也会记录下来，用于评估节省的预填充计算量。
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config.logger import setup_logging
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+# 最多保留的未取走用量记录数（按会话）
+MAX_PENDING_USAGE = 1024
+
+
+class PromptCacheStats:
+    """所有连接共享的前缀缓存统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[str, Dict]" = OrderedDict()
+        self.turns = 0
+        self.prefix_changes = 0
+        self.requests_with_usage = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record_usage(self, session_id: str, usage):
+        """记录一次请求的 CompletionUsage，由LLM provider调用"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None)
+        if cached_tokens is None:
+            # DeepSeek 等接口使用 prompt_cache_hit_tokens
+            cached_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+        cached_tokens = cached_tokens or 0
+        with self._lock:
+            self.requests_with_usage += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.completion_tokens += completion_tokens
+            self._pending[session_id] = {
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "completion_tokens": completion_tokens,
+            }
+            self._pending.move_to_end(session_id)
+            while len(self._pending) > MAX_PENDING_USAGE:
+                self._pending.popitem(last=False)
+
+    def pop_usage(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._pending.pop(session_id, None)
+
+    def record_turn(self, prefix_changed: bool):
+        with self._lock:
+            self.turns += 1
+            if prefix_changed:
+                self.prefix_changes += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "prefix_changes": self.prefix_changes,
+                "requests_with_usage": self.requests_with_usage,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": (
+                    round(self.cached_tokens / self.prompt_tokens, 4)
+                    if self.prompt_tokens
+                    else 0
+                ),
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+get_runtime().register_stats("prompt_cache", prompt_cache_stats.stats)
+
+
+def record_usage(session_id: str, usage):
+    prompt_cache_stats.record_usage(session_id, usage)
+
+
+class PromptAssembler:
+    """每个连接一个，角色提示词和设备列表合成系统提示词写入 Dialogue，工具定义单独缓存"""
+
+    def __init__(self, dialogue):
+        self.dialogue = dialogue
+        self.role_prompt = ""
+        self.devices = ""
+        self._tools = None
+        self._tools_key = ""
+        self.prefix_hash = None
+
+    @property
+    def system_prompt(self) -> str:
+        if self.devices:
+            return f"{self.role_prompt}\n{self.devices}"
+        return self.role_prompt
+
+    def set_role_prompt(self, prompt: str):
+        """切换角色时只替换角色部分，设备列表保留"""
+        self.role_prompt = prompt or ""
+        self.dialogue.update_system_message(self.system_prompt)
+
+    def set_devices(self, devices: str):
+        self.devices = devices or ""
+        self.dialogue.update_system_message(self.system_prompt)
+
+    def tools(self, *tool_lists) -> Optional[List[Dict]]:
+        """合并各来源的工具定义，内容不变时返回同一个列表，顺序保持稳定"""
+        combined = []
+        has_tools = False
+        for tools in tool_lists:
+            if tools is not None:
+                has_tools = True
+                combined.extend(tools)
+        if not has_tools:
+            return None
+        key = json.dumps(combined, ensure_ascii=False, sort_keys=True)
+        if key != self._tools_key or self._tools is None:
+            self._tools_key = key
+            self._tools = combined
+        return self._tools
+
+    def build(self, memory_str: str = None, tools: List[Dict] = None) -> List[Dict]:
+        """组装本轮发送给LLM的消息列表，并计算不变前缀的哈希"""
+        digest = hashlib.sha256(self.role_prompt.encode("utf-8"))
+        if tools is not None:
+            digest.update(self._tools_key.encode("utf-8"))
+        digest.update(self.devices.encode("utf-8"))
+        # 对话摘要紧跟在系统提示词之后，摘要更新后前缀也随之变化
+        digest.update((self.dialogue.summary or "").encode("utf-8"))
+        prefix_hash = digest.hexdigest()[:16]
+
+        prefix_changed = self.prefix_hash is not None and prefix_hash != self.prefix_hash
+        if prefix_changed:
+            logger.bind(tag=TAG).info(
+                f"提示词前缀变化: {self.prefix_hash} -> {prefix_hash}，本轮无法命中前缀缓存"
+            )
+        self.prefix_hash = prefix_hash
+        prompt_cache_stats.record_turn(prefix_changed)
+        return self.dialogue.get_llm_dialogue_with_memory(memory_str)
+
+    def finish_turn(self, session_id: str):
+        """一轮结束后取出provider记录的token用量"""
+        usage = prompt_cache_stats.pop_usage(session_id)
+        if usage is not None:
+            logger.bind(tag=TAG).debug(
+                f"前缀 {self.prefix_hash}：输入 {usage['prompt_tokens']}，"
+                f"命中缓存 {usage['cached_tokens']}，输出 {usage['completion_tokens']}"
+            )
+        return usage
@@ -0,0 +1,219 @@
+"""
+服务端共享工作运行时
+
+所有连接共用一组按CPU核数限定大小的线程池（按处理阶段划分），
+原先每个连接各自常驻的等待线程（TTS文本、音频播放、ASR音频、上报）改为asyncio任务，
+因此线程数量不会随在线连接数增长。
+"""
+
+import os
+import queue
+import asyncio
+import weakref
+import threading
+from typing import Any, Callable, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 各阶段默认线程数 = CPU核数 * 倍数
+DEFAULT_STAGE_MULTIPLIER = {
+    "chat": 4,  # LLM对话，大部分时间在等待网络
+    "tts": 4,  # TTS合成，大部分时间在等待网络
+    "tts_synth": 4,  # 非流式TTS预取合成的并发请求
+    "report": 1,  # 聊天记录上报
+    "background": 1,  # 保存记忆等后台任务
+}
+
+
+class StageQueue(queue.Queue):
+    """线程安全队列，消费端可以在事件循环中以 await 的方式等待，而不必占用线程轮询"""
+
+    def __init__(self, stage: str, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.stage = stage
+        self._event = None
+        self._loop = None
+        get_runtime().track_queue(self)
+
+    def _put(self, item):
+        super()._put(item)
+        self._notify()
+
+    def _notify(self):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def wake(self):
+        """唤醒等待中的消费者（不放入数据）"""
+        self._notify()
+
+    async def async_get(self):
+        """在事件循环中等待并取出一条数据"""
+        if self._loop is None:
+            self._event = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            self._event.clear()
+            # clear之后再检查一次，避免丢失唤醒
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            await self._event.wait()
+
+
+class StageExecutor:
+    """绑定到某个阶段的执行器，接口与 ThreadPoolExecutor.submit 保持一致"""
+
+    def __init__(self, runtime, stage: str):
+        self.runtime = runtime
+        self.stage = stage
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.runtime.submit(self.stage, fn, *args, **kwargs)
+
+
+class WorkerRuntime:
+    def __init__(self, config: Dict[str, Any] = None):
+        runtime_config = (config or {}).get("worker_runtime") or {}
+        self.cpu_count = os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._workers: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._queues = weakref.WeakSet()
+        self._stats_providers: Dict[str, Callable[[], Dict]] = {}
+
+        for stage, multiplier in DEFAULT_STAGE_MULTIPLIER.items():
+            workers = runtime_config.get(f"{stage}_workers")
+            self._workers[stage] = (
+                int(workers) if workers else self.cpu_count * multiplier
+            )
+        logger.bind(tag=TAG).info(f"worker runtime initialized: {self._workers}")
+
+    def _get_pool(self, stage: str) -> ThreadPoolExecutor:
+        pool = self._pools.get(stage)
+        if pool is not None:
+            return pool
+        with self._lock:
+            pool = self._pools.get(stage)
+            if pool is None:
+                workers = self._workers.setdefault(stage, self.cpu_count)
+                pool = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=f"rt-{stage}"
+                )
+                self._pools[stage] = pool
+                self._pending.setdefault(stage, 0)
+                self._running.setdefault(stage, 0)
+        return pool
+
+    def submit(self, stage: str, fn: Callable, *args, **kwargs) -> Future:
+        """提交任务到指定阶段的共享线程池"""
+        pool = self._get_pool(stage)
+        with self._lock:
+            self._pending[stage] += 1
+
+        def task():
+            with self._lock:
+                self._pending[stage] -= 1
+                self._running[stage] += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running[stage] -= 1
+
+        try:
+            return pool.submit(task)
+        except Exception:
+            # 线程池已关闭等情况下任务没有排入，撤销计数
+            with self._lock:
+                self._pending[stage] -= 1
+            raise
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs):
+        """在事件循环中等待共享线程池的执行结果"""
+        return await asyncio.wrap_future(self.submit(stage, fn, *args, **kwargs))
+
+    def executor(self, stage: str) -> StageExecutor:
+        return StageExecutor(self, stage)
+
+    def track_queue(self, q: StageQueue):
+        with self._lock:
+            self._queues.add(q)
+
+    def register_stats(self, name: str, provider: Callable[[], Dict]):
+        """注册额外的统计信息来源，在 collect_stats 中一并输出"""
+        self._stats_providers[name] = provider
+
+    def stage_stats(self) -> Dict[str, Dict[str, int]]:
+        """各阶段的队列深度和线程池使用情况"""
+        with self._lock:
+            queues = list(self._queues)
+            stats = {
+                stage: {
+                    "workers": workers,
+                    "pending": self._pending.get(stage, 0),
+                    "running": self._running.get(stage, 0),
+                    "queued": 0,
+                }
+                for stage, workers in self._workers.items()
+            }
+        for q in queues:
+            stage = stats.setdefault(
+                q.stage, {"workers": 0, "pending": 0, "running": 0, "queued": 0}
+            )
+            stage["queued"] += q.qsize()
+        return stats
+
+    def collect_stats(self) -> Dict[str, Any]:
+        stats = {"stages": self.stage_stats()}
+        for name, provider in list(self._stats_providers.items()):
+            try:
+                stats[name] = provider()
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"failed to collect stats {name}: {e}")
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=False)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def init_runtime(config: Dict[str, Any]) -> WorkerRuntime:
+    """使用配置初始化全局运行时，已初始化时直接返回"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = WorkerRuntime(config)
+        return _runtime
+
+
+def get_runtime() -> WorkerRuntime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = WorkerRuntime()
+    return _runtime
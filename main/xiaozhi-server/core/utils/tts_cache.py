@@ -0,0 +1,258 @@
+"""
+TTS音频缓存
+
+问候语、字数超限提示、绑定提示、退出语以及插件回复（如"正在为您播放音乐"）每天会被重复合成成千上万次。
+这里按（TTS类型、音色、规范化后的文本、输出格式）计算内容哈希，缓存最终下发的音频包列表：
+内存中是按字节数限额的LRU，磁盘上以p3格式保存并通过内存映射读取，命中时完全跳过TTS接口调用。
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from config.logger import setup_logging
+from core.utils import p3
+from core.utils.runtime import get_runtime
+
+TAG = __name__
+logger = setup_logging()
+
+# 计算音色签名时忽略的配置项（密钥、地址、输出目录等不影响合成结果的内容）
+IGNORED_CONFIG_KEYS = ("key", "token", "secret", "url", "host", "output_dir", "appid")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：去掉首尾空白，合并连续空白"""
+    return " ".join(text.split())
+
+
+def config_signature(config: Dict[str, Any]) -> str:
+    """根据TTS配置中影响合成结果的参数（语速、音调等）生成签名"""
+    items = []
+    for key in sorted(config or {}):
+        lower_key = key.lower()
+        if any(ignored in lower_key for ignored in IGNORED_CONFIG_KEYS):
+            continue
+        items.append(f"{key}={config[key]}")
+    return hashlib.md5("&".join(items).encode("utf-8")).hexdigest()[:12]
+
+
+def _is_true(value) -> bool:
+    return str(value).lower() in ("true", "1", "yes")
+
+
+class TTSCache:
+    def __init__(self, config: Dict[str, Any] = None):
+        cache_config = (config or {}).get("tts_cache") or {}
+        self.enabled = _is_true(cache_config.get("enabled", True))
+        memory_mb = cache_config.get("memory_mb", 64)
+        disk_mb = cache_config.get("disk_mb", 512)
+        max_text_length = cache_config.get("max_text_length", 64)
+        self.memory_budget = int(float(memory_mb) * 1024 * 1024) if memory_mb else 0
+        self.disk_budget = int(float(disk_mb) * 1024 * 1024) if disk_mb else 0
+        self.max_text_length = int(max_text_length) if max_text_length else 64
+        self.disk_dir = cache_config.get("disk_dir", "data/tts_cache")
+        if not self.disk_budget:
+            self.disk_dir = None
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._writing = set()
+        self._trimming = False
+
+        # 统计信息
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+
+        if self.enabled and self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            get_runtime().submit("background", self._scan_disk)
+        get_runtime().register_stats("tts_cache", self.stats)
+
+    def make_key(self, provider: str, voice: str, text: str, audio_format: str):
+        """计算缓存键，文本为空或过长（一般是LLM生成的长句，很少重复）时返回None"""
+        if not self.enabled or not text:
+            return None
+        text = normalize_text(text)
+        if not text or len(text) > self.max_text_length:
+            return None
+        raw = "\x1f".join((provider or "", str(voice or ""), text, audio_format))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.p3")
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        if key is None:
+            return None
+        with self._lock:
+            audio_datas = self._memory.get(key)
+            if audio_datas is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return list(audio_datas)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                audio_datas, _ = p3.decode_opus_from_mmap(path)
+            except FileNotFoundError:
+                audio_datas = None
+            except Exception as e:
+                logger.bind(tag=TAG).warning(f"读取TTS磁盘缓存失败: {path}, {e}")
+                audio_datas = None
+            if audio_datas:
+                # 刷新修改时间，磁盘清理时按修改时间淘汰最久未使用的文件
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put_memory(key, audio_datas)
+                return list(audio_datas)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, audio_datas: List[bytes]):
+        if key is None or not audio_datas:
+            return
+        with self._lock:
+            self._put_memory(key, audio_datas)
+            if not self.disk_dir or key in self._writing:
+                return
+            self._writing.add(key)
+        get_runtime().submit("background", self._write_disk, key, list(audio_datas))
+
+    def _put_memory(self, key: str, audio_datas: List[bytes]):
+        """写入内存LRU，调用方需持有锁"""
+        size = sum(len(data) for data in audio_datas)
+        if size > self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= sum(len(data) for data in old)
+        self._memory[key] = audio_datas
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_budget and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum(len(data) for data in evicted)
+            self.evictions += 1
+
+    def _write_disk(self, key: str, audio_datas: List[bytes]):
+        path = self._disk_path(key)
+        try:
+            if os.path.exists(path):
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            p3.encode_opus_to_file(audio_datas, path)
+            size = os.path.getsize(path)
+            with self._lock:
+                self._disk_bytes += size
+                self.disk_writes += 1
+                need_trim = self._disk_bytes > self.disk_budget and not self._trimming
+                if need_trim:
+                    self._trimming = True
+            if need_trim:
+                self._trim_disk()
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"写入TTS磁盘缓存失败: {path}, {e}")
+        finally:
+            with self._lock:
+                self._writing.discard(key)
+
+    def _list_disk(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".p3"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_disk(self):
+        """启动时统计已有磁盘缓存的大小"""
+        try:
+            total = sum(size for _, size, _ in self._list_disk())
+            with self._lock:
+                self._disk_bytes += total
+            logger.bind(tag=TAG).info(
+                f"TTS磁盘缓存: {self.disk_dir}, {total / 1024 / 1024:.1f}MB"
+            )
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"统计TTS磁盘缓存失败: {e}")
+
+    def _trim_disk(self):
+        """磁盘缓存超过上限时，删除最久未使用的文件直到降到上限的90%"""
+        try:
+            files = sorted(self._list_disk())
+            total = sum(size for _, size, _ in files)
+            target = int(self.disk_budget * 0.9)
+            removed = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            with self._lock:
+                self._disk_bytes = total
+            logger.bind(tag=TAG).info(f"TTS磁盘缓存清理{removed}个文件")
+        finally:
+            with self._lock:
+                self._trimming = False
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0,
+                "evictions": self.evictions,
+                "disk_writes": self.disk_writes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def init_tts_cache(config: Dict[str, Any]) -> TTSCache:
+    """使用配置初始化全局TTS缓存，已初始化时直接返回"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(config)
+        return _cache
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache({"tts_cache": {"enabled": False}})
+    return _cache
@@ -2,14 +2,12 @@ import json
 import socket
 import subprocess
 import re
-import os
 import wave
 from io import BytesIO
 from core.utils import p3
-import numpy as np
 import requests
-import opuslib_next
-from pydub import AudioSegment
+from core.utils.audio_decode import decode_audio
+from core.utils.opus_pool import encode_pcm, decode_opus
 import copy
 from loguru import logger
 import math
@@ -652,24 +650,13 @@ def _calculate_keyword_scores(text: str) -> Dict[str, float]:
 
 
 def audio_to_data(audio_file_path, is_opus=True):
-    # 获取文件后缀名
-    file_type = os.path.splitext(audio_file_path)[1]
-    if file_type:
-        file_type = file_type.lstrip(".")
-    # 读取音频文件，-nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
-    audio = AudioSegment.from_file(
-        audio_file_path, format=file_type, parameters=["-nostdin"]
-    )
-
-    # 转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配）
-    audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+    # 进程内解码并转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配），特殊格式才回退到ffmpeg
+    pcm = decode_audio(audio_file_path)
 
     # 音频时长(秒)
-    duration = len(audio) / 1000.0
+    duration = len(pcm) / 16000.0
 
-    # 获取原始PCM数据（16位小端）
-    raw_data = audio.raw_data
-    return pcm_to_data(raw_data, is_opus), duration
+    return pcm_to_data(pcm.tobytes(), is_opus), duration
 
 
 def audio_bytes_to_data(audio_bytes, file_type, is_opus=True):
@@ -680,43 +667,32 @@ def audio_bytes_to_data(audio_bytes, file_type, is_opus=True):
         # 直接用p3解码
         return p3.decode_opus_from_bytes(audio_bytes)
     else:
-        # 其他格式用pydub
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), format=file_type, parameters=["-nostdin"]
-        )
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        duration = len(audio) / 1000.0
-        raw_data = audio.raw_data
-        return pcm_to_data(raw_data, is_opus), duration
+        # 其他格式在进程内解码
+        pcm = decode_audio(audio_bytes, file_type)
+        duration = len(pcm) / 16000.0
+        return pcm_to_data(pcm.tobytes(), is_opus), duration
 
 
 def pcm_to_data(raw_data, is_opus=True):
-    # 初始化Opus编码器
-    encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
+    if is_opus:
+        # 从编码器池借出编码器，整段PCM逐帧直接交给libopus编码
+        return encode_pcm(raw_data, 16000, 1, 60)
 
     # 编码参数
     frame_duration = 60  # 60ms per frame
     frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
+    frame_bytes = frame_size * 2  # 16bit=2bytes/sample
 
+    pcm = memoryview(raw_data).cast("B")
     datas = []
     # 按帧处理所有音频数据（包括最后一帧可能补零）
-    for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-        # 获取当前帧的二进制数据
-        chunk = raw_data[i : i + frame_size * 2]
-
+    for i in range(0, len(pcm), frame_bytes):
+        chunk = pcm[i : i + frame_bytes]
         # 如果最后一帧不足，补零
-        if len(chunk) < frame_size * 2:
-            chunk += b"\x00" * (frame_size * 2 - len(chunk))
-
-        if is_opus:
-            # 转换为numpy数组处理
-            np_frame = np.frombuffer(chunk, dtype=np.int16)
-            # 编码Opus数据
-            frame_data = encoder.encode(np_frame.tobytes(), frame_size)
+        if len(chunk) < frame_bytes:
+            datas.append(bytes(chunk) + b"\x00" * (frame_bytes - len(chunk)))
         else:
-            frame_data = chunk if isinstance(chunk, bytes) else bytes(chunk)
-
-        datas.append(frame_data)
+            datas.append(bytes(chunk))
 
     return datas
 
@@ -725,18 +701,8 @@ def opus_datas_to_wav_bytes(opus_datas, sample_rate=16000, channels=1):
     """
     将opus帧列表解码为wav字节流
     """
-    decoder = opuslib_next.Decoder(sample_rate, channels)
-    pcm_datas = []
-
-    frame_duration = 60  # ms
-    frame_size = int(sample_rate * frame_duration / 1000)  # 960
-
-    for opus_frame in opus_datas:
-        # 解码为PCM（返回bytes，2字节/采样点）
-        pcm = decoder.decode(opus_frame, frame_size)
-        pcm_datas.append(pcm)
-
-    pcm_bytes = b"".join(pcm_datas)
+    # 解码为PCM（2字节/采样点），解码器从池中借出
+    pcm_bytes = decode_opus(opus_datas, sample_rate, channels)
 
     # 写入wav字节流
     wav_buffer = BytesIO()
@@ -3,6 +3,10 @@ import websockets
 from config.logger import setup_logging
 from core.connection import ConnectionHandler
 from config.config_loader import get_config_from_api
+from core.utils.runtime import init_runtime
+from core.utils.tts_cache import init_tts_cache
+from core.utils.intent_cache import init_intent_cache
+from core.utils.asset_store import init_asset_store
 from core.utils.modules_initialize import initialize_modules
 from core.utils.util import check_vad_update, check_asr_update
 
@@ -14,6 +18,14 @@ class WebSocketServer:
         self.config = config
         self.logger = setup_logging()
         self.config_lock = asyncio.Lock()
+        # 所有连接共享的工作线程池
+        self.runtime = init_runtime(self.config)
+        # 所有连接共享的TTS音频缓存
+        self.tts_cache = init_tts_cache(self.config)
+        # 所有连接共享的意图识别结果缓存
+        self.intent_cache = init_intent_cache(self.config)
+        # 音乐、故事音频的p3资源库，在后台转码
+        self.asset_store = init_asset_store(self.config)
         modules = initialize_modules(
             self.logger,
             self.config,
@@ -0,0 +1,143 @@
+"""
+VAD分帧缓冲区微基准测试
+
+模拟多路并发音频流（每路每60ms收到960个采样点），比较原先 bytearray 切片 + astype 的分帧方式
+与 PCMRingBuffer 的耗时和内存分配情况（先核对两种方式输出的窗口数据一致）。只测试分帧本身，不包含opus解码和模型推理。
+
+用法: python performance_tester_audio_buffer.py [并发路数] [模拟秒数]
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+from tabulate import tabulate
+from core.utils.audio_buffer import PCMRingBuffer
+
+WINDOW_SAMPLES = 512
+FRAME_SAMPLES = 960
+FRAME_MS = 60
+
+
+class BytearrayFramer:
+    """原先 is_vad 中的分帧方式"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.window = None
+
+    def feed(self, pcm_frame):
+        self.buffer.extend(pcm_frame)
+        windows = 0
+        while len(self.buffer) >= WINDOW_SAMPLES * 2:
+            chunk = self.buffer[: WINDOW_SAMPLES * 2]
+            self.buffer = self.buffer[WINDOW_SAMPLES * 2 :]
+            audio_int16 = np.frombuffer(chunk, dtype=np.int16)
+            self.window = audio_int16.astype(np.float32) / 32768.0
+            windows += 1
+        return windows
+
+
+class RingFramer:
+    """使用 PCMRingBuffer，窗口写入预分配的float32缓冲区"""
+
+    def __init__(self):
+        self.buffer = PCMRingBuffer()
+        self.window = np.zeros(WINDOW_SAMPLES, dtype=np.float32)
+
+    def feed(self, pcm_frame):
+        self.buffer.write(pcm_frame)
+        windows = 0
+        while self.buffer.read_float32(out=self.window) is not None:
+            windows += 1
+        return windows
+
+
+def make_frames(count):
+    rng = np.random.default_rng(0)
+    return [
+        rng.integers(-32768, 32767, FRAME_SAMPLES, dtype=np.int16).tobytes()
+        for _ in range(count)
+    ]
+
+
+def check_same_windows(frames):
+    """两种方式得到的窗口数据必须一致"""
+    old, new = BytearrayFramer(), RingFramer()
+    for frame in frames:
+        if old.feed(frame) != new.feed(frame):
+            return False
+        if old.window is not None and not np.array_equal(old.window, new.window):
+            return False
+    return True
+
+
+def run(framer_cls, streams, seconds, frames, trace=False):
+    framers = [framer_cls() for _ in range(streams)]
+    ticks = seconds * 1000 // FRAME_MS
+    windows = 0
+    allocated = 0
+    start = time.perf_counter()
+    for tick in range(ticks):
+        frame = frames[tick % len(frames)]
+        for framer in framers:
+            if trace:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            windows += framer.feed(frame)
+            if trace:
+                allocated += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    return windows, elapsed, allocated
+
+
+def main():
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    frames = make_frames(50)
+    if not check_same_windows(frames):
+        print("PCMRingBuffer 输出的窗口与原先的分帧方式不一致")
+        sys.exit(1)
+
+    rows = []
+    for name, framer_cls in (
+        ("bytearray", BytearrayFramer),
+        ("PCMRingBuffer", RingFramer),
+    ):
+        windows, elapsed, _ = run(framer_cls, streams, seconds, frames)
+
+        # 单独跑一遍统计内存分配，避免tracemalloc影响耗时
+        tracemalloc.start()
+        _, _, allocated = run(framer_cls, streams, seconds, frames, trace=True)
+        tracemalloc.stop()
+
+        rows.append(
+            [
+                name,
+                windows,
+                f"{elapsed * 1000:.1f}",
+                f"{elapsed / windows * 1e6:.2f}",
+                f"{elapsed / seconds * 100:.2f}%",
+                f"{allocated / seconds / 1024 / 1024:.2f}",
+            ]
+        )
+
+    print(f"\n{streams}路并发，模拟{seconds}秒音频")
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "方式",
+                "窗口数",
+                "总耗时(ms)",
+                "每窗口(us)",
+                "单核占用",
+                "临时分配(MB/s)",
+            ],
+            tablefmt="github",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+TTS音频解码微基准测试
+
+模拟TTS接口返回的一句话（默认3秒、24kHz单声道，wav/mp3/opus），比较进程内解码重采样
+与原先 pydub 调用 ffmpeg 子进程的单句耗时和CPU占用（CPU包含ffmpeg子进程）。
+只测试解码到16kHz PCM，不包含opus编码，两种方式的编码部分相同。
+
+用法: python performance_tester_audio_decode.py [每种格式的次数] [句子秒数]
+"""
+
+import io
+import sys
+import time
+import shutil
+import resource
+import numpy as np
+import soundfile
+from tabulate import tabulate
+from core.utils.audio_decode import decode_audio, _decode_ffmpeg
+
+SAMPLE_RATE = 24000
+FORMATS = (
+    ("wav", "WAV", "PCM_16", SAMPLE_RATE),
+    ("mp3", "MP3", "MPEG_LAYER_III", SAMPLE_RATE),
+    ("opus", "OGG", "OPUS", 48000),
+)
+
+
+def make_sentence(fmt, subtype, sample_rate, seconds):
+    """生成一段类似语音的测试音频（几个谐波叠加并做幅度调制）"""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    signal = sum(np.sin(2 * np.pi * f * t) / i for i, f in enumerate((180, 360, 720), 1))
+    signal *= 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    samples = (signal / np.abs(signal).max() * 12000).astype(np.int16)
+    buffer = io.BytesIO()
+    soundfile.write(buffer, samples, sample_rate, format=fmt, subtype=subtype)
+    return buffer.getvalue()
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run(decode, data, file_type, count):
+    latencies = []
+    cpu_start = cpu_seconds()
+    for _ in range(count):
+        start = time.perf_counter()
+        decode(data, file_type)
+        latencies.append(time.perf_counter() - start)
+    cpu = cpu_seconds() - cpu_start
+    latencies.sort()
+    return (
+        sum(latencies) / count * 1000,
+        latencies[int(count * 0.95) - 1] * 1000,
+        cpu / count * 1000,
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    methods = [("进程内", decode_audio)]
+    if shutil.which("ffmpeg"):
+        methods.append(("ffmpeg", _decode_ffmpeg))
+    else:
+        print("未找到ffmpeg，只测试进程内解码")
+
+    rows = []
+    for file_type, fmt, subtype, sample_rate in FORMATS:
+        data = make_sentence(fmt, subtype, sample_rate, seconds)
+        for name, decode in methods:
+            avg, p95, cpu = run(decode, data, file_type, count)
+            rows.append(
+                [file_type, name, f"{avg:.2f}", f"{p95:.2f}", f"{cpu:.2f}"]
+            )
+
+    print(f"\n每句{seconds}秒，每种格式{count}次")
+    print(
+        tabulate(
+            rows,
+            headers=["格式", "方式", "平均耗时(ms)", "P95耗时(ms)", "CPU(ms/句)"],
+            tablefmt="github",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
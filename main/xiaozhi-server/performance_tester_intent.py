@@ -0,0 +1,154 @@
+"""
+本地快速意图识别离线评估
+
+用已注册插件函数的描述训练 NgramIntentClassifier，在一组标注好的句子上比较不同阈值下：
+本地直接返回的比例、本地返回结果的准确率、单句识别耗时，以及按LLM意图识别耗时估算的平均意图识别耗时。
+标注为其它函数（如查天气）或None（如停止播放）的句子期望交给LLM，本地返回任何结果都算错误。
+
+用法: python performance_tester_intent.py [LLM意图识别耗时ms]
+"""
+
+import sys
+import time
+from tabulate import tabulate
+from plugins_func.loadplugins import auto_import_modules
+from plugins_func.register import all_function_registry
+from core.utils.intent_classifier import NgramIntentClassifier
+
+FAST_INTENTS = ["continue_chat", "play_music", "handle_exit_intent"]
+
+# 与内置例句不重复的测试句子
+SAMPLES = [
+    ("早上好", "continue_chat"),
+    ("你今天过得怎么样", "continue_chat"),
+    ("你会做饭吗", "continue_chat"),
+    ("我有点无聊", "continue_chat"),
+    ("给我讲讲恐龙", "continue_chat"),
+    ("你多大了", "continue_chat"),
+    ("我刚才说了什么", "continue_chat"),
+    ("怎么突然退出了", "continue_chat"),
+    ("为什么你老是说再见", "continue_chat"),
+    ("猫为什么喜欢睡觉", "continue_chat"),
+    ("我们聊聊天吧", "continue_chat"),
+    ("what can you do", "continue_chat"),
+    ("nice to meet you", "continue_chat"),
+    ("放一首歌吧", "play_music"),
+    ("来首音乐", "play_music"),
+    ("播放一首七里香", "play_music"),
+    ("我想听周杰伦", "play_music"),
+    ("唱个歌给我听", "play_music"),
+    ("随便来点音乐", "play_music"),
+    ("给我放首儿歌", "play_music"),
+    ("播放小苹果", "play_music"),
+    ("play some music", "play_music"),
+    ("好了拜拜", "handle_exit_intent"),
+    ("再见啦", "handle_exit_intent"),
+    ("我先走了", "handle_exit_intent"),
+    ("结束吧", "handle_exit_intent"),
+    ("不想聊了", "handle_exit_intent"),
+    ("退出对话", "handle_exit_intent"),
+    ("bye", "handle_exit_intent"),
+    ("今天天气怎么样", "get_weather"),
+    ("明天北京会下雨吗", "get_weather"),
+    ("有什么新闻", "get_news_from_newsnow"),
+    ("播报一下今天的新闻", "get_news_from_newsnow"),
+    ("切换成英语老师", "change_role"),
+    ("换个角色", "change_role"),
+    ("今天是什么节日", "next_closest_holiday"),
+    ("现在几点了", "get_time_zone"),
+    ("讲一个圣诞故事", "play_christmas_story"),
+    ("讲个圣诞故事吧", "play_christmas_story"),
+    ("今天天气好吗", "get_weather"),
+    ("播放新闻", "get_news_from_newsnow"),
+    ("我想听故事", "play_christmas_story"),
+    # 停止播放不是任何函数，由LLM结合上下文判断，本地返回任何结果都算错误
+    ("我不想听歌了", None),
+    ("停止播放", None),
+    ("别放了", None),
+    ("不要唱了", None),
+]
+
+SETTINGS = [(0.5, 0.1), (0.6, 0.2), (0.7, 0.3), (0.8, 0.4), (0.9, 0.5)]
+
+
+def load_functions():
+    auto_import_modules("plugins_func.functions")
+    return [item.description for item in all_function_registry.values()]
+
+
+def evaluate(classifier, threshold, margin):
+    answered = 0
+    correct = 0
+    latencies = []
+    errors = []
+    for text, expected in SAMPLES:
+        start = time.perf_counter()
+        predicted = classifier.predict(text, threshold, margin, FAST_INTENTS)
+        latencies.append(time.perf_counter() - start)
+        if predicted is None:
+            continue
+        answered += 1
+        if predicted == expected:
+            correct += 1
+        else:
+            errors.append(f"{text}->{predicted}")
+    latencies.sort()
+    return answered, correct, latencies, errors
+
+
+def main():
+    llm_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+
+    functions = load_functions()
+    start = time.perf_counter()
+    classifier = NgramIntentClassifier(functions)
+    train_ms = (time.perf_counter() - start) * 1000
+
+    rows = []
+    all_errors = {}
+    for threshold, margin in SETTINGS:
+        answered, correct, latencies, errors = evaluate(classifier, threshold, margin)
+        coverage = answered / len(SAMPLES)
+        avg_us = sum(latencies) / len(latencies) * 1e6
+        expected_ms = coverage * avg_us / 1000 + (1 - coverage) * llm_ms
+        rows.append(
+            [
+                threshold,
+                margin,
+                f"{coverage * 100:.1f}",
+                f"{correct / answered * 100:.1f}" if answered else "-",
+                len(errors),
+                f"{avg_us:.1f}",
+                f"{latencies[int(len(latencies) * 0.95) - 1] * 1e6:.1f}",
+                f"{expected_ms:.0f}",
+            ]
+        )
+        all_errors[(threshold, margin)] = errors
+
+    print(
+        f"\n{len(functions)}个函数，{len(classifier.vectors)}条训练文本，训练耗时{train_ms:.1f}ms，"
+        f"测试句子{len(SAMPLES)}条，LLM意图识别按{llm_ms:.0f}ms估算"
+    )
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "阈值",
+                "差距",
+                "本地返回(%)",
+                "本地准确率(%)",
+                "错误数",
+                "平均耗时(us)",
+                "P95耗时(us)",
+                "平均意图耗时(ms)",
+            ],
+            tablefmt="github",
+        )
+    )
+    for setting, errors in all_errors.items():
+        if errors:
+            print(f"阈值{setting[0]} 差距{setting[1]} 错误: {', '.join(errors)}")
+
+
+if __name__ == "__main__":
+    main()
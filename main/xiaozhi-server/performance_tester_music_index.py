@@ -0,0 +1,176 @@
+"""
+音乐库索引基准测试
+
+在临时目录生成一个模拟曲库（默认5万个空文件，按歌手分目录，中英文歌名混合），比较：
+- 首次扫描建索引、目录无变化时的刷新、新增少量文件后的刷新耗时
+- 索引查询与原先 difflib 逐个比较的单次点歌耗时和结果是否一致
+
+用法: python performance_tester_music_index.py [文件数] [查询次数]
+"""
+
+import os
+import sys
+import time
+import random
+import difflib
+import shutil
+import tempfile
+from tabulate import tabulate
+from core.utils.music_index import MusicIndex
+
+# 常用汉字范围内随机组合歌名，英文歌名由常见单词加随机音节组成
+CHINESE_CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+ENGLISH_WORDS = [
+    "love", "night", "summer", "dream", "heart", "fire", "river", "city",
+    "light", "rain", "star", "road", "home", "blue", "wild", "golden",
+]
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "su", "vey", "dor", "lin", "bra", "zo", "qui"]
+EXTS = [".mp3", ".mp3", ".wav", ".p3"]
+
+
+def make_title(rng):
+    if rng.random() < 0.6:
+        return "".join(rng.choice(CHINESE_CHARS) for _ in range(rng.randint(2, 6)))
+    word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    words = rng.sample(ENGLISH_WORDS, rng.randint(1, 2)) + [word]
+    rng.shuffle(words)
+    return " ".join(w.capitalize() for w in words)
+
+
+def make_library(root, count, rng):
+    titles = set()
+    singers = max(count // 50, 1)
+    while len(titles) < count:
+        title = make_title(rng)
+        if title in titles:
+            continue
+        singer_dir = os.path.join(root, f"singer_{len(titles) % singers:04d}")
+        os.makedirs(singer_dir, exist_ok=True)
+        path = os.path.join(singer_dir, title + rng.choice(EXTS))
+        open(path, "wb").close()
+        titles.add(title)
+    return sorted(titles)
+
+
+def make_queries(titles, count, rng):
+    queries = []
+    for _ in range(count):
+        title = rng.choice(titles)
+        kind = rng.randint(0, 2)
+        if kind == 0:
+            queries.append(("完整歌名", title, title))
+        elif kind == 1:
+            queries.append(("歌名+口语", f"{title}吧", title))
+        else:
+            # 去掉一个字符模拟识别错误
+            pos = rng.randrange(1, len(title))
+            queries.append(("缺一个字", title[:pos] + title[pos + 1 :], title))
+    return queries
+
+
+def difflib_match(query, music_files):
+    """原先的实现：与每个文件逐个比较"""
+    best_match = None
+    highest_ratio = 0
+    for music_file in music_files:
+        song_name = os.path.splitext(music_file)[0]
+        ratio = difflib.SequenceMatcher(None, query, song_name).ratio()
+        if ratio > highest_ratio and ratio > 0.4:
+            highest_ratio = ratio
+            best_match = music_file
+    return best_match
+
+
+def is_original(result, title):
+    return result is not None and os.path.splitext(os.path.basename(result))[0] == title
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+    root = tempfile.mkdtemp(prefix="music_index_")
+    try:
+        start = time.perf_counter()
+        titles = make_library(root, count, rng)
+        print(f"生成 {count} 个文件耗时 {time.perf_counter() - start:.1f}s")
+
+        index = MusicIndex(root, (".mp3", ".wav", ".p3"))
+        rows = []
+        start = time.perf_counter()
+        index.refresh()
+        rows.append(["首次扫描+建索引", f"{(time.perf_counter() - start) * 1000:.0f}"])
+        start = time.perf_counter()
+        changed = index.refresh()
+        rows.append(
+            [f"无变化刷新（变化={changed}）", f"{(time.perf_counter() - start) * 1000:.0f}"]
+        )
+        for i in range(10):
+            open(os.path.join(root, "singer_0000", f"新歌{i}.mp3"), "wb").close()
+        start = time.perf_counter()
+        changed = index.refresh()
+        rows.append(
+            [f"新增10首后刷新（变化={changed}）", f"{(time.perf_counter() - start) * 1000:.0f}"]
+        )
+        print(tabulate(rows, headers=["操作", "耗时(ms)"], tablefmt="github"))
+
+        music_files = index.music_files
+        queries = make_queries(titles, query_count, rng)
+        # difflib 逐个比较太慢，只取一部分查询
+        baseline_queries = queries[: max(query_count // 20, 5)]
+
+        rows = []
+        for kind in ("完整歌名", "歌名+口语", "缺一个字"):
+            items = [(q, t) for k, q, t in queries if k == kind]
+            latencies, found = [], 0
+            for query, title in items:
+                start = time.perf_counter()
+                result = index.best_match(query)
+                latencies.append(time.perf_counter() - start)
+                if is_original(result, title):
+                    found += 1
+            rows.append(
+                [
+                    kind,
+                    len(items),
+                    f"{found / len(items) * 100:.1f}" if items else "-",
+                    f"{sum(latencies) / len(latencies) * 1000:.2f}" if items else "-",
+                    f"{percentile(latencies, 0.95) * 1000:.2f}" if items else "-",
+                ]
+            )
+
+        latencies, found = [], 0
+        for _, query, title in baseline_queries:
+            start = time.perf_counter()
+            result = difflib_match(query, music_files)
+            latencies.append(time.perf_counter() - start)
+            if is_original(result, title):
+                found += 1
+        rows.append(
+            [
+                "difflib逐个比较（混合）",
+                len(baseline_queries),
+                f"{found / len(baseline_queries) * 100:.1f}",
+                f"{sum(latencies) / len(latencies) * 1000:.2f}",
+                f"{percentile(latencies, 0.95) * 1000:.2f}",
+            ]
+        )
+        print(f"\n曲库 {len(index)} 首，索引片段 {index.stats()['grams']} 个")
+        print(
+            tabulate(
+                rows,
+                headers=["查询类型", "次数", "命中原曲(%)", "平均耗时(ms)", "P95耗时(ms)"],
+                tablefmt="github",
+            )
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
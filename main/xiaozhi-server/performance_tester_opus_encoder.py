@@ -0,0 +1,131 @@
+"""
+流式TTS Opus编码微基准测试
+
+模拟多路并发的流式TTS（默认50路），每路不断收到长度不固定的PCM块，比较原先 np.append 拼接缓冲区
++ 逐样本校验的编码方式与 OpusEncoderUtils 单帧累积区按地址编码的吞吐量和内存分配情况。
+
+用法: python performance_tester_opus_encoder.py [并发路数] [每路音频秒数]
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+from tabulate import tabulate
+from opuslib_next import Encoder, constants
+from core.utils.opus_encoder_utils import OpusEncoderUtils
+
+SAMPLE_RATE = 16000
+FRAME_MS = 60
+
+
+class LegacyOpusEncoder:
+    """原先 OpusEncoderUtils 的缓冲方式"""
+
+    def __init__(self):
+        self.frame_size = SAMPLE_RATE * FRAME_MS // 1000
+        self.buffer = np.array([], dtype=np.int16)
+        self.encoder = Encoder(SAMPLE_RATE, 1, constants.APPLICATION_AUDIO)
+        self.encoder.bitrate = 24000
+        self.encoder.complexity = 10
+        self.encoder.signal = constants.SIGNAL_VOICE
+
+    def encode_pcm_to_opus(self, pcm_data, end_of_stream):
+        new_samples = np.frombuffer(pcm_data, dtype=np.int16)
+        if np.any((new_samples < -32768) | (new_samples > 32767)):
+            pass
+        self.buffer = np.append(self.buffer, new_samples)
+        opus_packets = []
+        offset = 0
+        while offset <= len(self.buffer) - self.frame_size:
+            frame = self.buffer[offset : offset + self.frame_size]
+            opus_packets.append(self.encoder.encode(frame.tobytes(), self.frame_size))
+            offset += self.frame_size
+        self.buffer = self.buffer[offset:]
+        if end_of_stream and len(self.buffer) > 0:
+            last_frame = np.zeros(self.frame_size, dtype=np.int16)
+            last_frame[: len(self.buffer)] = self.buffer
+            opus_packets.append(self.encoder.encode(last_frame.tobytes(), self.frame_size))
+            self.buffer = np.array([], dtype=np.int16)
+        return opus_packets
+
+
+def make_chunks(seconds):
+    """生成一路TTS的PCM块序列，块长度在0.05~0.3秒之间随机"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+    chunks = []
+    pos = 0
+    while pos < len(pcm):
+        size = int(rng.integers(800, 4800)) * 2
+        chunks.append(pcm[pos : pos + size])
+        pos += size
+    return chunks
+
+
+def run(encoder_factory, streams, chunks, trace=False):
+    encoders = [encoder_factory() for _ in range(streams)]
+    packets = 0
+    allocated = 0
+    start = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        end_of_stream = index == len(chunks) - 1
+        for encoder in encoders:
+            if trace:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            packets += len(encoder.encode_pcm_to_opus(chunk, end_of_stream))
+            if trace:
+                allocated += tracemalloc.get_traced_memory()[1] - before
+    return packets, time.perf_counter() - start, allocated
+
+
+def main():
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    chunks = make_chunks(seconds)
+
+    rows = []
+    for name, factory in (
+        ("np.append", LegacyOpusEncoder),
+        ("单帧累积区", lambda: OpusEncoderUtils(SAMPLE_RATE, 1, FRAME_MS)),
+    ):
+        packets, elapsed, _ = run(factory, streams, chunks)
+
+        # 单独跑一遍统计内存分配，避免tracemalloc影响耗时
+        tracemalloc.start()
+        _, _, allocated = run(factory, streams, chunks, trace=True)
+        tracemalloc.stop()
+
+        audio_seconds = streams * seconds
+        rows.append(
+            [
+                name,
+                packets,
+                f"{elapsed * 1000:.1f}",
+                f"{elapsed / packets * 1e6:.2f}",
+                f"{audio_seconds / elapsed:.1f}",
+                f"{allocated / audio_seconds / 1024:.1f}",
+            ]
+        )
+
+    print(f"\n{streams}路并发流式TTS，每路{seconds}秒音频，共{len(chunks)}个PCM块")
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "方式",
+                "opus帧数",
+                "总耗时(ms)",
+                "每帧(us)",
+                "实时倍数",
+                "临时分配(KB/音频秒)",
+            ],
+            tablefmt="github",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
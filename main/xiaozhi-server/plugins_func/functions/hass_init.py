@@ -20,9 +20,8 @@ def append_devices_to_prompt(conn):
         if "hass_get_state" in funcs or "hass_set_state" in funcs:
             prompt = "\n下面是我家智能设备列表（位置，设备名，entity_id），可以通过homeassistant控制\n"
             deviceStr = conn.config["plugins"].get(config_source, {}).get("devices", "")
-            conn.prompt += prompt + deviceStr + "\n"
-            # 更新提示词
-            conn.dialogue.update_system_message(conn.prompt)
+            # 设备列表单独放在角色提示词之后，切换角色时不会丢失
+            conn.prompt_assembler.set_devices(prompt + deviceStr + "\n")
 
 
 def initialize_hass_handler(conn):
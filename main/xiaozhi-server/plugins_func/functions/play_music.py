@@ -1,13 +1,12 @@
 from config.logger import setup_logging
 import os
 import re
-import time
 import random
 import asyncio
-import difflib
 import traceback
-from pathlib import Path
 from core.utils import p3
+from core.utils.music_index import MusicIndex
+from core.utils.runtime import get_runtime
 from core.handle.sendAudioHandle import send_stt_message
 from plugins_func.register import register_function, ToolType, ActionResponse, Action
 from core.utils.dialogue import Message
@@ -85,37 +84,9 @@ def _extract_song_name(text):
     return None
 
 
-def _find_best_match(potential_song, music_files):
+def _find_best_match(potential_song):
     """查找最匹配的歌曲"""
-    best_match = None
-    highest_ratio = 0
-
-    for music_file in music_files:
-        song_name = os.path.splitext(music_file)[0]
-        ratio = difflib.SequenceMatcher(None, potential_song, song_name).ratio()
-        if ratio > highest_ratio and ratio > 0.4:
-            highest_ratio = ratio
-            best_match = music_file
-    return best_match
-
-
-def get_music_files(music_dir, music_ext):
-    music_dir = Path(music_dir)
-    music_files = []
-    music_file_names = []
-    for file in music_dir.rglob("*"):
-        # 判断是否是文件
-        if file.is_file():
-            # 获取文件扩展名
-            ext = file.suffix.lower()
-            # 判断扩展名是否在列表中
-            if ext in music_ext:
-                # 添加相对路径
-                music_files.append(str(file.relative_to(music_dir)))
-                music_file_names.append(
-                    os.path.splitext(str(file.relative_to(music_dir)))[0]
-                )
-    return music_files, music_file_names
+    return MUSIC_CACHE["index"].best_match(potential_song, 0.4)
 
 
 def initialize_music_handler(conn):
@@ -136,14 +107,31 @@ def initialize_music_handler(conn):
             MUSIC_CACHE["music_dir"] = os.path.abspath("./music")
             MUSIC_CACHE["music_ext"] = (".mp3", ".wav", ".p3")
             MUSIC_CACHE["refresh_time"] = 60
-        # 获取音乐文件列表
-        MUSIC_CACHE["music_files"], MUSIC_CACHE["music_file_names"] = get_music_files(
-            MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"]
+        # 建立音乐索引，之后按刷新间隔在后台线程池中刷新
+        index = MusicIndex(
+            MUSIC_CACHE["music_dir"],
+            MUSIC_CACHE["music_ext"],
+            MUSIC_CACHE["refresh_time"],
         )
-        MUSIC_CACHE["scan_time"] = time.time()
+        index.refresh()
+        index.start_auto_refresh()
+        get_runtime().register_stats("music_index", index.stats)
+        MUSIC_CACHE["index"] = index
+    refresh_music_files()
     return MUSIC_CACHE
 
 
+def refresh_music_files():
+    """索引在后台刷新后同步文件列表，这里不扫描目录"""
+    index = MUSIC_CACHE["index"]
+    # 音乐列表版本号，列表变化时改变，意图识别提示词据此重新生成
+    if MUSIC_CACHE.get("version") != index.version:
+        MUSIC_CACHE["music_files"] = index.music_files
+        MUSIC_CACHE["music_file_names"] = index.music_file_names
+        MUSIC_CACHE["scan_time"] = index.scan_time
+        MUSIC_CACHE["version"] = index.version
+
+
 async def handle_music_command(conn, text):
     initialize_music_handler(conn)
     global MUSIC_CACHE
@@ -154,16 +142,12 @@ async def handle_music_command(conn, text):
 
     # 尝试匹配具体歌名
     if os.path.exists(MUSIC_CACHE["music_dir"]):
-        if time.time() - MUSIC_CACHE["scan_time"] > MUSIC_CACHE["refresh_time"]:
-            # 刷新音乐文件列表
-            MUSIC_CACHE["music_files"], MUSIC_CACHE["music_file_names"] = (
-                get_music_files(MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"])
-            )
-            MUSIC_CACHE["scan_time"] = time.time()
+        # 刷新音乐文件列表
+        refresh_music_files()
 
         potential_song = _extract_song_name(clean_text)
         if potential_song:
-            best_match = _find_best_match(potential_song, MUSIC_CACHE["music_files"])
+            best_match = _find_best_match(potential_song)
             if best_match:
                 conn.logger.bind(tag=TAG).info(f"找到最匹配的歌曲: {best_match}")
                 await play_local_music(conn, specific_file=best_match)
@@ -0,0 +1,61 @@
+"""
+预先转码音乐和故事音频
+
+把 config.yaml 中 play_music.music_dir、christmas_story.story_dir 下的音频文件全部转码为p3格式，
+保存到 asset_store.store_dir，并输出占用空间和每次播放节省的转码耗时。服务运行时也会在后台自动转码，
+这个脚本用于部署前一次性完成，避免刚启动时的播放仍需解码。
+
+用法: python prebuild_assets.py [--force]
+    --force  忽略清单，重新转码全部文件
+"""
+
+import sys
+from tabulate import tabulate
+from config.settings import load_config
+from core.utils.asset_store import AssetStore
+
+
+def format_mb(size):
+    return f"{size / 1024 / 1024:.1f}"
+
+
+def main():
+    force = "--force" in sys.argv[1:]
+    config = load_config()
+    store = AssetStore(config)
+    if not store.enabled:
+        print("asset_store.enabled 为 false，未转码")
+        return
+
+    for directory, _ in store.sources:
+        print(f"源目录: {directory}")
+    result = store.scan(force=force)
+    summary = store.summary()
+    stats = store.stats()
+
+    saved = summary["source_bytes"] - summary["p3_bytes"]
+    ratio = saved / summary["source_bytes"] * 100 if summary["source_bytes"] else 0
+    entries = summary["entries"] or 1
+    rows = [
+        ["源文件数", result["sources"]],
+        ["本次转码/更新", result["transcoded"]],
+        ["本次删除的记录", result["removed"]],
+        ["转码失败", stats["failures"]],
+        ["p3文件数（相同内容只保存一份）", summary["p3_files"]],
+        ["音频总时长(分钟)", f"{summary['audio_seconds'] / 60:.1f}"],
+        ["源文件大小(MB)", format_mb(summary["source_bytes"])],
+        ["p3文件大小(MB)", format_mb(summary["p3_bytes"])],
+        ["节省空间(MB)", f"{format_mb(saved)} ({ratio:.1f}%)"],
+        ["全部播放一遍节省的转码耗时(秒)", summary["transcode_seconds"]],
+        [
+            "每次播放平均节省(ms)",
+            f"{summary['transcode_seconds'] / entries * 1000:.0f}",
+        ],
+        ["本次耗时(秒)", result["seconds"]],
+    ]
+    print(tabulate(rows, headers=["项目", "数值"], tablefmt="github"))
+    print(f"资源库目录: {store.store_dir}")
+
+
+if __name__ == "__main__":
+    main()